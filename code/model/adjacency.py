@@ -0,0 +1,120 @@
+import numpy as np
+
+
+def segments(starts, lengths):
+    # positions of consecutive segments given by their starts and lengths
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + offsets
+
+
+class BipartiteCSR:
+    # row -> columns adjacency stored as CSR rows with spare capacity: the
+    # columns of row r are indices[start[r] : start[r] + degree[r]], and a row
+    # outgrowing its capacity is moved to the tail with twice its capacity
+
+    def __init__(self, n_rows=0, n_cols=0):
+        self.n_cols = n_cols
+        self.start = np.zeros(n_rows, dtype=np.int64)
+        self.capacity = np.zeros(n_rows, dtype=np.int64)
+        self.degree = np.zeros(n_rows, dtype=np.int64)
+        self.indices = np.empty(0, dtype=np.int64)
+        self.size = 0
+
+    @classmethod
+    def from_edges(cls, rows, cols, n_rows, n_cols):
+        adjacency = cls(n_rows, n_cols)
+        adjacency.add_edges(rows, cols)
+        return adjacency
+
+    @property
+    def n_rows(self):
+        return len(self.degree)
+
+    def __len__(self):
+        return int(self.degree.sum())
+
+    def add_rows(self, n):
+        self.start = np.concatenate([self.start, np.full(n, self.size, dtype=np.int64)])
+        self.capacity = np.concatenate([self.capacity, np.zeros(n, dtype=np.int64)])
+        self.degree = np.concatenate([self.degree, np.zeros(n, dtype=np.int64)])
+
+    def add_cols(self, n):
+        self.n_cols += n
+
+    def neighbors(self, row):
+        # columns of a row in O(degree), as a view
+        start = self.start[row]
+        return self.indices[start : start + self.degree[row]]
+
+    def has_edge(self, row, col):
+        return bool((self.neighbors(row) == col).any())
+
+    def edges(self):
+        # (rows, cols) arrays of all edges, grouped by row
+        rows = np.repeat(np.arange(self.n_rows), self.degree)
+        return rows, self.indices[segments(self.start, self.degree)]
+
+    def add_edges(self, rows, cols):
+        # insert edges in bulk in O(edges added + degree of the grown rows)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        order = np.argsort(rows, kind="stable")
+        rows, cols = rows[order], cols[order]
+        touched, first, added = np.unique(rows, return_index=True, return_counts=True)
+        full = self.degree[touched] + added > self.capacity[touched]
+        self._grow(touched[full], self.degree[touched[full]] + added[full])
+        offsets = np.arange(len(rows)) - np.repeat(first, added)
+        self.indices[self.start[rows] + self.degree[rows] + offsets] = cols
+        self.degree[touched] += added
+
+    def add_edge(self, row, col):
+        # insert an edge in amortized O(1)
+        degree = self.degree[row]
+        if degree == self.capacity[row]:
+            self._grow(np.array([row]), np.array([degree + 1]))
+        self.indices[self.start[row] + degree] = col
+        self.degree[row] += 1
+
+    def remove_edges(self, rows, cols):
+        # remove edges in bulk in O(degree of the rows), keeping the order of
+        # the remaining columns of each row
+        rows = np.asarray(rows, dtype=np.int64)
+        removed = rows * self.n_cols + np.asarray(cols, dtype=np.int64)
+        touched = np.unique(rows)
+        degree = self.degree[touched]
+        positions = segments(self.start[touched], degree)
+        owners = np.repeat(touched, degree)
+        keep = ~np.isin(owners * self.n_cols + self.indices[positions], removed)
+        kept = np.bincount(np.repeat(np.arange(len(touched)), degree)[keep], minlength=len(touched))
+        self.indices[segments(self.start[touched], kept)] = self.indices[positions[keep]]
+        self.degree[touched] = kept
+
+    def remove_edge(self, row, col):
+        # remove an edge in O(degree), moving the last column of the row in its place
+        neighbors = self.neighbors(row)
+        found = np.flatnonzero(neighbors == col)
+        if len(found) == 0:
+            raise KeyError((row, col))
+        neighbors[found[0]] = neighbors[-1]
+        self.degree[row] -= 1
+
+    def clear_row(self, row):
+        self.degree[row] = 0
+
+    def _grow(self, rows, needed):
+        # move rows to the tail with at least twice the needed capacity,
+        # doubling the storage when it is full
+        if len(rows) == 0:
+            return
+        capacity = np.maximum(2 * needed, 2)
+        start = self.size + np.cumsum(capacity) - capacity
+        size = self.size + int(capacity.sum())
+        if size > len(self.indices):
+            indices = np.full(max(size, 2 * len(self.indices)), -1, dtype=np.int64)
+            indices[: self.size] = self.indices[: self.size]
+            self.indices = indices
+        degree = self.degree[rows]
+        self.indices[segments(start, degree)] = self.indices[segments(self.start[rows], degree)]
+        self.start[rows] = start
+        self.capacity[rows] = capacity
+        self.size = size
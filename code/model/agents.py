@@ -1,9 +1,21 @@
 import numpy as np
 import agentpy as ap
+from .roles import RoleFlag
+from .streams import stream
+from .tracing import tracer
 
 
 class Household(ap.Agent):
 
+    # role indicators indexed by the model
+    s_U = RoleFlag()
+    s_W = RoleFlag()
+    s_WG = RoleFlag()
+    s_E = RoleFlag()
+    s_EB = RoleFlag()
+    s_Y = RoleFlag()
+    n_W = RoleFlag()
+
     def setup(self):
         self.s_U = 0  # unemployed indicator variable
         self.s_W = 0  # employee indicator variable
@@ -46,37 +58,33 @@ class Household(ap.Agent):
         formal_market = labor_markets[1]
 
         # reservation wage revision
-        random = self.model.nprandom
+        random = stream(self.model, self.type)
         U = random.uniform
         Pr = self.upsilon * np.exp(-formal_market.upsilon * formal_market.u)
         if self.s_U == 0:
-            print([0, 1], [1 - Pr, Pr])
             if random.choice([0, 1], p=[1 - Pr, Pr]):
                 self.w = self.w * (1 + U(0, self.delta))
         else:
             if random.choice([0, 1], p=[Pr, 1 - Pr]):
                 self.w = self.w * (1 - U(0, self.delta))
+        trace = tracer(self.model)
+        if trace:
+            trace.emit("job_search", self, self.w, Pr)
 
         # search best formal jobs
         if self.n_W == 0:
-            employers = formal_market.employers.random(self.chi_N)
-            employers = employers.select(employers.w >= self.w)
-            employers = employers.select(employers.N_v > 0)
-            if len(employers) > 0:
+            choice = formal_market.best_offer(self.chi_N, self.w)
+            if choice is not None:
                 if self.s_W == 1 or self.s_E == 1:
-                    old_employer = informal_market.neighbors(self)[0]
+                    old_employer = informal_market.employer_of(self)
                     informal_market.leave_job(self, old_employer)
-                choice = employers.sort("w", reverse=True)[0]
                 formal_market.accept_job(self, choice)
                 return
 
         # search best informal jobs
         if self.s_U == 1:
-            employers = informal_market.employers.random(self.chi_N)
-            employers = employers.select(employers.w >= self.w)
-            employers = employers.select(employers.N_v > 0)
-            if len(employers) > 0:
-                choice = employers.sort("w", reverse=True)[0]
+            choice = informal_market.best_offer(self.chi_N, self.w)
+            if choice is not None:
                 informal_market.accept_job(self, choice)
 
     def pay_taxes(self):
@@ -121,6 +129,11 @@ class Household(ap.Agent):
 
 class Firm(ap.Agent):
 
+    # role indicators indexed by the model
+    s_Y = RoleFlag()
+    n_W = RoleFlag()
+    n_T = RoleFlag()
+
     def setup(self):
         self.s_Y = 0  # firm's sector
         self.n_W = 0  # degree of formality on labor market
@@ -164,7 +177,7 @@ class Firm(ap.Agent):
         self.owner = None
 
     def plan_production(self):
-        random = self.model.nprandom
+        random = stream(self.model, self.type)
         U, delta = random.uniform, self.delta
         labor_market = self.model.labor_markets[self.n_W]
 
@@ -190,15 +203,17 @@ class Firm(ap.Agent):
         else:
             if random.choice([0, 1], p=[Pr, 1 - Pr]):
                 self.w = self.w * (1 - U(0, self.delta))
-        print(self.m, self.w, self.phi)
         self.p_Y = (1 + self.m) * self.w / self.phi
+        trace = tracer(self.model)
+        if trace:
+            trace.emit("price_revision", self, self.m, self.w, self.phi, self.p_Y)
 
     def apply_for_credit(self):
         self.L_d = max(0, self.w * self.N_star - self.D - self.M)
 
     def destroy_jobs(self):
         labor_market = self.model.labor_markets[self.n_W]
-        workers = labor_market.neighbors(self)
+        workers = labor_market.neighbors(self).to_list()
         N, N_star = len(workers), self.N_star
         Delta_N = int(np.floor(max(0, N - N_star)))
         for worker in workers.random(Delta_N):
@@ -208,6 +223,7 @@ class Firm(ap.Agent):
     def create_jobs(self):
         N_max = min(self.N_star, (self.M + self.D) / self.w)
         self.N_v = int(np.ceil(max(0, N_max - self.N)))
+        self.model.labor_markets[self.n_W].post_vacancies(self)
 
     def produce_goods(self):
         self.y = self.phi * self.N
@@ -273,12 +289,12 @@ class Bank(ap.Agent):
             deposit_market.pay_interests(iota, self, client)
 
     def grant_loans(self):
-        random = self.model.nprandom
+        random = stream(self.model, self.type)
         L_max = self.kappa_E * self.E
         credit_market = self.model.credit_market
         firms = credit_market.neighbors(self)
+        trace = tracer(self.model)
         for firm in firms:
-            print("Max", firm.L_d, L_max)
             if 0 < firm.L_d <= L_max:
                 Pr = np.exp(-self.gamma_L * firm.L_d / firm.E)
                 choice = random.choice([0, 1], p=[1 - Pr, Pr])
@@ -286,8 +302,9 @@ class Bank(ap.Agent):
                     firm.r_L = credit_market.r_L + (self.beta_L * firm.L_d / firm.E)
                     credit_market.give_loans(firm.L_d, self, firm)
                     L_max -= firm.L_d
-                print("choice", choice, "with prob", Pr)
-                print("r_L", firm.r_L, "from", self.beta_L, firm.L_d, firm.E)
+                if trace:
+                    values = (firm.id, firm.L_d, L_max, Pr, choice, firm.r_L)
+                    trace.emit("loan_decision", self, *values)
 
     def ask_advances(self):
         A = self.kappa_R * self.D - self.R
@@ -0,0 +1,102 @@
+import os
+import json
+import hashlib
+import tempfile
+from collections import OrderedDict
+
+import numpy as np
+
+
+def default_directory():
+    # directory of the on-disk tier, which is only enabled by setting the
+    # variable, e.g. to ~/.cache/dualeco
+    return os.environ.get("DUALECO_CACHE_DIR") or None
+
+
+def hash_params(params, keys=None):
+    # canonical hash of (a subset of) a parameter dict
+    keys = sorted(params if keys is None else set(keys) & set(params))
+    canonical = {k: canonical_value(params[k]) for k in keys}
+    text = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def canonical_value(value):
+    if isinstance(value, dict):
+        return {str(k): canonical_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [canonical_value(v) for v in value]
+    if isinstance(value, (bool, np.bool_, str)):
+        return value
+    return repr(float(value))
+
+
+class SteadyStateCache:
+
+    def __init__(self, directory=None, maxsize=256):
+        self.directory = directory
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __contains__(self, key):
+        return key in self.memory or self._read(key) is not None
+
+    def get(self, key):
+        # look up memory tier first, then disk tier
+        state = self.memory.get(key)
+        if state is not None:
+            self.memory.move_to_end(key)
+        else:
+            state = self._read(key)
+            if state is not None:
+                self._remember(key, state)
+        if state is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(state)
+
+    def put(self, key, state):
+        # states of failed solves are not stored
+        state = {k: float(v) for k, v in state.items()}
+        if not np.isfinite(list(state.values())).all():
+            return
+        self._remember(key, state)
+        self._write(key, state)
+
+    def clear(self):
+        self.memory.clear()
+        if self.directory is not None and os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.directory, name))
+
+    def _remember(self, key, state):
+        self.memory[key] = state
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _read(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                return dict(zip(data["keys"].tolist(), data["values"].tolist()))
+        except (OSError, KeyError, ValueError):
+            return None
+
+    def _write(self, key, state):
+        # write atomically so that concurrent processes never read partial files
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(suffix=".npz", dir=self.directory)
+        with os.fdopen(fd, "wb") as file:
+            np.savez(file, keys=np.array(list(state)), values=np.array(list(state.values())))
+        os.replace(tmp, self._path(key))
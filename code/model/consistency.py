@@ -0,0 +1,150 @@
+import math
+
+import numpy as np
+from .ledger import consumption, postings
+from .sfc import accounts, flow_cells, flow_rows
+
+# account of the agents of each class
+classes = {"Household": "H", "Firm": "F", "Bank": "B", "Government": "G", "CentralBank": "CB"}
+
+
+def flow_cell(account, attribute):
+    # (row, sign) of the flow matrix changed by an attribute of an account,
+    # stocks changing through their Delta row
+    cells = flow_cells.get(account, {})
+    base = "C" if attribute[0] == "C" and attribute[1:].isdigit() else attribute
+    for key in (base, f"{base}_{account}", f"{base}{account}", f"Delta{base}_{account}"):
+        if key in cells:
+            return cells[key]
+    return None
+
+
+class ConsistencyMonitor:
+    # running flow matrix of each transaction type, checking each transaction
+    # in O(1) against the zero row and column sums of the flow matrix. these
+    # checks only use the posting table of the transaction type; in debug
+    # mode, the attributes changed by the transactions applied right away are
+    # also compared with their postings when settled, at check or before a
+    # batch, so that in between they must only change through transactions
+
+    def __init__(self, sectors=(1, 2), debug=False):
+        types = dict(postings)
+        types.update({f"consumption{s}": consumption(s) for s in sectors})
+        self.postings = types
+        self.debug = debug
+        self.expected = {}
+        self.codes = {name: i for i, name in enumerate(types)}
+        self.accounts = {cls: accounts.index(a) for cls, a in classes.items()}
+        shape = (len(types), len(accounts) + 1, len(accounts) + 1)
+        self.cells = np.zeros(shape + (len(flow_rows), len(accounts)))
+        self.balanced = np.zeros(shape, dtype=bool)
+        for code, entries in enumerate(types.values()):
+            for p in range(shape[1]):
+                for q in range(shape[2]):
+                    self._compile(code, p, q, entries)
+        self.flows = np.zeros((len(types), len(flow_rows), len(accounts)))
+        self.count = 0
+        self.violations = 0
+        self.first = None
+
+    def _compile(self, code, p, q, entries):
+        # flow matrix cells of a unit transaction between two accounts
+        cells = self.cells[code, p, q]
+        known = True
+        for side, attribute, sign in entries:
+            if not any(flow_cell(a, attribute) for a in accounts):
+                continue  # real quantities are not in the flow matrix
+            i = (p, q)[side]
+            cell = flow_cell(accounts[i], attribute) if i < len(accounts) else None
+            if cell is None:
+                known = False
+                continue
+            row, k = cell
+            cells[flow_rows.index(row), i] += sign * k
+        self.balanced[code, p, q] = known and not cells.sum(0).any() and not cells.sum(1).any()
+
+    def _account(self, agent):
+        return self.accounts.get(agent.type, len(accounts))
+
+    def observe(self, name, payer, payee, amount, deferred=False):
+        # add a transaction to the flows of its type and check it, deferred
+        # transactions being applied later by a ledger
+        code, p, q = self.codes[name], self._account(payer), self._account(payee)
+        self.flows[code] += amount * self.cells[code, p, q]
+        self.count += 1
+        if not (self.balanced[code, p, q] and math.isfinite(amount)):
+            self._flag(self.count - 1, name, payer, payee, amount)
+        elif self.debug and not deferred:
+            self._expect((self.count - 1, name, payer, payee, amount))
+
+    def _expect(self, transaction):
+        # expected values of the attributes posted by a transaction, from
+        # their values before the first unsettled transaction changing them
+        _, name, payer, payee, amount = transaction
+        for side, attribute, sign in self.postings[name]:
+            agent = (payer, payee)[side]
+            key = (id(agent), attribute)
+            if key not in self.expected:
+                value = getattr(agent, attribute, None)
+                if value is None:
+                    continue
+                self.expected[key] = [agent, attribute, value, None]
+            self.expected[key][2] += sign * amount
+            self.expected[key][3] = transaction
+
+    def settle(self):
+        # compare the attributes changed by transactions with their postings,
+        # flagging the last transaction changing each wrong attribute
+        wrong = {}
+        for agent, attribute, value, transaction in self.expected.values():
+            if not math.isclose(getattr(agent, attribute), value, rel_tol=1e-9, abs_tol=1e-9):
+                wrong[transaction[0]] = transaction
+        self.expected = {}
+        for i in sorted(wrong):
+            self._flag(*wrong[i])
+
+    def observe_many(self, name, payers, payees, amounts):
+        # add transactions of one type between agents of one class each
+        amounts = np.broadcast_to(np.asarray(amounts, dtype=float), (len(payers),))
+        if self.debug:
+            self.settle()
+        if len(amounts) == 0:
+            return
+        code, p, q = self.codes[name], self._account(payers[0]), self._account(payees[0])
+        self.flows[code] += amounts.sum() * self.cells[code, p, q]
+        start = self.count
+        self.count += len(amounts)
+        offending = ~np.isfinite(amounts) | ~self.balanced[code, p, q]
+        if offending.any():
+            i = int(np.argmax(offending))
+            self._flag(start + i, name, payers[i], payees[i], float(amounts[i]))
+            self.violations += int(offending.sum()) - 1
+
+    def _flag(self, i, name, payer, payee, amount):
+        self.violations += 1
+        if self.first is None:
+            self.first = {"transaction": i, "type": name, "payer": payer.id, "payee": payee.id, "amount": amount}
+
+    def rows(self):
+        # row sums of the running flow matrix, zero when consistent
+        return self.flows.sum(axis=(0, 2))
+
+    def columns(self):
+        # column sums of the running flow matrix, zero when consistent
+        return self.flows.sum(axis=(0, 1))
+
+    def check(self):
+        if self.debug:
+            self.settle()
+        if self.first is not None:
+            first = self.first
+            raise ValueError(
+                f"transaction {first['transaction']} ({first['type']} of {first['amount']} "
+                f"from {first['payer']} to {first['payee']}) is not stock-flow consistent, "
+                f"{self.violations} inconsistent transactions in total"
+            )
+
+
+def monitor(model):
+    # consistency monitor of a model, None when disabled
+    return model.__dict__.get("monitor")
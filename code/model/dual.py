@@ -0,0 +1,155 @@
+import numpy as np
+
+
+class Dual:
+    # array of values with their tangents along a last parameter axis
+
+    __array_ufunc__ = None
+
+    def __init__(self, value, tangent):
+        self.value = np.asarray(value, dtype=float)
+        self.tangent = np.broadcast_to(tangent, self.value.shape + np.shape(tangent)[-1:])
+
+    @property
+    def shape(self):
+        return self.value.shape
+
+    def __getitem__(self, key):
+        key = key if isinstance(key, tuple) else (key,)
+        if Ellipsis not in key:
+            key = key + (Ellipsis,)
+        return Dual(self.value[key], self.tangent[key + (slice(None),)])
+
+    def __add__(self, other):
+        value = self.value + value_of(other)
+        return Dual(value, self.tangent + tangent_of(other))
+
+    def __sub__(self, other):
+        value = self.value - value_of(other)
+        return Dual(value, self.tangent - tangent_of(other))
+
+    def __rsub__(self, other):
+        value = value_of(other) - self.value
+        return Dual(value, tangent_of(other) - self.tangent)
+
+    def __mul__(self, other):
+        a, b = self.value[..., None], np.asarray(value_of(other))[..., None]
+        value = self.value * value_of(other)
+        return Dual(value, self.tangent * b + a * tangent_of(other))
+
+    def __truediv__(self, other):
+        value = self.value / value_of(other)
+        b = np.asarray(value_of(other))[..., None]
+        return Dual(value, (self.tangent - value[..., None] * tangent_of(other)) / b)
+
+    def __rtruediv__(self, other):
+        value = value_of(other) / self.value
+        a = self.value[..., None]
+        return Dual(value, (tangent_of(other) - value[..., None] * self.tangent) / a)
+
+    def __neg__(self):
+        return Dual(-self.value, -self.tangent)
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def __lt__(self, other):
+        return self.value < value_of(other)
+
+    def __le__(self, other):
+        return self.value <= value_of(other)
+
+    def __gt__(self, other):
+        return self.value > value_of(other)
+
+    def __ge__(self, other):
+        return self.value >= value_of(other)
+
+    def sum(self, axis):
+        axis = axis % self.value.ndim
+        return Dual(self.value.sum(axis), self.tangent.sum(axis))
+
+
+def value_of(x):
+    return x.value if isinstance(x, Dual) else x
+
+
+def tangent_of(x):
+    return x.tangent if isinstance(x, Dual) else 0.0
+
+
+def is_dual(*xs):
+    return any(isinstance(x, Dual) for x in xs)
+
+
+def where(condition, x, y):
+    # select values and tangents elementwise
+    value = np.where(condition, value_of(x), value_of(y))
+    if not is_dual(x, y):
+        return value
+    condition = np.expand_dims(condition, -1)
+    return Dual(value, np.where(condition, tangent_of(x), tangent_of(y)))
+
+
+def expand_dims(x):
+    # add a last axis before the tangent axis
+    if not is_dual(x):
+        return np.expand_dims(x, -1)
+    return Dual(np.expand_dims(x.value, -1), np.expand_dims(x.tangent, -2))
+
+
+def stack(xs):
+    # stack broadcast values (and tangents) along a last axis
+    values = np.broadcast_arrays(*[value_of(x) for x in xs])
+    value = np.stack(values, -1)
+    if not is_dual(*xs):
+        return value
+    k = next(x.tangent.shape[-1] for x in xs if isinstance(x, Dual))
+    shape = values[0].shape + (k,)
+    tangents = [np.broadcast_to(tangent_of(x), shape) for x in xs]
+    return Dual(value, np.stack(tangents, -2))
+
+
+def matrix(rows, shape):
+    # stack a matrix given as lists of rows into a (..., k, k) array of values
+    A = np.array([[np.broadcast_to(value_of(v), shape) for v in row] for row in rows], dtype=float)
+    return np.moveaxis(A, (0, 1), (-2, -1))
+
+
+def solve(A, B, mask_singular=False):
+    # solve a stack of linear systems given as lists of rows,
+    # with tangents obtained by implicit differentiation of A X = B
+    entries = [v for row in A for v in row] + list(B)
+    shape = np.broadcast_shapes(*[np.shape(v) for v in entries])
+    Av = matrix(A, shape)
+    Bv = np.array([np.broadcast_to(value_of(v), shape) for v in B], dtype=float)
+    Bv = np.moveaxis(Bv, 0, -1)
+    X, Av = solve_values(Av, Bv, mask_singular)
+    if not is_dual(*entries):
+        return np.moveaxis(X, -1, 0)
+
+    # dX = A^-1 (dB - dA X) for every parameter direction at once
+    k = next(v.tangent.shape[-1] for v in entries if isinstance(v, Dual))
+    shape = shape + (k,)
+    dA = np.array([[np.broadcast_to(tangent_of(v), shape) for v in row] for row in A])
+    dB = np.array([np.broadcast_to(tangent_of(v), shape) for v in B])
+    dA = np.moveaxis(dA, (0, 1), (-2, -1))
+    dB = np.moveaxis(dB, 0, -1)
+    rhs = dB - (dA @ X[..., None, :, None])[..., 0]
+    dX = np.linalg.solve(Av[..., None, :, :], rhs[..., None])[..., 0]
+    return [Dual(X[..., i], dX[..., i]) for i in range(X.shape[-1])]
+
+
+def solve_values(A, B, mask_singular=False):
+    # solve stacked systems, masking exactly singular ones with NaN instead of
+    # failing the whole batch if asked (returns the identity-patched matrices)
+    try:
+        return np.linalg.solve(A, B[..., None])[..., 0], A
+    except np.linalg.LinAlgError:
+        if not mask_singular:
+            raise
+        singular = np.linalg.matrix_rank(np.nan_to_num(A)) < A.shape[-1]
+        A = np.where(singular[..., None, None], np.eye(A.shape[-1]), A)
+        X = np.linalg.solve(A, B[..., None])[..., 0]
+        X[singular] = np.nan
+        return X, A
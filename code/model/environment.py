@@ -1,4 +1,12 @@
+import numpy as np
 import agentpy as ap
+from .adjacency import BipartiteCSR
+from .consistency import monitor
+from .ledger import book, ledger
+from .population import assign, values
+from .streams import stream
+from .tracing import tracer
+from .vacancies import VacancyIndex
 
 
 class BasicSpace(ap.Space):
@@ -9,36 +17,49 @@ class BasicSpace(ap.Space):
 class Economy(BasicSpace):
 
     def pay_doles(self, amount, government, household):
+        if book(self.model, "dole", government, household, amount):
+            return
         government.Z += amount
         government.M -= amount
         household.Z += amount
         household.M += amount
 
     def pay_taxes(self, amount, payer, government):
+        if book(self.model, "tax", payer, government, amount):
+            return
         payer.T += amount
         payer.M -= amount
         government.T += amount
         government.M += amount
 
     def pay_dividends(self, amount, source, owner):
+        if book(self.model, "dividend", source, owner, amount):
+            return
         source.Pi_d += amount
         source.M -= amount
         owner.Pi_d += amount
         owner.M += amount
 
     def transfer_profits(self, amount, source, target):
+        if book(self.model, "profit_transfer", source, target, amount):
+            return
         source.Pi += amount
         source.M += amount
         target.Pi += amount
         target.M += amount
 
     def give_advances(self, amount, central_bank, bank):
+        if book(self.model, "advance", central_bank, bank, amount):
+            return
         central_bank.A += amount
         central_bank.M += amount
         bank.A += amount
         bank.M += amount
 
     def repay_advances(self, capital, interests, bank, central_bank):
+        repaid = book(self.model, "advance_repayment", bank, central_bank, capital)
+        if book(self.model, "advance_interest", bank, central_bank, interests) and repaid:
+            return
         bank.iota_A += interests
         bank.A -= capital
         bank.M -= capital + interests
@@ -47,14 +68,23 @@ class Economy(BasicSpace):
         central_bank.M -= capital + interests
 
     def invest_equities(self, amount, owner, target):
+        if book(self.model, "equity_investment", owner, target, amount):
+            return
         owner.E += amount
         owner.M -= amount
         target.E += amount
         target.M += amount
 
     def reimburse_equities(self, target, owner):
+        transactions = ledger(self.model)
+        if transactions is not None:
+            # amounts depend on the cash and equities after pending transactions
+            transactions.apply()
         cash = target.M
         amount = target.E
+        written_off = book(self.model, "equity_writeoff", target, owner, amount)
+        if book(self.model, "equity_payout", target, owner, cash) and written_off:
+            return
         target.Pi_d -= amount - cash
         target.E -= amount
         target.M -= cash
@@ -78,15 +108,103 @@ class GoodMarket(BasicSpace):
         self.suppliers.remove(supplier)
 
     def consume_goods(self, amount, client, firm):
+        consumed = book(self.model, f"consumption{self.s_Y}", client, firm, amount)
+        if book(self.model, "delivery", firm, firm, amount / firm.p_Y) and consumed:
+            return
         client.M -= amount
-        if self.s_Y == 1:
-            client.C1 += amount
-        else:
-            client.C2 += amount
+        client[f"C{self.s_Y}"] += amount
         firm.M += amount
         firm.Q += amount
         firm.y_inv -= amount / firm.p_Y
 
+    def clear(self, buyers):
+        # purchases of all buyers at once: each buyer samples chiY suppliers
+        # and buys from the cheapest first, and each supplier serves its
+        # buyers in order until its inventory is sold
+        n, m = len(buyers), len(self.suppliers)
+        if n == 0 or m == 0:
+            return
+        random = stream(self.model, buyers[0].type)
+        transactions = ledger(self.model)
+        if transactions is not None:
+            # in ledger mode, purchases spend the cash left by the pending
+            # transactions, e.g. those of the market of another sector
+            transactions.apply()
+        C = f"C{self.s_Y}"
+        M = values(buyers, "M").astype(float)
+        demand = np.maximum(np.minimum(M, values(buyers, f"{C}_star")), 0)
+        p_Y = values(self.suppliers, "p_Y").astype(float)
+        y_inv = values(self.suppliers, "y_inv").astype(float)
+        stock = np.maximum(p_Y * y_inv, 0)
+
+        # price ladder of the distinct sampled suppliers of each buyer
+        chi = values(buyers, "chiY").astype(int)
+        k = max(int(chi.max()), 1)
+        draws = random.integers(0, m, size=(n, k))
+        prices = np.where(np.arange(k) < chi[:, None], p_Y[draws], np.inf)
+        order = np.lexsort((draws, prices))
+        draws = np.take_along_axis(draws, order, axis=1)
+        prices = np.take_along_axis(prices, order, axis=1)
+        prices[:, 1:][draws[:, 1:] == draws[:, :-1]] = np.inf
+        order = np.argsort(prices, axis=1, kind="stable")
+        draws = np.take_along_axis(draws, order, axis=1)
+        prices = np.take_along_axis(prices, order, axis=1)
+
+        if transactions is not None:
+            clients, firms = transactions.indices(buyers), transactions.indices(self.suppliers)
+        checks = monitor(self.model)
+        if checks is not None:
+            customers = np.fromiter(buyers, dtype=object, count=n)
+            suppliers = np.fromiter(self.suppliers, dtype=object, count=m)
+        spent = np.zeros(n)
+        sold = np.zeros(m)
+        for j in range(k):
+            active = np.flatnonzero((demand > 0) & np.isfinite(prices[:, j]))
+            chosen = draws[active, j]
+            order = np.argsort(chosen, kind="stable")
+            active, chosen = active[order], chosen[order]
+
+            # demand of previous buyers of the same supplier by cumulative sums
+            wanted = demand[active]
+            before = np.cumsum(wanted) - wanted
+            before -= before[np.searchsorted(chosen, chosen)]
+            bought = np.clip(stock[chosen] - before, 0, wanted)
+            sales = np.bincount(chosen, weights=bought, minlength=m)
+            stock -= sales
+            sold += sales
+            spent[active] += bought
+            demand[active] -= bought
+            paid = bought > 0
+            name = f"consumption{self.s_Y}"
+            if checks is not None:
+                checks.observe_many(name, customers[active[paid]], suppliers[chosen[paid]], bought[paid])
+            if transactions is not None:
+                transactions.record_many(name, clients[active[paid]], firms[chosen[paid]], bought[paid])
+
+        sold_units = np.divide(sold, p_Y, out=np.zeros(m), where=p_Y > 0)
+        if checks is not None:
+            checks.observe_many("delivery", suppliers, suppliers, sold_units)
+        if transactions is not None:
+            transactions.record_many("delivery", firms, firms, sold_units)
+            return
+        assign(buyers, "M", M - spent)
+        assign(buyers, C, values(buyers, C) + spent)
+        assign(self.suppliers, "M", values(self.suppliers, "M") + sold)
+        assign(self.suppliers, "Q", values(self.suppliers, "Q") + sold)
+        assign(self.suppliers, "y_inv", y_inv - sold_units)
+
+
+def sample_distinct(random, m, n, k):
+    # n rows of k distinct draws among m, as in search_job: each column is
+    # drawn among the values not yet in its row, redrawing collisions
+    draws = np.empty((n, k), dtype=np.int64)
+    for j in range(k):
+        rows = np.arange(n)
+        while len(rows):
+            draws[rows, j] = random.integers(0, m, size=len(rows))
+            rows = rows[(draws[rows, :j] == draws[rows, j, None]).any(axis=1)]
+    return draws
+
 
 class LaborMarket(ap.Network):
 
@@ -94,40 +212,231 @@ class LaborMarket(ap.Network):
         self.n_W = 0
         self.u = 0
         self.upsilon = 0
-        self.employers = ap.AgentDList(self.model)
-        self.workers = ap.AgentDList(self.model)
+
+        # members of the market are kept in their slots rather than as nodes
+        # of the graph, and employer -> workers links, indexed by slots of employers and workers
+        self.jobs = BipartiteCSR()
+        self.employer_slots = {}
+        self.worker_slots = {}
+        self.slot_employers = []
+        self.slot_workers = []
+
+        # employer slot of each worker slot, -1 without job
+        self.employment = np.empty(0, dtype=np.int64)
+        self.vacancies = VacancyIndex()
+
+    @property
+    def agents(self):
+        return ap.AgentIter(self.model, list(self.employer_slots) + list(self.worker_slots))
+
+    @property
+    def employers(self):
+        return ap.AgentIter(self.model, self.employer_slots)
+
+    @property
+    def workers(self):
+        return ap.AgentIter(self.model, self.worker_slots)
 
     def add_employers(self, employers):
-        self.add_agents(employers)
-        self.employers.extend(employers)
+        self.employer_slot(employers)
         for employer in employers:
             employer.n_W = self.n_W
 
     def remove_employer(self, employer):
         employer.n_W = 0
-        self.remove_agents([employer])
-        self.employers.remove(employer)
+        slot = self.employer_slots.pop(employer, None)
+        if slot is not None:
+            self.employment[self.jobs.neighbors(slot)] = -1
+            self.jobs.clear_row(slot)
+            self.vacancies.discard(slot)
+            self.slot_employers[slot] = None
 
     def add_workers(self, workers):
-        self.add_agents(workers)
-        self.workers.extend(workers)
+        self.worker_slot(workers)
 
     def remove_worker(self, worker):
-        self.remove_agents([worker])
-        self.workers.remove(worker)
+        slot = self.worker_slots.pop(worker, None)
+        if slot is not None:
+            if self.employment[slot] >= 0:
+                self._unlink(self.employment[slot], slot)
+            self.slot_workers[slot] = None
+
+    def employer_slot(self, employers):
+        # slots of employers, registering new ones
+        return self._slots(employers, self.employer_slots, self.slot_employers, self.jobs.add_rows)
+
+    def worker_slot(self, workers):
+        # slots of workers, registering new ones
+        return self._slots(workers, self.worker_slots, self.slot_workers, self._add_worker_slots)
+
+    def _add_worker_slots(self, n):
+        self.jobs.add_cols(n)
+        self.employment = np.concatenate([self.employment, np.full(n, -1, dtype=np.int64)])
+
+    def _slots(self, agents, slots, agent_list, grow):
+        new = [a for a in dict.fromkeys(agents) if a not in slots]
+        if new:
+            slots.update(zip(new, range(len(agent_list), len(agent_list) + len(new))))
+            agent_list.extend(new)
+            grow(len(new))
+        return np.fromiter(map(slots.__getitem__, agents), dtype=np.int64, count=len(agents))
+
+    def add_jobs(self, workers, employers):
+        # link workers to employers in bulk
+        self.link_slots(self.employer_slot(employers), self.worker_slot(workers))
+
+    def link_slots(self, employers, workers):
+        # link arrays of worker slots to employer slots in bulk
+        self.jobs.add_edges(employers, workers)
+        self.employment[workers] = employers
+
+    def _link(self, employer, worker):
+        self.jobs.add_edge(employer, worker)
+        self.employment[worker] = employer
+
+    def _unlink(self, employer, worker):
+        self.jobs.remove_edge(employer, worker)
+        self.employment[worker] = -1
+
+    def has_job(self, worker, employer):
+        e, w = self.employer_slots.get(employer), self.worker_slots.get(worker)
+        return e is not None and w is not None and self.jobs.has_edge(e, w)
+
+    def employees(self, employer):
+        # workers of an employer in O(degree)
+        slot = self.employer_slots.get(employer)
+        if slot is None:
+            return []
+        return list(map(self.slot_workers.__getitem__, self.jobs.neighbors(slot).tolist()))
+
+    def employer_of(self, worker):
+        # current employer of a worker in O(1), None without job
+        slot = self.worker_slots.get(worker)
+        employer = -1 if slot is None else self.employment[slot]
+        return None if employer < 0 else self.slot_employers[employer]
+
+    def post_vacancies(self, employer):
+        # index the open positions of an employer at its offered wage
+        slot = self.employer_slot([employer])[0]
+        self.vacancies.update(slot, employer.w, employer.N_v)
+
+    def best_offer(self, n, w):
+        # best employer offering at least w among n random employers
+        random = stream(self.model, "Household")
+        slot = self.vacancies.best_of_sample(w, n, len(self.employer_slots), random)
+        return None if slot is None else self.slot_employers[slot]
+
+    def offers(self):
+        # offered wage and open positions of each employer slot
+        wages = np.full(len(self.slot_employers), -np.inf)
+        N_v = np.zeros(len(self.slot_employers), dtype=np.int64)
+        for w, slot in self.vacancies.keys:
+            wages[slot] = w
+            N_v[slot] = self.slot_employers[slot].N_v
+        return wages, N_v
+
+    def match(self, w, chi_N, random):
+        # employer slot hiring each searcher, -1 if none: each searcher applies
+        # to the best offer at or above w among chi_N sampled employers,
+        # employers keep applicants in order of search up to N_v, and the
+        # others apply to their next best offer until none is left
+        n = len(w)
+        choice = np.full(n, -1, dtype=np.int64)
+        employers = np.fromiter(self.employer_slots.values(), dtype=np.int64)
+        if n == 0 or len(employers) == 0 or len(self.vacancies) == 0:
+            return choice
+        wages, N_v = self.offers()
+        k = min(max(int(np.max(chi_N)), 1), len(employers))
+        draws = employers[sample_distinct(random, len(employers), n, k)]
+        offered = wages[draws]
+        offered[(np.arange(k) >= chi_N[:, None]) | (offered < w[:, None])] = -np.inf
+
+        searching = np.arange(n)
+        while len(searching):
+            best = offered[searching].argmax(axis=1)
+            found = np.isfinite(offered[searching, best])
+            searching, best = searching[found], best[found]
+            applied = draws[searching, best]
+
+            # ration applicants of each employer by order of search
+            order = np.argsort(applied, kind="stable")
+            searching, applied = searching[order], applied[order]
+            rank = np.arange(len(applied)) - np.searchsorted(applied, applied)
+            hired = rank < N_v[applied]
+            choice[searching[hired]] = applied[hired]
+            N_v -= np.bincount(applied[hired], minlength=len(N_v))
+
+            # rejected searchers drop employers without open positions
+            searching = np.sort(searching[~hired])
+            rows = offered[searching]
+            rows[N_v[draws[searching]] <= 0] = -np.inf
+            offered[searching] = rows
+        return choice
+
+    def owns(self, worker, employer):
+        return getattr(worker, "property", None) is employer or getattr(employer, "owner", None) is worker
+
+    def hire(self, workers, employers):
+        # accept jobs of workers at given employer slots in bulk
+        employers = np.asarray(employers, dtype=np.int64)
+        agents = list(map(self.slot_employers.__getitem__, employers.tolist()))
+        self.link_slots(employers, self.worker_slot(workers))
+        slots, counts = np.unique(employers, return_counts=True)
+        for slot, count in zip(slots.tolist(), counts.tolist()):
+            employer = self.slot_employers[slot]
+            employer.N_v -= count
+            if employer.N_v <= 0:
+                self.vacancies.discard(slot)
+
+        owner = np.array([self.owns(w, e) for w, e in zip(workers, agents)], dtype=bool)
+        public = np.array([not hasattr(e, "s_Y") for e in agents], dtype=bool)
+        s_Y = [getattr(e, "s_Y", 0) for e in agents]
+        workers.n_W = self.n_W
+        assign(workers, "s_W", (~owner).astype(int))
+        assign(workers, "s_E", owner.astype(int))
+        workers.s_U = 0
+        assign(workers, "s_Y", s_Y)
+        assign(workers, "s_WG", public.astype(int))
+
+    def release(self, workers):
+        # leave the jobs of workers in bulk
+        slots = self.worker_slot(workers)
+        employers = self.employment[slots]
+        employed = employers >= 0
+        self.jobs.remove_edges(employers[employed], slots[employed])
+        self.employment[slots] = -1
+        workers.s_WG = 0
+        workers.s_Y = 0
+        workers.n_W = 0
+        workers.s_W = 0
+        workers.s_E = 0
+        workers.s_U = 1
+
+    def neighbors(self, agent):
+        if agent in self.employer_slots:
+            return ap.AgentIter(self.model, self.employees(agent))
+        if agent in self.worker_slots:
+            employer = self.employer_of(agent)
+            return ap.AgentIter(self.model, [] if employer is None else [employer])
+        return ap.AgentIter(self.model, [])
 
     def pay_wages(self, amount, employer, worker):
+        if book(self.model, "wage", employer, worker, amount):
+            return
         employer.W += amount
         employer.M -= amount
         worker.W += amount
         worker.M += amount
 
     def accept_job(self, worker, employer):
-        self.graph.add_edge(worker, employer)
+        slot = self.employer_slot([employer])[0]
+        self._link(slot, self.worker_slot([worker])[0])
         employer.N_v -= 1
+        if employer.N_v <= 0:
+            self.vacancies.discard(slot)
         worker.n_W = self.n_W
 
-        if worker.property is employer:
+        if self.owns(worker, employer):
             worker.s_W = 0
             worker.s_E = 1
             worker.s_U = 0
@@ -144,7 +453,7 @@ class LaborMarket(ap.Network):
             worker.s_WG = 1
 
     def leave_job(self, worker, employer):
-        self.graph.remove_edge(worker, employer)
+        self._unlink(self.employer_slots[employer], self.worker_slots[worker])
         worker.s_WG = 0
         worker.s_Y = 0
         worker.n_W = 0
@@ -164,18 +473,24 @@ class DepositMarket(ap.Network):
         client.bank = bank
 
     def make_deposits(self, amount, client, bank):
+        if book(self.model, "deposit", client, bank, amount):
+            return
         client.D += amount
         client.M -= amount
         bank.D += amount
         bank.M += amount
 
     def withdraw_deposits(self, amount, bank, client):
+        if book(self.model, "withdrawal", bank, client, amount):
+            return
         bank.D -= amount
         bank.M -= amount
         client.D -= amount
         client.M += amount
 
     def pay_interests(self, amount, bank, client):
+        if book(self.model, "deposit_interest", bank, client, amount):
+            return
         bank.iota_D += amount
         bank.D += amount
         client.iota_D += amount
@@ -185,12 +500,85 @@ class DepositMarket(ap.Network):
 class CreditMarket(ap.Network):
 
     def give_loans(self, amount, bank, firm):
+        if book(self.model, "loan", bank, firm, amount):
+            return
         bank.L += amount
         bank.D += amount
         firm.L += amount
         firm.D += amount
 
+    def allocate_credit(self, banks):
+        # loans of all banks at once: each bank approves the demands of its
+        # firms at random and grants approved ones in order while they fit
+        # within its capacity kappa_E * E
+        pairs = [(i, firm) for i, bank in enumerate(banks) for firm in self.neighbors(bank)]
+        if not pairs:
+            return
+        lender = np.array([i for i, _ in pairs], dtype=np.int64)
+        firms = ap.AgentList(self.model, [firm for _, firm in pairs])
+        L_d, E = values(firms, "L_d").astype(float), values(firms, "E").astype(float)
+        capacity = values(banks, "kappa_E") * values(banks, "E")
+        gamma_L = values(banks, "gamma_L")[lender]
+        beta_L = values(banks, "beta_L")[lender]
+
+        # approval probabilities and draws in one pass
+        applied = (L_d > 0) & (L_d <= capacity[lender])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            Pr = np.exp(-gamma_L * L_d / E)
+        draws = stream(self.model, "Bank").random(len(pairs))
+        approved = applied & (draws >= (1 - Pr) / ((1 - Pr) + Pr))
+
+        # grant approved demands of each bank while their cumulative sum fits,
+        # refusing the first one exceeding the remaining capacity each round
+        granted = np.zeros(len(pairs), dtype=bool)
+        remaining = capacity.astype(float)
+        candidates = np.flatnonzero(approved)
+        while len(candidates):
+            lenders, amounts = lender[candidates], L_d[candidates]
+            cumulated = np.cumsum(amounts)
+            start = np.searchsorted(lenders, lenders)
+            cumulated -= cumulated[start] - amounts[start]
+            fits = cumulated <= remaining[lenders]
+            granted[candidates[fits]] = True
+            remaining -= np.bincount(lenders[fits], weights=amounts[fits], minlength=len(remaining))
+            first = ~fits & ((np.arange(len(fits)) == start) | np.roll(fits, 1))
+            candidates = candidates[~fits & ~first]
+            candidates = candidates[L_d[candidates] <= remaining[lender[candidates]]]
+
+        trace = tracer(self.model)
+        if trace:
+            # remaining capacity of the lender after each decision
+            cumulated = np.cumsum(np.where(granted, L_d, 0))
+            start = np.searchsorted(lender, lender)
+            left = capacity[lender] - cumulated + cumulated[start] - np.where(granted, L_d, 0)[start]
+            with np.errstate(divide="ignore", invalid="ignore"):
+                r_L = self.r_L + beta_L * L_d / E
+            fields = values(firms, "id"), L_d, left, Pr, approved, r_L
+            lenders = values(banks, "id")[lender]
+            trace.emit_many("loan_decision", self.model.t, lenders[applied], *(f[applied] for f in fields))
+
+        # book loans in bulk
+        borrowers = firms.select(granted)
+        assign(borrowers, "r_L", self.r_L + beta_L[granted] * L_d[granted] / E[granted])
+        checks = monitor(self.model)
+        if checks is not None:
+            checks.observe_many("loan", [banks[i] for i in lender[granted]], borrowers, L_d[granted])
+        transactions = ledger(self.model)
+        if transactions is not None:
+            lenders = transactions.indices(banks)[lender[granted]]
+            transactions.record_many("loan", lenders, transactions.indices(borrowers), L_d[granted])
+            return
+        loans = np.bincount(lender[granted], weights=L_d[granted], minlength=len(banks))
+        assign(banks, "L", values(banks, "L") + loans)
+        assign(banks, "D", values(banks, "D") + loans)
+        L_d = L_d[granted]
+        assign(borrowers, "L", values(borrowers, "L") + L_d)
+        assign(borrowers, "D", values(borrowers, "D") + L_d)
+
     def repay_loans(self, capital, interests, firm, bank):
+        repaid = book(self.model, "loan_repayment", firm, bank, capital)
+        if book(self.model, "loan_interest", firm, bank, interests) and repaid:
+            return
         firm.iota_L += interests
         firm.L -= capital
         firm.D -= capital + interests
@@ -199,6 +587,8 @@ class CreditMarket(ap.Network):
         bank.D -= capital + interests
 
     def make_defaults(self, value, firm, bank):
+        if book(self.model, "default", firm, bank, value):
+            return
         firm.L -= value
         firm.L_def += value
         bank.L -= value
@@ -211,6 +601,9 @@ class BondMarket(BasicSpace):
         self.central_bank = None
 
     def buy_bonds(self, amount, buyer, government):
+        name = "bond_monetization" if buyer is self.central_bank else "bond_purchase"
+        if book(self.model, name, buyer, government, amount):
+            return
         government.B += amount
         government.M += amount
         if buyer is self.central_bank:
@@ -221,6 +614,13 @@ class BondMarket(BasicSpace):
             buyer.M -= amount
 
     def repay_bonds(self, capital, interests, government, buyer):
+        if buyer is self.central_bank:
+            names = "bond_redemption", "bond_redemption_interest"
+        else:
+            names = "bond_repayment", "bond_interest"
+        repaid = book(self.model, names[0], government, buyer, capital)
+        if book(self.model, names[1], government, buyer, interests) and repaid:
+            return
         government.iota_B += interests
         government.B -= capital
         government.M -= capital + interests
@@ -234,6 +634,8 @@ class BondMarket(BasicSpace):
             buyer.M += capital + interests
 
     def transfer_bonds(self, amount, bank, central_bank):
+        if book(self.model, "bond_transfer", bank, central_bank, amount):
+            return
         bank.B -= amount
         bank.M += amount
         central_bank.B += amount
@@ -0,0 +1,206 @@
+import numpy as np
+import pandas as pd
+
+# changes of stocks and flows made by each transaction type, as
+# (side, attribute, sign) with side 0 for the payer and 1 for the payee
+postings = {
+    "dole": ((0, "Z", 1), (0, "M", -1), (1, "Z", 1), (1, "M", 1)),
+    "tax": ((0, "T", 1), (0, "M", -1), (1, "T", 1), (1, "M", 1)),
+    "dividend": ((0, "Pi_d", 1), (0, "M", -1), (1, "Pi_d", 1), (1, "M", 1)),
+    "profit_transfer": ((0, "Pi", 1), (0, "M", 1), (1, "Pi", 1), (1, "M", 1)),
+    "advance": ((0, "A", 1), (0, "M", 1), (1, "A", 1), (1, "M", 1)),
+    "advance_repayment": ((0, "A", -1), (0, "M", -1), (1, "A", -1), (1, "M", -1)),
+    "advance_interest": ((0, "iota_A", 1), (0, "M", -1), (1, "iota_A", 1), (1, "M", -1)),
+    "equity_investment": ((0, "E", 1), (0, "M", -1), (1, "E", 1), (1, "M", 1)),
+    "equity_writeoff": ((0, "Pi_d", -1), (0, "E", -1), (1, "Pi_d", -1), (1, "E", -1)),
+    "equity_payout": ((0, "Pi_d", 1), (0, "M", -1), (1, "Pi_d", 1), (1, "M", 1)),
+    "delivery": ((0, "y_inv", -1),),
+    "wage": ((0, "W", 1), (0, "M", -1), (1, "W", 1), (1, "M", 1)),
+    "deposit": ((0, "D", 1), (0, "M", -1), (1, "D", 1), (1, "M", 1)),
+    "withdrawal": ((0, "D", -1), (0, "M", -1), (1, "D", -1), (1, "M", 1)),
+    "deposit_interest": ((0, "iota_D", 1), (0, "D", 1), (1, "iota_D", 1), (1, "D", 1)),
+    "loan": ((0, "L", 1), (0, "D", 1), (1, "L", 1), (1, "D", 1)),
+    "loan_repayment": ((0, "L", -1), (0, "D", -1), (1, "L", -1), (1, "D", -1)),
+    "loan_interest": ((0, "iota_L", 1), (0, "D", -1), (1, "iota_L", 1), (1, "D", -1)),
+    "default": ((0, "L", -1), (0, "L_def", 1), (1, "L", -1), (1, "L_def", 1)),
+    "bond_purchase": ((0, "B", 1), (0, "M", -1), (1, "B", 1), (1, "M", 1)),
+    "bond_monetization": ((0, "B", 1), (0, "M", 1), (1, "B", 1), (1, "M", 1)),
+    "bond_repayment": ((0, "B", -1), (0, "M", -1), (1, "B", -1), (1, "M", 1)),
+    "bond_interest": ((0, "iota_B", 1), (0, "M", -1), (1, "iota_B", 1), (1, "M", 1)),
+    "bond_redemption": ((0, "B", -1), (0, "M", -1), (1, "B", -1), (1, "M", -1)),
+    "bond_redemption_interest": ((0, "iota_B", 1), (0, "M", -1), (1, "iota_B", 1), (1, "M", -1)),
+    "bond_transfer": ((0, "B", -1), (0, "M", 1), (1, "B", 1), (1, "M", 1)),
+}
+
+
+def consumption(s):
+    # purchase of goods of sector s, recorded in the consumption of the client
+    return (0, "M", -1), (0, f"C{s}", 1), (1, "M", 1), (1, "Q", 1)
+
+
+# one applied transaction of the log
+entry = np.dtype([("type", np.int16), ("payer", np.int64), ("payee", np.int64), ("amount", np.float64)])
+
+
+class Ledger:
+    # transactions appended as (type, payer, payee, amount) to preallocated
+    # arrays and applied to the agents at once at the end of a phase, so
+    # that stocks and flows read within a phase are those at its start
+
+    def __init__(self, sectors=(1, 2), capacity=4096, log=False):
+        self.postings = dict(postings)
+        self.postings.update({f"consumption{s}": consumption(s) for s in sectors})
+        self.codes = {name: i for i, name in enumerate(self.postings)}
+        self.attributes = list(dict.fromkeys(a for p in self.postings.values() for _, a, _ in p))
+        self._table()
+        self.types = np.zeros(capacity, dtype=np.int16)
+        self.payers = np.zeros(capacity, dtype=np.int64)
+        self.payees = np.zeros(capacity, dtype=np.int64)
+        self.amounts = np.zeros(capacity)
+        self.size = 0
+        self.index = {}
+        self.agents = []
+        self.log = [] if log else None
+
+    def __len__(self):
+        return self.size
+
+    def _table(self):
+        # postings of all types as flat arrays, starting at starts[type]
+        flat = [(side, self.attributes.index(a), sign) for p in self.postings.values() for side, a, sign in p]
+        self.sides, self.targets, self.signs = (np.array(c) for c in zip(*flat))
+        self.counts = np.array([len(p) for p in self.postings.values()])
+        self.starts = np.cumsum(self.counts) - self.counts
+
+    def indices(self, agents):
+        # ledger indices of agents, registering new ones
+        index = self.index
+        for agent in agents:
+            if agent not in index:
+                index[agent] = len(self.agents)
+                self.agents.append(agent)
+        return np.fromiter((index[agent] for agent in agents), dtype=np.int64, count=len(agents))
+
+    def register(self, agent):
+        # ledger index of a new agent
+        i = self.index[agent] = len(self.agents)
+        self.agents.append(agent)
+        return i
+
+    def record(self, name, payer, payee, amount):
+        # append one transaction in O(1), with a dict lookup of each agent
+        i = self.size
+        if i == len(self.types):
+            self.reserve(2 * i)
+        index = self.index
+        self.types[i] = self.codes[name]
+        self.payers[i] = index[payer] if payer in index else self.register(payer)
+        self.payees[i] = index[payee] if payee in index else self.register(payee)
+        self.amounts[i] = amount
+        self.size = i + 1
+
+    def record_many(self, name, payers, payees, amounts):
+        # append transactions of one type between agents given by indices
+        payers = np.asarray(payers, dtype=np.int64)
+        n = len(payers)
+        self.reserve(self.size + n)
+        rows = slice(self.size, self.size + n)
+        self.types[rows] = self.codes[name]
+        self.payers[rows] = payers
+        self.payees[rows] = payees
+        self.amounts[rows] = amounts
+        self.size += n
+
+    def reserve(self, capacity):
+        current = len(self.types)
+        if capacity <= current:
+            return
+        capacity = max(capacity, 2 * current)
+        for name in ("types", "payers", "payees", "amounts"):
+            column = getattr(self, name)
+            grown = np.zeros(capacity, dtype=column.dtype)
+            grown[: self.size] = column[: self.size]
+            setattr(self, name, grown)
+
+    def entries(self):
+        # pending transactions as records
+        n = self.size
+        records = np.empty(n, dtype=entry)
+        records["type"] = self.types[:n]
+        records["payer"] = self.payers[:n]
+        records["payee"] = self.payees[:n]
+        records["amount"] = self.amounts[:n]
+        return records
+
+    def apply(self):
+        # scatter all pending postings into the stocks and flows of agents
+        n = self.size
+        if n == 0:
+            return
+        types, amounts = self.types[:n], self.amounts[:n]
+        counts = self.counts[types]
+        rows = np.repeat(np.arange(n), counts)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+        postings = self.starts[types][rows] + offsets
+        agents = np.where(self.sides[postings] == 0, self.payers[:n][rows], self.payees[:n][rows])
+        touched, agents = np.unique(agents, return_inverse=True)
+        deltas = np.zeros((len(self.attributes), len(touched)))
+        np.add.at(deltas, (self.targets[postings], agents), self.signs[postings] * amounts[rows])
+        self._write(touched, deltas)
+        if self.log is not None:
+            self.log.append(self.entries())
+        self.size = 0
+
+    def _write(self, touched, deltas):
+        # add deltas to columns of stored agents and attributes of others
+        agents = [self.agents[i] for i in touched]
+        stores = {}
+        for k, agent in enumerate(agents):
+            store = getattr(agent, "store", None)
+            if store is not None:
+                stores.setdefault(store, []).append(k)
+        stored = np.zeros(len(agents), dtype=bool)
+        for store, ks in stores.items():
+            ks = np.array(ks)
+            rows = np.array([agents[k]._row for k in ks])
+            for j, name in enumerate(self.attributes):
+                if name in store.data:
+                    store.data[name][rows] += deltas[j, ks]
+            stored[ks] = True
+        for j, name in enumerate(self.attributes):
+            for k in np.flatnonzero(deltas[j]):
+                if not stored[k] or name not in agents[k].store.data:
+                    agent = agents[k]
+                    setattr(agent, name, getattr(agent, name) + deltas[j, k])
+
+    def transactions(self):
+        # applied transactions of the log as a table
+        records = np.concatenate(self.log) if self.log else np.empty(0, dtype=entry)
+        names = np.array(list(self.postings), dtype=object)
+        ids = np.array([agent.id for agent in self.agents], dtype=np.int64)
+        return pd.DataFrame(
+            {
+                "type": names[records["type"]],
+                "payer": ids[records["payer"]],
+                "payee": ids[records["payee"]],
+                "amount": records["amount"],
+            }
+        )
+
+
+def ledger(model):
+    # ledger of a model, None when transactions are applied right away
+    return model.__dict__.get("ledger")
+
+
+def book(model, name, payer, payee, amount):
+    # check a transaction with the consistency monitor of a model and record
+    # it in its ledger, if any
+    monitor = model.__dict__.get("monitor")
+    ledger = model.__dict__.get("ledger")
+    if monitor is not None:
+        monitor.observe(name, payer, payee, amount, deferred=ledger is not None)
+    if ledger is None:
+        return False
+    ledger.record(name, payer, payee, amount)
+    return True
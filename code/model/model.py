@@ -1,334 +1,185 @@
+import os
 import pandas as pd
 import numpy as np
 import agentpy as ap
 from . import agents as ag
 from . import environment as env
+from . import population as pop
+from . import sfc
+from . import steady_state as ss
+from .cache import SteadyStateCache, default_directory
+from .consistency import ConsistencyMonitor, monitor
+from .ledger import Ledger, ledger
+from .recording import StreamRecorder
+from .roles import ColumnRoleIndex, RoleIndex
+from .streams import RandomStreams, peek, skip, stream
+from .tracing import Tracer, tracer
 
 
 class DualEcoModel(ap.Model):
 
-    sectors = [1, 2]
+    sectors = ss.sectors
+    columnar = False
+    streams = None
+    cache = SteadyStateCache(default_directory())
 
     def setup(self):
-        p = self.p
-        p = self.init_params(p)
-        p = self.calc_block_1(p)
-        p = self.calc_block_2(p)
-        p = self.calc_block_3(p)
-        p = self.calc_block_4(p)
+        self.init_params()
+        self.calc_steady_state()
 
     def init_params(self):
-        # define SFC variables by agent types
-        h_vars = [
-            "M_H",
-            "D_H",
-            "E_H",
-            "C",
-            "W_H",
-            "Z_H",
-            "T_H",
-            "iota_DH",
-            "Pi_dH",
-            "DeltaM_H",
-            "DeltaD_H",
-            "DeltaE_H",
-        ]
-        f_vars = [
-            "M_F",
-            "D_F",
-            "L_F",
-            "E_F",
-            "Q",
-            "W_F",
-            "T_F",
-            "iota_LF",
-            "iota_DF",
-            "Pi_dF",
-            "DeltaM_F",
-            "DeltaL_F",
-            "DeltaD_F",
-            "DeltaE_F",
-            "L_def_F",
-        ]
-        b_vars = [
-            "M_B",
-            "A_B",
-            "D_B",
-            "B_B",
-            "L_B",
-            "E_B",
-            "T_B",
-            "iota_AB",
-            "iota_BB",
-            "iota_LB",
-            "iota_DB",
-            "Pi_dB",
-            "DeltaA_B",
-            "DeltaB_B",
-            "DeltaM_B",
-            "DeltaL_B",
-            "DeltaD_B",
-            "DeltaE_B",
-            "L_def_B",
-        ]
-        g_vars = [
-            "M_G",
-            "B_G",
-            "W_G",
-            "Z_G",
-            "T_G",
-            "iota_BG",
-            "Pi_G",
-            "DeltaB_G",
-            "DeltaM_G",
-        ]
-        cb_vars = [
-            "M_CB",
-            "A_CB",
-            "B_CB",
-            "iota_ACB",
-            "iota_BCB",
-            "Pi_CB",
-            "DeltaA_CB",
-            "DeltaB_CB",
-            "DeltaM_CB",
-        ]
-
         # initialize value of SFC variables
         p = self.p
-        for s in self.sectors:
-            for v in f_vars:
-                p[f"{v}{s}"] = 0
-        for v in h_vars + b_vars + g_vars + cb_vars:
-            p[v] = 0
+        if isinstance(p, sfc.SFCState):
+            p = p.params
+        # sectors and their degree of formality, as a dict or, to be hashable
+        # in experiments and samples, as a tuple of (sector, formality) pairs
+        self.sectors = dict(p.get("sectors", self.sectors))
+        self.columnar = p.get("columnar", self.columnar)
+        if p.get("streams", False) and self.streams is None:
+            # buffered random streams of agent classes
+            seed = p.get("seed", None)
+            if seed is None:
+                seed = int(self.nprandom.integers(2**63))
+            self.streams = RandomStreams(seed)
+        trace = p.get("trace", False)
+        if trace and tracer(self) is None:
+            # events of sampled agents, with tracer options given as a dict
+            # or, to be hashable in experiments, as a tuple of pairs
+            self.tracer = Tracer(**({} if trace is True else dict(trace)))
+        if p.get("ledger", False) and ledger(self) is None:
+            # transactions applied in bulk at the end of each phase
+            self.ledger = Ledger(self.sectors)
+        if p.get("monitor", False) and monitor(self) is None:
+            # stock-flow consistency of each transaction, also comparing the
+            # changes of agents with the postings when set to "debug"
+            self.monitor = ConsistencyMonitor(self.sectors, debug=p["monitor"] == "debug")
+        recorder = p.get("recorder")
+        if recorder and self.__dict__.get("recorder") is None:
+            # recorded variables streamed to chunk files in a directory,
+            # given alone or with options as a dict or, to be hashable in
+            # experiments, as a tuple of pairs
+            options = {"directory": recorder} if isinstance(recorder, (str, os.PathLike)) else dict(recorder)
+            self.recorder = StreamRecorder(**options, run=self._run_id)
+        self.p = sfc.SFCState(p, self.sectors)
+
+    def calc_steady_state(self):
+        # compute steady state, reusing cached equilibria when available
+        p = self.p
+        cache = self.cache
+        key = ss.steady_state_key(p.params, self.sectors)
+        state = cache.get(key) if cache is not None else None
+        if state is not None:
+            p.update(state)
+            return
+        params = set(p.params)
+        self.calc_block_1()
+        self.calc_block_2()
+        self.calc_block_3()
+        self.calc_block_4()
+        if cache is not None:
+            cache.put(key, {k: v for k, v in p.items() if k not in params})
+
+    def update_params(self, **changes):
+        # recompute the steady-state blocks invalidated by parameter changes
+        if "sectors" in changes:
+            raise ValueError("sectors can not be updated, use init_params instead")
+        p = self.p
+        changed = {k for k, v in changes.items() if k not in p or p[k] != v}
+        p.update(changes)
+        updates = {}
+        for block, inputs in ss.block_dependencies(self.sectors).items():
+            if not changed & inputs:
+                continue
+            before = dict(p)
+            getattr(self, block)()
+            for k, v in p.items():
+                if k not in before or before[k] != v:
+                    changed.add(k)
+                    updates[k] = v
+        return updates
 
     def calc_block_1(self):
         # calculate steady state for firms
-        p = self.p
-        p["zeta_1"] = 1 / (1 + p["g"])
-        p["zeta_2"] = 1 - p["zeta_1"]
-
-        # for each sector of production
-        for s in self.sectors:
-            N = p[f"N_E{s}"] + p[f"N_W{s}"]
-            p[f"y{s}"] = p[f"phi{s}"] * N
-            p[f"W_F{s}"] = p[f"w{s}"] * N
-            if N > 0:
-                p[f"p{s}"] = (1 + p["m"]) * p[f"W_F{s}"] / p[f"y{s}"]
-                p[f"Q{s}"] = p[f"p{s}"] * p[f"y{s}"]
-            else:
-                p[f"p{s}"] = (1 + p["m"]) * p[f"w{s}"]
-                p[f"Q{s}"] = 0
-            p[f"y_inv{s}"] = p["theta_y"] * p[f"y{s}"]
-            p[f"Y_inv{s}"] = p[f"w{s}"] * p[f"y_inv{s}"] / p[f"phi{s}"]
-
-            if s == 1:
-                # for modern sector
-                p["M_F1"] = 0
-                p["D_F1"] = p["theta_W"] * p["W_F1"]
-                A = np.array(
-                    [
-                        [1, 0, 0, p["zeta_1"] * p["r_L"]],
-                        [p["tau"], -1, 0, 0],
-                        [p["rho"], -p["rho"], -1, 0],
-                        [1, -1, -1, p["zeta_2"]],
-                    ]
-                )
-                B = np.array(
-                    [
-                        p["Q1"] + p["zeta_1"] * p["r_D"] * p["D_F1"] - p["W_F1"],
-                        0,
-                        0,
-                        p["zeta_2"] * p["D_F1"],
-                    ]
-                )
-                X = np.linalg.solve(A, B)
-                p["Pi_F1"] = X[0]
-                p["T_F1"] = X[1]
-                p["Pi_dF1"] = X[2]
-                p["L_F1"] = X[3]
-                p["E_F1"] = p["D_F1"] - p["L_F1"]
-
-            else:
-                # for backward sector
-                p["L_F2"] = p["D_F2"] = p["T_F2"] = 0
-                p["Pi_F2"] = p["Q2"] - p["W_F2"]
-                p["Pi_dF2"] = p["rho"] - p["Pi_F2"]
-                p["M_F2"] = (p["Pi_F2"] - p["Pi_dF2"]) / p["zeta_2"]
-                p["E_F2"] = p["M_F2"]
-
-            # finalize interest and variation computation
-            p[f"iota_LF{s}"] = p["zeta_1"] * p["r_L"] * p[f"L_F{s}"]
-            p[f"iota_DF{s}"] = p["zeta_1"] * p["r_D"] * p[f"D_F{s}"]
-            p[f"DeltaL_F{s}"] = p["zeta_2"] * p[f"L_F{s}"]
-            p[f"DeltaD_F{s}"] = p["zeta_2"] * p[f"D_F{s}"]
-            p[f"DeltaM_F{s}"] = p["zeta_2"] * p[f"M_F{s}"]
-            p[f"DeltaE_F{s}"] = 0
-            p[f"L_def_F{s}"] = 0
+        ss.calc_block_1(self.p, self.sectors)
 
     def calc_block_2(self):
         # compute steady state for bank sector
-        p = self.p
-        p["A_B"] = 0
-        p["L_B"] = p["L_F1"]
-        A = np.array(
-            [
-                [0, 0, 0, 0, 0, 0, 1, -1],
-                [1, 0, 0, 0, -p["zeta_1"] * p["r_B"], 0, p["zeta_1"] * p["r_D"], 0],
-                [p["tau"], -1, 0, 0, 0, 0, 0, 0],
-                [p["rho"], -p["rho"], -1, 0, 0, 0, 0, 0],
-                [0, 0, 0, 1, -1, -1, 1, 0],
-                [1, -1, -1, 0, -p["zeta_2"], -p["zeta_2"], p["zeta_2"], 0],
-                [0, 0, 0, 1, -p["theta_E"], -p["theta_E"], 0, 0],
-                [0, 0, 0, 0, 0, 1, -p["theta_M"], 0],
-            ]
-        )
-        B = np.array(
-            [
-                p["D_F1"],
-                p["zeta_1"] * p["r_L"] * p["L_B"],
-                0,
-                0,
-                p["L_B"],
-                p["zeta_2"] * p["L_B"],
-                p["theta_E"] * p["L_B"],
-                0,
-            ]
-        )
-        X = np.linalg.solve(A, B)
-        p["Pi_B"] = X[0]
-        p["T_B"] = X[1]
-        p["Pi_dB"] = X[2]
-        p["E_B"] = X[3]
-        p["B_B"] = X[4]
-        p["M_B"] = X[5]
-        p["D_B"] = X[6]
-        p["D_H"] = X[7]
-
-        # finalize interest and variation computation
-        p["iota_LB"] = p["zeta_1"] * p["r_L"] * p["L_B"]
-        p["iota_DB"] = p["zeta_1"] * p["r_D"] * p["D_B"]
-        p["iota_BB"] = p["zeta_1"] * p["r_B"] * p["B_B"]
-        p["DeltaB_B"] = p["zeta_2"] * p["B_B"]
-        p["DeltaL_B"] = p["zeta_2"] * p["L_B"]
-        p["DeltaD_B"] = p["zeta_2"] * p["D_B"]
-        p["DeltaM_B"] = p["zeta_2"] * p["M_B"]
-        p["DeltaE_B"] = 0
-        p["L_def_B"] = 0
+        ss.calc_block_2(self.p, self.sectors)
 
     def calc_block_3(self):
         # compute steady state for households
-        p = self.p
-        p["C1"] = p["Q1"]
-        p["C2"] = p["Q2"]
-        p["W_G"] = p["w_G"] * p["N_WG"]
-        p["W_H"] = p["W_F1"] + p["W_F2"] + p["W_G"]
-        p["Z_H"] = p["kappa_Z"] * p["w_G"] * p["N_U"]
-        p["Pi_dH"] = p["Pi_dF1"] + p["Pi_dF2"] + p["Pi_dB"]
-        p["Y"] = p["W_H"] + p["Pi_dH"] + p["Z_H"] + p["zeta_1"] * p["r_D"] * p["D_H"]
-        p["T_H"] = p["tau"] * (p["Y"] - p["Z_H"])
-        p["Y_d"] = p["Y"] - p["T_H"]
-        p["M_H"] = ((p["Y_d"] - p["C1"] - p["C2"]) / p["zeta_2"]) - p["D_H"]
-
-        # finalize equities, interest and variation computation
-        p["E_H"] = p["E_F1"] + p["E_F2"] + p["E_B"]
-        p["iota_DH"] = p["zeta_1"] * p["r_D"] * p["D_H"]
-        p["DeltaD_H"] = p["zeta_2"] * p["D_H"]
-        p["DeltaM_H"] = p["zeta_2"] * p[f"M_H"]
+        ss.calc_block_3(self.p, self.sectors)
 
     def calc_block_4(self):
         # compute steady state for public sector
-        p = self.p
-        p["Z_G"] = p["Z_H"]
-        p["A_CB"] = p["M_G"] = 0
-        p["T_G"] = p["T_H"] + p["T_F1"] + p["T_B"]
-        A = np.array(
-            [
-                [1, -1, 0, 0, 0],
-                [0, 0, 1, 0, -1],
-                [0, 0, 0, 1, -1],
-                [1, 0, 0, p["zeta_2"] - p["zeta_1"] * p["r_B"], 0],
-                [0, 1, 0, 0, -p["zeta_1"] * p["r_B"]],
-            ]
-        )
-        B = np.array([0, 0, p["B_B"], p["W_G"] + p["Z_G"] - p["T_G"], 0])
-        X = np.linalg.solve(A, B)
-        p["Pi_G"] = X[0]
-        p["Pi_CB"] = X[1]
-        p["M_CB"] = X[2]
-        p["B_G"] = X[3]
-        p["B_CB"] = X[4]
-
-        # finalize interest and variation computation
-        p["iota_BG"] = p["zeta_1"] * p["r_B"] * p["B_G"]
-        p["iota_BCB"] = p["zeta_1"] * p["r_B"] * p["B_CB"]
-        p["DeltaB_G"] = p["zeta_2"] * p["B_G"]
-        p["DeltaB_CB"] = p["zeta_2"] * p["B_CB"]
-        p["DeltaM_G"] = p["zeta_2"] * p["M_G"]
-        p["DeltaM_CB"] = p["zeta_2"] * p["M_CB"]
+        ss.calc_block_4(self.p, self.sectors)
 
-    def create_households(self):
+    def household_roles(self):
+        # number and indicators of households of each role, in creation order
         p = self.p
-        bank_owners = ap.AgentList(self, p["N_B"], ag.Household)
-        bank_owners.s_EB = 1
-        bank_owners.s_E = 1
-
-        firm_owners1 = ap.AgentList(self, p["N_E1"], ag.Household)
-        firm_owners1.s_E = 1
-        firm_owners1.s_Y = 1
-
-        firm_owners2 = ap.AgentList(self, p["N_E2"], ag.Household)
-        firm_owners2.s_E = 1
-        firm_owners2.s_Y = 2
-
-        firm_owners = firm_owners1 + firm_owners2
-        owners = bank_owners + firm_owners
-        self.households = owners
-
-        private_workers1 = ap.AgentList(self, p["N_W1"], ag.Household)
-        private_workers1.s_Y = 1
-        private_workers1.s_W = 1
-
-        private_workers2 = ap.AgentList(self, p["N_W2"], ag.Household)
-        private_workers2.s_Y = 2
-        private_workers2.s_W = 1
-
-        public_workers = ap.AgentList(self, p["N_WG"], ag.Household)
-        public_workers.s_W = 1
-        public_workers.s_WG = 1
+        roles = [(p["N_B"], {"s_EB": 1, "s_E": 1})]
+        for s in self.sectors:
+            roles.append((p[f"N_E{s}"], {"s_E": 1, "s_Y": s}))
+        roles.append((p["N_WG"], {"s_W": 1, "s_WG": 1}))
+        for s in self.sectors:
+            roles.append((p[f"N_W{s}"], {"s_Y": s, "s_W": 1}))
+        roles.append((p["N_U"], {"s_U": 1}))
+        return roles
 
-        private_workers = private_workers1 + private_workers2
-        workers = public_workers + private_workers
-        self.households += workers
+    def firm_roles(self):
+        # number and characteristics of firms of each sector
+        p = self.p
+        roles = []
+        for s, n in self.sectors.items():
+            values = {"s_Y": s, "n_W": n, "n_T": n, "phi": p[f"phi{s}"]}
+            roles.append((p[f"N_E{s}"], values))
+        return roles
+
+    def create_agents(self, cls, roles):
+        # create agents of all roles, allocated in bulk as columns if required
+        if self.columnar:
+            return pop.build_agents(self, cls, roles)
+        agents = ap.AgentList(self)
+        for n, values in roles:
+            group = ap.AgentList(self, n, cls)
+            for k, v in values.items():
+                setattr(group, k, v)
+            agents += group
+        return agents
+
+    def index_agents(self, agents, cls):
+        # index agents by role flags, maintained when their flags change
+        indexes = self.__dict__.setdefault("indexes", {})
+        index = ColumnRoleIndex if isinstance(agents, pop.Population) else RoleIndex
+        indexes[cls.__name__] = index(self, agents, cls)
+
+    def select_households(self, **roles):
+        # households of given roles without scanning all households
+        return self.indexes["Household"].select(**roles)
+
+    def select_firms(self, **roles):
+        # firms of given roles without scanning all firms
+        return self.indexes["Firm"].select(**roles)
 
-        unemployed = ap.AgentList(self, p["N_U"], ag.Household)
-        unemployed.s_U = 1
-        self.households += unemployed
+    def create_households(self):
+        p = self.p
+        self.households = self.create_agents(ag.Household, self.household_roles())
         self.households.delta = p["delta"]
+        self.index_agents(self.households, ag.Household)
 
     def create_firms(self):
         p = self.p
-        firms1 = ap.AgentList(self, p["N_E1"], ag.Firm)
-        firms1.s_Y = 1
-        firms1.n_W = 1
-        firms1.n_T = 1
-        firms1.phi = p["phi1"]
-
-        firms2 = ap.AgentList(self, p["N_E2"], ag.Firm)
-        firms2.s_Y = 2
-        firms2.n_W = 0
-        firms2.n_T = 0
-        firms2.phi = p["phi2"]
-
-        self.firms = firms1 + firms2
+        self.firms = self.create_agents(ag.Firm, self.firm_roles())
         self.firms.m = p["m"]
         self.firms.delta = p["delta"]
         self.firms.theta_y = p["theta_y"]
         self.firms.upsilon_F = p["upsilon_F"]
+        self.index_agents(self.firms, ag.Firm)
 
     def create_banks(self):
         p = self.p
-        banks = ap.AgentList(self, p["N_B"], ag.Bank)
+        banks = self.create_agents(ag.Bank, [(p["N_B"], {})])
         banks.delta = p["delta"]
         banks.kappa_E = p["kappa_E"]
         banks.kappa_R = p["kappa_R"]
@@ -341,10 +192,9 @@ class DualEcoModel(ap.Model):
         self.central_bank = ag.CentralBank(self)
 
     def create_good_markets(self):
-        firms = self.firms
         markets = {}
         for s in self.sectors:
-            sector_firms = firms.select(firms.s_Y == s)
+            sector_firms = self.select_firms(s_Y=s)
             market = env.GoodMarket(self)
             market.add_suppliers(sector_firms)
             market.s_Y = s
@@ -354,54 +204,38 @@ class DualEcoModel(ap.Model):
     def create_labor_markets(self):
         government = self.government
         households = self.households
-        firms = self.firms
-
-        # populate formal labor market
-        formal_firms = firms.select(firms.s_Y == 1)
-        formal_market = env.LaborMarket(self)
-        formal_market.n_W = 1
-        formal_market.add_employers([government])
-        formal_market.add_employers(formal_firms)
-        formal_market.add_workers(households)
-
-        # create formal network for private sector
-        j = len(formal_firms)
-        private_workers = households.select(households.s_Y == 1)
-        for i, worker in enumerate(private_workers):
-            employer = formal_firms[i % j]
-            employer_pos = formal_market.positions[employer]
-            worker_pos = formal_market.positions[worker]
-            formal_market.graph.add_edge(employer_pos, worker_pos)
+        markets = {}
+        for n_W in [1, 0]:
+            # populate labor market of given formality
+            market_firms = self.select_firms(n_W=n_W)
+            market = env.LaborMarket(self)
+            market.n_W = n_W
+            if n_W == 1:
+                market.add_employers([government])
+            market.add_employers(market_firms)
+            market.add_workers(households)
+            markets[n_W] = market
+
+            # create labor network for each private sector
+            for s in self.sectors:
+                if self.sectors[s] != n_W:
+                    continue
+                sector_firms = self.select_firms(n_W=n_W, s_Y=s)
+                private_workers = self.select_households(s_Y=s)
+                slots = market.employer_slot(sector_firms)
+                employers = slots[np.arange(len(private_workers)) % len(slots)]
+                market.link_slots(employers, market.worker_slot(private_workers))
 
         # create formal network for public sector
-        public_workers = households.select(households.s_WG == 1)
-        employer_pos = formal_market.positions[government]
-        for i, worker in enumerate(public_workers):
-            worker_pos = formal_market.positions[worker]
-            formal_market.graph.add_edge(employer_pos, worker_pos)
-
-        # populate informal labor market
-        informal_firms = firms.select(firms.s_Y == 2)
-        informal_market = env.LaborMarket(self)
-        informal_market.n_W = 0
-        informal_market.add_employers(informal_firms)
-        informal_market.add_workers(households)
-
-        # create informal labor network
-        j = len(informal_firms)
-        private_workers = households.select(households.s_Y == 2)
-        for i, worker in enumerate(private_workers):
-            employer = informal_firms[i % j]
-            employer_pos = informal_market.positions[employer]
-            worker_pos = informal_market.positions[worker]
-            informal_market.graph.add_edge(employer_pos, worker_pos)
-        self.labor_markets = {1: formal_market, 0: informal_market}
+        formal_market = markets[1]
+        public_workers = self.select_households(s_WG=1)
+        formal_market.add_jobs(public_workers, [government] * len(public_workers))
+        self.labor_markets = markets
 
     def create_deposit_market(self):
         households = self.households
         banks = self.banks
-        firms = self.firms
-        formal_firms = firms.select(firms.s_Y == 1)
+        formal_firms = self.select_firms(n_T=1)
         market = env.DepositMarket(self)
         market.add_agents(formal_firms)
         market.add_agents(banks)
@@ -420,8 +254,7 @@ class DualEcoModel(ap.Model):
 
     def create_credit_market(self):
         banks = self.banks
-        firms = self.firms
-        formal_firms = firms.select(firms.s_Y == 1)
+        formal_firms = self.select_firms(n_T=1)
         market = env.CreditMarket(self)
         market.add_agents(self.banks)
         market.add_agents(formal_firms)
@@ -452,24 +285,22 @@ class DualEcoModel(ap.Model):
         self.economy = economy
 
         # create bank ownerships
-        owners = households.select(households.s_E == 1)
-        bank_owners = owners.select(owners.s_EB == 1)
+        bank_owners = self.select_households(s_E=1, s_EB=1)
         for bank, owner in zip(banks, bank_owners):
             bank.owner = owner
 
         # create firm ownerships
         for s in self.sectors:
-            sector_firms = firms.select(firms.s_Y == s)
-            sector_owners = owners.select(owners.s_Y == s)
+            sector_firms = self.select_firms(s_Y=s)
+            sector_owners = self.select_households(s_E=1, s_Y=s)
             for firm, owner in zip(sector_firms, sector_owners):
                 firm.owner = owner
 
     def share_initial_equities(self):
         # for firms
         p = self.p
-        firms = self.firms
         for s in self.sectors:
-            sector_firms = firms.select(firms.s_Y == s)
+            sector_firms = self.select_firms(s_Y=s)
             E = p[f"E_F{s}"] / len(sector_firms)
             for firm in sector_firms:
                 firm.E = E
@@ -487,20 +318,21 @@ class DualEcoModel(ap.Model):
         p = self.p
         banks = self.banks
         banks.r_L = p["r_L"]
-        firms = self.firms
-        formal_firms = firms.select(firms.s_Y == 1)
-        formal_firms.r_L
-
-        # for stocks and flows
-        L = p["L_F1"] / len(formal_firms)
-        iota_L = p["iota_LF1"] / len(formal_firms)
-        for firm in formal_firms:
-            firm.r_L = p["r_L"]
-            firm.L = L
-            firm.iota_L = iota_L
-            bank = firm.bank
-            bank.L += L
-            bank.iota_L += iota_L
+
+        # for stocks and flows of formal sectors
+        for s in self.sectors:
+            if self.sectors[s] != 1:
+                continue
+            sector_firms = self.select_firms(s_Y=s)
+            L = p[f"L_F{s}"] / len(sector_firms)
+            iota_L = p[f"iota_LF{s}"] / len(sector_firms)
+            for firm in sector_firms:
+                firm.r_L = p["r_L"]
+                firm.L = L
+                firm.iota_L = iota_L
+                bank = firm.bank
+                bank.L += L
+                bank.iota_L += iota_L
 
     def share_initial_deposits(self):
         # for interest rates
@@ -519,17 +351,19 @@ class DualEcoModel(ap.Model):
             bank.D += D
             bank.iota_D += iota_D
 
-        # for firms stocks and flows
-        firms = self.firms
-        formal_firms = firms.select(firms.s_Y == 1)
-        D = p["D_F1"] / len(formal_firms)
-        iota_D = p["iota_DF1"] / len(formal_firms)
-        for firm in formal_firms:
-            firm.D = D
-            firm.iota_D = iota_D
-            bank = firm.bank
-            bank.D += D
-            bank.iota_D += iota_D
+        # for formal firms stocks and flows
+        for s in self.sectors:
+            if self.sectors[s] != 1:
+                continue
+            sector_firms = self.select_firms(s_Y=s)
+            D = p[f"D_F{s}"] / len(sector_firms)
+            iota_D = p[f"iota_DF{s}"] / len(sector_firms)
+            for firm in sector_firms:
+                firm.D = D
+                firm.iota_D = iota_D
+                bank = firm.bank
+                bank.D += D
+                bank.iota_D += iota_D
 
     def share_initial_bonds(self):
         p = self.p
@@ -550,7 +384,6 @@ class DualEcoModel(ap.Model):
         # private sector
         p = self.p
         households = self.households
-        firms = self.firms
         banks = self.banks
         banks.r_A = p["r_A"]
         banks.M = p["M_B"] / len(banks)
@@ -558,7 +391,7 @@ class DualEcoModel(ap.Model):
         banks.iota_A = p["iota_AB"] / len(banks)
         households.M = p["M_H"] / len(households)
         for s in self.sectors:
-            sector_firms = firms.select(firms.s_Y == s)
+            sector_firms = self.select_firms(s_Y=s)
             sector_firms.M = p[f"M_F{s}"] / len(sector_firms)
 
         # public sector
@@ -571,9 +404,8 @@ class DualEcoModel(ap.Model):
 
     def share_initial_production(self):
         p = self.p
-        firms = self.firms
         for s in self.sectors:
-            sector_firms = firms.select(firms.s_Y == s)
+            sector_firms = self.select_firms(s_Y=s)
             sector_firms.Y_inv = p[f"Y_inv{s}"] / len(sector_firms)
             sector_firms.y_inv = p[f"y_inv{s}"] / len(sector_firms)
             sector_firms.y = p[f"Q{s}"] / (len(sector_firms) * p[f"p{s}"])
@@ -584,21 +416,19 @@ class DualEcoModel(ap.Model):
     def share_initial_wages(self):
         # for households
         p = self.p
-        households = self.households
-        public_workers = households.select(households.s_WG == 1)
+        public_workers = self.select_households(s_WG=1)
         public_workers.W = p["W_G"] / len(public_workers)
         public_workers.w = p["w_G"]
         for s in self.sectors:
-            private_workers = households.select(households.s_Y == s)
+            private_workers = self.select_households(s_Y=s)
             private_workers.W = p[f"W_F{s}"] / len(private_workers)
             private_workers.w = p[f"w{s}"]
-        unemployed = households.select(households.s_U == 1)
+        unemployed = self.select_households(s_U=1)
         unemployed.w = p["w_min"]
 
         # for firms
-        firms = self.firms
         for s in self.sectors:
-            sector_firms = firms.select(firms.s_Y == s)
+            sector_firms = self.select_firms(s_Y=s)
             sector_firms.W = p[f"W_F{s}"] / len(sector_firms)
             sector_firms.l = p[f"Q{s}"] / (len(sector_firms) * p[f"w{s}"])
             sector_firms.w = p[f"w{s}"]
@@ -611,27 +441,23 @@ class DualEcoModel(ap.Model):
     def share_initial_transfers(self):
         p = self.p
         government = self.government
-        households = self.households
-        unemployed = households.select(households.s_U == 1)
+        unemployed = self.select_households(s_U=1)
         unemployed.Z = p["Z_H"] / len(unemployed)
         government.Z = p["Z_G"]
 
     def share_initial_profits(self):
-        households = self.households
-        owners = households.select(households.s_E == 1)
 
         # for firms
         p = self.p
-        firms = self.firms
         for s in self.sectors:
-            sector_firms = firms.select(firms.s_Y == s)
-            sector_owners = owners.select(owners.s_Y == s)
+            sector_firms = self.select_firms(s_Y=s)
+            sector_owners = self.select_households(s_E=1, s_Y=s)
             sector_owners.Pi_d = p[f"Pi_dF{s}"] / len(sector_owners)
             sector_firms.Pi_d = p[f"Pi_dF{s}"] / len(sector_firms)
 
         # for banks
         banks = self.banks
-        bank_owners = owners.select(owners.s_EB == 1)
+        bank_owners = self.select_households(s_E=1, s_EB=1)
         bank_owners.Pi_d = p["Pi_dB"] / len(bank_owners)
         banks.Pi_d = p["Pi_dB"] / len(banks)
 
@@ -649,9 +475,8 @@ class DualEcoModel(ap.Model):
         households.T = Y * p["T_H"] / sum(Y)
 
         # for firms
-        firms = self.firms
         for s in self.sectors:
-            sector_firms = firms.select(firms.s_Y == s)
+            sector_firms = self.select_firms(s_Y=s)
             sector_firms.T = p[f"T_F{s}"] / len(sector_firms)
 
         # for banks and government
@@ -664,8 +489,140 @@ class DualEcoModel(ap.Model):
         households = self.households
         Y = households.W + households.Pi_d + households.iota_D
         Y_d = Y - households.T + households.Z
-        households.C1 = Y_d * p["C1"] / sum(Y_d)
-        households.C2 = Y_d * p["C2"] / sum(Y_d)
+        for s in self.sectors:
+            setattr(households, f"C{s}", Y_d * p[f"C{s}"] / sum(Y_d))
 
     def share_initial_prices(self):
         pass
+
+    def record(self, var_keys, value=None):
+        # stream recorded variables to files instead of memory, if enabled
+        recorder = self.__dict__.get("recorder")
+        if recorder is None:
+            return super().record(var_keys, value)
+        keys = [var_keys] if isinstance(var_keys, str) else var_keys
+        recorder.record(self.t, {k: getattr(self, k) if value is None else value for k in keys})
+
+    def record_panel(self, name, agents, attributes):
+        # attributes of agents at the current step, streamed if enabled
+        recorder = self.__dict__.get("recorder")
+        if recorder is None:
+            agents.record(attributes)
+            return
+        columns = {k: pop.values(agents, k) for k in attributes}
+        recorder.record_panel(self.t, name, pop.values(agents, "id"), columns)
+
+    def create_output(self):
+        recorder = self.__dict__.get("recorder")
+        if recorder is not None:
+            recorder.close()
+        super().create_output()
+
+    def apply_transactions(self):
+        # apply transactions booked during a phase in ledger mode
+        transactions = ledger(self)
+        if transactions is not None:
+            transactions.apply()
+
+    def search_jobs(self, households=None):
+        # job search of all households at once, one matching round per market
+        households = self.households if households is None else households
+        informal_market, formal_market = self.labor_markets[0], self.labor_markets[1]
+        random = stream(self, "Household")
+        n = len(households)
+        s_U, s_W, s_E, n_W = (pop.values(households, k) for k in ["s_U", "s_W", "s_E", "n_W"])
+
+        # reservation wage revisions
+        w, delta = pop.values(households, "w"), pop.values(households, "delta")
+        Pr = pop.values(households, "upsilon") * np.exp(-formal_market.upsilon * formal_market.u)
+        draws = random.random(n)
+        U = random.uniform(0, 1, n) * delta
+        w = np.where(s_U == 0, np.where(draws < Pr, w * (1 + U), w), np.where(draws < Pr, w, w * (1 - U)))
+        pop.assign(households, "w", w)
+        trace = tracer(self)
+        if trace:
+            trace.emit_many("job_search", self.t, pop.values(households, "id"), w, Pr)
+        chi_N = pop.values(households, "chi_N").astype(int)
+
+        # best formal jobs for households outside of the formal market
+        formal = np.full(n, -1, dtype=np.int64)
+        searching = np.flatnonzero(n_W == 0)
+        formal[searching] = formal_market.match(w[searching], chi_N[searching], random)
+        hired = formal >= 0
+        informal_market.release(households.select(hired & ((s_W == 1) | (s_E == 1))))
+        formal_market.hire(households.select(hired), formal[hired])
+
+        # best informal jobs for the unemployed
+        informal = np.full(n, -1, dtype=np.int64)
+        searching = np.flatnonzero((s_U == 1) & ~hired)
+        informal[searching] = informal_market.match(w[searching], chi_N[searching], random)
+        hired = informal >= 0
+        informal_market.hire(households.select(hired), informal[hired])
+
+    def plan_production(self, firms=None):
+        # production plans of all firms, using the random numbers drawn in
+        # the same order by Firm.plan_production for each firm: the positions
+        # of the draws of each firm are found by a scan over the firms, the
+        # revisions are then computed with array operations
+        firms = self.firms if firms is None else firms
+        get = lambda k: pop.values(firms, k).astype(float)
+        n = len(firms)
+        random = stream(self, "Firm")
+        u = peek(random, 4 * n)
+        delta = get("delta")
+
+        # revision of sales expectation and price markup
+        q_e, m, y_inv = get("q_e"), get("m"), get("y_inv")
+        q = get("Q") / get("p_Y")
+        up = q >= q_e
+        down = ~up & (q < get("y") + y_inv)
+
+        # probability of a wage revision when hiring or not
+        theta_y, phi, N = get("theta_y"), get("phi"), get("N")
+        decay = {n: np.exp(-market.upsilon * market.u) for n, market in self.labor_markets.items()}
+        n_W = pop.values(firms, "n_W")
+        Pr = get("upsilon") * np.array([decay[n] for n in n_W.tolist()])
+        hire = (1 - Pr) / ((1 - Pr) + Pr)
+        keep = Pr / (Pr + (1 - Pr))
+
+        # firms draw two revisions if any, a choice and a wage revision if
+        # chosen, so the position of the draws of a firm depends on the
+        # choices of the previous ones and is found by a python loop
+        first = np.zeros(n, dtype=np.int64)
+        revise = np.zeros(n, dtype=bool)
+        k = 0
+        rows = zip(up.tolist(), down.tolist(), q_e.tolist(), delta.tolist(), theta_y.tolist())
+        for i, (a, b, q_ei, d, t) in enumerate(rows):
+            first[i] = k
+            if a:
+                q_ei = q_ei * (1 + d * u[k])
+                k += 2
+            elif b:
+                q_ei = q_ei * (1 - d * u[k])
+                k += 2
+            hiring = (q_ei * (1 + t) - y_inv[i]) / phi[i] > N[i]
+            revise[i] = u[k] >= (hire[i] if hiring else keep[i])
+            k += 1 + revise[i]
+        skip(random, k)
+        U_q, U_m = delta * u[first], delta * u[first + 1]
+        U_w = delta * u[first + 2 * (up | down) + 1]
+
+        q_e = np.where(up, q_e * (1 + U_q), np.where(down, q_e * (1 - U_q), q_e))
+        m = np.where(up, m * (1 + U_m), np.where(down, m * (1 - U_m), m))
+
+        # desired production level and labor demand
+        y_star = q_e * (1 + theta_y) - y_inv
+        N_star = y_star / phi
+
+        # wage revision and price setting
+        hiring = N_star > N
+        w = get("w")
+        w = np.where(revise & hiring, w * (1 + U_w), np.where(revise & ~hiring, w * (1 - U_w), w))
+
+        for k, v in dict(q_e=q_e, m=m, y_star=y_star, N_star=N_star, w=w).items():
+            pop.assign(firms, k, v)
+        p_Y = (1 + m) * w / phi
+        pop.assign(firms, "p_Y", p_Y)
+        trace = tracer(self)
+        if trace:
+            trace.emit_many("price_revision", self.t, pop.values(firms, "id"), m, w, phi, p_Y)
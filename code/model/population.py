@@ -0,0 +1,256 @@
+import numpy as np
+import agentpy as ap
+from .roles import notify, notify_rows, role_flags
+
+
+class Defaults:
+    # record attributes assigned by an agent setup
+    def __init__(self):
+        object.__setattr__(self, "values", {})
+
+    def __setattr__(self, name, value):
+        self.values[name] = value
+
+
+def schema(cls):
+    # columns (name -> (dtype, default)) derived from agent setup defaults
+    defaults = Defaults()
+    cls.setup(defaults)
+    columns = {"id": (np.int64, 0)}
+    for name, value in defaults.values.items():
+        columns[name] = (column_type(name, value), value)
+    return columns
+
+
+def column_type(name, value):
+    # indicators and categories are integers, references are objects
+    if value is None or not np.isscalar(value):
+        return object
+    if name.startswith(("s_", "n_")):
+        return np.int64
+    return np.float64
+
+
+class Column:
+    # attribute of agent views stored in a column of their store
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, agent, cls=None):
+        if agent is None:
+            return self
+        return agent.store.data[self.name][agent._row]
+
+    def __set__(self, agent, value):
+        agent.store.data[self.name][agent._row] = value
+
+
+class RoleColumn(Column):
+    # role flag of agent views, reported to the role index when changed
+    __slots__ = ()
+
+    def __set__(self, agent, value):
+        column = agent.store.data[self.name]
+        old = column[agent._row]
+        column[agent._row] = value
+        if old != value:
+            notify(agent, self.name, old, column[agent._row])
+
+
+class AgentView:
+    # agent whose columns live in the arrays of a store, indexed by row
+
+    def __init__(self, row):
+        self._row = row
+
+    @property
+    def log(self):
+        return self.__dict__.setdefault("_log", {})
+
+    @property
+    def vars(self):
+        return list(self.store.data) + [k for k in self.__dict__ if k[0] != "_"]
+
+
+class ColumnStore:
+    # typed columns of all agents of a class, grown by bulk allocations
+
+    def __init__(self, model, cls, capacity=0):
+        self.model = model
+        self.cls = cls
+        self.columns = schema(cls)
+        self.data = {k: self._empty(k, capacity) for k in self.columns}
+        self.size = 0
+        self.agents = []
+        self.roles = set(role_flags(cls))
+        attrs = {k: RoleColumn(k) if k in self.roles else Column(k) for k in self.columns}
+        attrs.update(store=self, model=model, p=model.p, type=cls.__name__)
+        self.view = type(cls.__name__, (AgentView, cls), attrs)
+
+    def __len__(self):
+        return self.size
+
+    def allocate(self, n, **values):
+        # create n agents at once with given column values
+        n = int(n)
+        start, stop = self.size, self.size + n
+        self.reserve(stop)
+        for k, (_, default) in self.columns.items():
+            self.data[k][start:stop] = values.pop(k, default)
+        self.data["id"][start:stop] = model_ids(self.model, n)
+        self.size = stop
+        agents = list(map(self.view, range(start, stop)))
+        self.agents.extend(agents)
+
+        # values outside of the schema are kept by each agent
+        for k, v in values.items():
+            v = np.broadcast_to(v, (n,))
+            for agent, x in zip(agents, v):
+                setattr(agent, k, x)
+        return agents
+
+    def reserve(self, capacity):
+        # grow columns geometrically to hold the given number of agents
+        current = len(self.data["id"])
+        if capacity <= current:
+            return
+        capacity = max(capacity, 2 * current)
+        for k, column in self.data.items():
+            data = self._empty(k, capacity)
+            data[: self.size] = column[: self.size]
+            self.data[k] = data
+
+    def population(self, rows=None):
+        return Population(self.model, self, rows)
+
+    def _empty(self, name, n):
+        dtype, default = self.columns[name]
+        return np.full(n, default, dtype=dtype)
+
+
+def model_ids(model, n):
+    # reserve n consecutive object ids of the model
+    start = model._id_counter + 1
+    model._id_counter += n
+    return np.arange(start, start + n)
+
+
+def values(agents, name):
+    # attribute of all agents of a list as an array
+    values = getattr(agents, name)
+    return values if isinstance(values, np.ndarray) else np.array(list(values))
+
+
+def assign(agents, name, values):
+    # set an attribute of all agents of a list from an array
+    if isinstance(agents, Population):
+        setattr(agents, name, values)
+    else:
+        setattr(agents, name, ap.AttrIter(np.asarray(values).tolist()))
+
+
+def build_agents(model, cls, roles, store=None):
+    # allocate agents of all roles (count, columns) in one pass
+    store = ColumnStore(model, cls) if store is None else store
+    counts = np.array([int(n) for n, _ in roles], dtype=int)
+    keys = list(dict.fromkeys(k for _, columns in roles for k in columns))
+    values = {}
+    for k in keys:
+        default = store.columns[k][1] if k in store.columns else 0
+        values[k] = np.repeat([columns.get(k, default) for _, columns in roles], counts)
+    start = store.size
+    store.allocate(counts.sum(), **values)
+    return Population(model, store, np.arange(start, store.size))
+
+
+def invalidates_rows(method):
+    # list methods changing the agents of a population
+    def wrapper(self, *args, **kwargs):
+        self.__dict__.pop("_rows", None)
+        return method(self, *args, **kwargs)
+
+    wrapper.__name__ = method.__name__
+    return wrapper
+
+
+class Population(ap.AgentList):
+    # agent list of a column store, whose attributes are column arrays
+
+    def __init__(self, model, store, rows=None):
+        rows = np.arange(store.size) if rows is None else np.asarray(rows, dtype=int)
+        super().__init__(model, list(map(store.agents.__getitem__, rows.tolist())))
+        self.__dict__["store"] = store
+        self.__dict__["_rows"] = rows
+
+    @property
+    def rows(self):
+        # rows of the agents in their store, recomputed after list changes
+        rows = self.__dict__.get("_rows")
+        if rows is None:
+            rows = np.fromiter((agent._row for agent in self), dtype=int, count=len(self))
+            self.__dict__["_rows"] = rows
+        return rows
+
+    def __getattr__(self, name):
+        store = self.__dict__.get("store")
+        if store is not None and name in store.data:
+            return store.data[name][self.rows]
+        return super().__getattr__(name)
+
+    def __setattr__(self, name, value):
+        data = self.store.data
+        if isinstance(value, ap.AttrIter):
+            value = list(value)
+        if name in self.store.roles:
+            self._set_roles(name, value)
+        elif name in data:
+            data[name][self.rows] = value
+        elif isinstance(value, np.ndarray) and value.shape == (len(self),):
+            for agent, v in zip(self, value):
+                setattr(agent, name, v)
+        else:
+            super().__setattr__(name, value)
+
+    def _set_roles(self, name, value):
+        # write a role flag and report changed agents to the role index
+        column = self.store.data[name]
+        old = column[self.rows]
+        column[self.rows] = value
+        new = column[self.rows]
+        changed = old != new
+        notify_rows(self.store, name, self.rows[changed], old[changed], new[changed])
+
+    def __add__(self, other):
+        if isinstance(other, Population) and other.store is self.store:
+            return Population(self.model, self.store, np.concatenate([self.rows, other.rows]))
+        return ap.AgentList(self.model, self) + other
+
+    def select(self, selection):
+        selection = np.asarray(selection, dtype=bool)
+        return Population(self.model, self.store, self.rows[selection])
+
+    def sort(self, var_key, reverse=False):
+        column = self.store.data.get(var_key)
+        if column is None or column.dtype == object:
+            self.__dict__.pop("_rows", None)
+            return super().sort(var_key, reverse)
+        values = column[self.rows]
+        order = np.argsort(-values if reverse else values, kind="stable")
+        rows = self.rows[order]
+        self[:] = list(map(self.store.agents.__getitem__, rows.tolist()))
+        self.__dict__["_rows"] = rows
+        return self
+
+    append = invalidates_rows(ap.AgentList.append)
+    extend = invalidates_rows(ap.AgentList.extend)
+    insert = invalidates_rows(ap.AgentList.insert)
+    remove = invalidates_rows(ap.AgentList.remove)
+    pop = invalidates_rows(ap.AgentList.pop)
+    clear = invalidates_rows(ap.AgentList.clear)
+    reverse = invalidates_rows(ap.AgentList.reverse)
+    shuffle = invalidates_rows(ap.AgentList.shuffle)
+    __setitem__ = invalidates_rows(ap.AgentList.__setitem__)
+    __delitem__ = invalidates_rows(ap.AgentList.__delitem__)
+    __iadd__ = invalidates_rows(ap.AgentList.__iadd__)
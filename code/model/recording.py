@@ -0,0 +1,202 @@
+import os
+import glob
+import shutil
+
+import numpy as np
+import pandas as pd
+
+# file extension of each chunk format, parquet and arrow need pyarrow
+extensions = {"parquet": "parquet", "arrow": "arrow", "npz": "npz"}
+
+
+def default_format():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return "npz"
+    return "parquet"
+
+
+class Chunk:
+    # columns of at most size rows, variables missing from a row are NaN
+
+    def __init__(self, size):
+        self.size = size
+        self.columns = {}
+        self.rows = 0
+
+    def __len__(self):
+        return self.rows
+
+    def full(self, n=1):
+        return self.rows + n > self.size
+
+    def column(self, name, dtype=float):
+        column = self.columns.get(name)
+        if column is None:
+            column = self.columns[name] = np.full(self.size, np.nan if dtype is float else 0, dtype=dtype)
+        return column
+
+    def data(self):
+        return {k: v[: self.rows] for k, v in self.columns.items()}
+
+    def clear(self):
+        self.columns = {}
+        self.rows = 0
+
+
+class StreamRecorder:
+    # variables recorded at each step, and optional panels of agent
+    # attributes, buffered in columnar chunks and written to one file per
+    # chunk, so that memory stays bounded by the chunk size. runs of an
+    # experiment, given by their (sample_id, iteration), are written to their
+    # own subdirectory and their chunks carry both as columns
+
+    def __init__(self, directory, chunk=1024, format=None, run=None, overwrite=False):
+        self.format = default_format() if format is None else format
+        if self.format not in extensions:
+            raise ValueError(f"unknown format '{self.format}'")
+        self.directory = run_directory(directory, run)
+        self.run = {} if run is None else {k: v for k, v in zip(["sample_id", "iteration"], run) if v is not None}
+        self.chunk = chunk
+        self.variables = Chunk(chunk)
+        self.panels = {}
+        self.parts = {}
+        self.t = None
+        os.makedirs(self.directory, exist_ok=True)
+        # chunks of an earlier run would be read back with the new ones
+        recorded = glob.glob(os.path.join(self.directory, "*-*.*"))
+        if run is None:
+            recorded += glob.glob(os.path.join(self.directory, "run-*"))
+        if recorded and not overwrite:
+            raise FileExistsError(f"directory '{self.directory}' already holds recorded chunks")
+        for path in recorded:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+
+    def record(self, t, values):
+        # values of variables at step t, in the row of that step
+        chunk = self.variables
+        if t != self.t:
+            if chunk.full():
+                self.flush("variables", chunk)
+            chunk.column("t", np.int64)[chunk.rows] = t
+            chunk.rows += 1
+            self.t = t
+        row = chunk.rows - 1
+        for k, v in values.items():
+            chunk.column(k)[row] = v
+
+    def record_panel(self, t, name, ids, values):
+        # attributes of agents at step t, one row per agent
+        n = len(ids)
+        chunk = self.panels.get(name)
+        if chunk is None:
+            chunk = self.panels[name] = Chunk(max(self.chunk, n))
+        if chunk.full(n):
+            self.flush(name, chunk)
+            if n > chunk.size:
+                chunk = self.panels[name] = Chunk(n)
+        rows = slice(chunk.rows, chunk.rows + n)
+        chunk.column("t", np.int64)[rows] = t
+        chunk.column("id", np.int64)[rows] = ids
+        for k, v in values.items():
+            chunk.column(k)[rows] = v
+        chunk.rows += n
+
+    def flush(self, table, chunk):
+        if len(chunk) == 0:
+            return
+        part = self.parts.get(table, 0)
+        path = os.path.join(self.directory, f"{table}-{part:05d}.{extensions[self.format]}")
+        columns = {k: np.full(len(chunk), v, dtype=np.int64) for k, v in self.run.items()}
+        write_chunk(path, {**columns, **chunk.data()}, self.format)
+        self.parts[table] = part + 1
+        chunk.clear()
+
+    def close(self):
+        self.flush("variables", self.variables)
+        for name, chunk in self.panels.items():
+            self.flush(name, chunk)
+
+
+def write_chunk(path, columns, format):
+    if format == "npz":
+        np.savez(path, **columns)
+        return
+    import pyarrow as pa
+
+    table = pa.table(columns)
+    if format == "parquet":
+        import pyarrow.parquet as pq
+
+        pq.write_table(table, path)
+    else:
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+
+def read_chunk(path, columns=None):
+    # columns of one chunk file as a data frame, reading only those asked
+    if path.endswith(".npz"):
+        with np.load(path) as data:
+            names = data.files if columns is None else [k for k in columns if k in data.files]
+            return pd.DataFrame({k: data[k] for k in names})
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        names = pq.read_schema(path).names
+        columns = None if columns is None else [k for k in columns if k in names]
+        return pq.read_table(path, columns=columns).to_pandas()
+    import pyarrow as pa
+
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    columns = table.column_names if columns is None else [k for k in columns if k in table.column_names]
+    return table.select(columns).to_pandas()
+
+
+def run_directory(directory, run=None):
+    # subdirectory of a (sample_id, iteration) run of an experiment
+    if run is None:
+        return os.fspath(directory)
+    sample_id, iteration = (0 if i is None else i for i in run)
+    return os.path.join(directory, f"run-{sample_id:05d}-{iteration:05d}")
+
+
+def chunk_paths(directory, table="variables"):
+    # chunks of a single run, or of all runs of an experiment in run order
+    paths = glob.glob(os.path.join(directory, f"{table}-*.*"))
+    paths += glob.glob(os.path.join(directory, "run-*", f"{table}-*.*"))
+    return sorted(paths)
+
+
+def iter_chunks(directory, table="variables", columns=None):
+    # chunks of a recorded table one at a time, indexed by step, and by
+    # (sample_id, iteration, t) for the runs of an experiment
+    index = ["sample_id", "iteration", "t"]
+    for path in chunk_paths(directory, table):
+        chunk = read_chunk(path, columns if columns is None else index + list(columns))
+        if table == "variables":
+            chunk = chunk.set_index([k for k in index if k in chunk.columns])
+        yield chunk
+
+
+def read_step(directory, t, run=None):
+    # variables recorded at step t, reading the steps of each chunk first
+    for path in chunk_paths(run_directory(directory, run)):
+        steps = read_chunk(path, ["t"])["t"].to_numpy()
+        if t in steps:
+            chunk = read_chunk(path).drop(columns=["sample_id", "iteration"], errors="ignore")
+            row = chunk.set_index("t").loc[t]
+            return row[row.notna()].to_dict()
+    raise KeyError(t)
+
+
+def read_table(directory, table="variables", columns=None):
+    # whole recorded table, for outputs fitting in memory
+    chunks = list(iter_chunks(directory, table, columns))
+    return pd.concat(chunks) if chunks else pd.DataFrame()
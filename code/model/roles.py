@@ -0,0 +1,226 @@
+import bisect
+import inspect
+
+import numpy as np
+import agentpy as ap
+
+
+class RoleFlag:
+    # agent indicator whose changes are reported to the role index
+
+    def __set_name__(self, cls, name):
+        self.name = name
+
+    def __get__(self, agent, cls=None):
+        if agent is None:
+            return self
+        try:
+            return agent.__dict__[self.name]
+        except KeyError:
+            raise AttributeError(self.name)
+
+    def __set__(self, agent, value):
+        old = agent.__dict__.get(self.name, value)
+        agent.__dict__[self.name] = value
+        if old != value:
+            notify(agent, self.name, old, value)
+
+
+def role_flags(cls):
+    # names of the role flags of an agent class
+    return [k for k in dir(cls) if isinstance(inspect.getattr_static(cls, k), RoleFlag)]
+
+
+def notify(agent, name, old, value):
+    # move an agent between the groups of its index
+    indexes = agent.model.__dict__.get("indexes")
+    if indexes is not None and agent.type in indexes:
+        indexes[agent.type].move(agent, name, old, value)
+
+
+def notify_rows(store, name, rows, old, values):
+    # move agents of a column store between the groups of its index at once
+    indexes = store.model.__dict__.get("indexes")
+    index = None if indexes is None else indexes.get(store.cls.__name__)
+    if isinstance(index, ColumnRoleIndex) and index.store is store:
+        index.move_rows(name, rows, old, values)
+        return
+    for row, o, v in zip(rows.tolist(), old.tolist(), values.tolist()):
+        notify(store.agents[row], name, o, v)
+
+
+class RoleIndex:
+    # agents grouped by value of each role flag, in the order of the agent
+    # list: each group keeps the ranks of its agents sorted, and agents moved
+    # into a group are inserted at their rank
+
+    def __init__(self, model, agents, cls):
+        self.model = model
+        self.groups = {flag: {} for flag in role_flags(cls)}
+        self.ranks = {}
+        self.joined = 0
+        self.add(agents)
+
+    def __len__(self):
+        return len(self.ranks)
+
+    @property
+    def agents(self):
+        return list(self.ranks)
+
+    def add(self, agents):
+        for agent in agents:
+            self.ranks[agent] = self.joined
+            self.joined += 1
+        for flag in self.groups:
+            for agent in agents:
+                self._insert(flag, getattr(agent, flag), agent)
+
+    def remove(self, agents):
+        for flag in self.groups:
+            for agent in agents:
+                self._delete(flag, getattr(agent, flag), agent)
+        for agent in agents:
+            del self.ranks[agent]
+
+    def move(self, agent, flag, old, value):
+        if self._delete(flag, old, agent):
+            self._insert(flag, value, agent)
+
+    def _insert(self, flag, value, agent):
+        ranks, members = self.groups[flag].setdefault(value, ([], []))
+        rank = self.ranks[agent]
+        i = bisect.bisect(ranks, rank)
+        ranks.insert(i, rank)
+        members.insert(i, agent)
+
+    def _delete(self, flag, value, agent):
+        # remove an agent from a group, false if it is not in the group
+        group, rank = self.groups[flag].get(value), self.ranks.get(agent)
+        if group is None or rank is None:
+            return False
+        ranks, members = group
+        i = bisect.bisect_left(ranks, rank)
+        if i == len(ranks) or ranks[i] != rank:
+            return False
+        del ranks[i], members[i]
+        return True
+
+    def group(self, flag, value):
+        # agents having a role, in the order of the agent list
+        return self.groups[flag].get(value, ((), ()))[1]
+
+    def count(self, **roles):
+        if len(roles) == 1:
+            (flag, value), = roles.items()
+            return len(self.group(flag, value))
+        return len(self.find(**roles))
+
+    def find(self, **roles):
+        # agents having all given roles, scanning only the smallest group
+        smallest = min((self.group(flag, value) for flag, value in roles.items()), key=len)
+        return [a for a in smallest if all(getattr(a, k) == v for k, v in roles.items())]
+
+    def select(self, **roles):
+        # same as find, returned as an agent list
+        return ap.AgentList(self.model, self.find(**roles))
+
+
+def store_rows(agents):
+    # rows of agents in their column store, as kept by a population
+    if hasattr(type(agents), "rows"):
+        return np.asarray(agents.rows, dtype=np.int64)
+    return np.fromiter((agent._row for agent in agents), dtype=np.int64, count=len(agents))
+
+
+class ColumnRoleIndex(RoleIndex):
+    # rows of a column store grouped by value of each role flag, as boolean
+    # masks over the rows: moves flip two entries, and groups are read in the
+    # order of the store and returned as populations of their rows
+
+    def __init__(self, model, agents, cls):
+        self.model = model
+        self.store = agents.store
+        self.groups = {flag: {} for flag in role_flags(cls)}
+        self.indexed = np.zeros(0, dtype=bool)
+        self.add(agents)
+
+    def __len__(self):
+        return int(np.count_nonzero(self.indexed))
+
+    @property
+    def agents(self):
+        return self.store.population(np.flatnonzero(self.indexed))
+
+    def mask(self, flag, value):
+        groups = self.groups[flag]
+        if value not in groups:
+            groups[value] = np.zeros(len(self.indexed), dtype=bool)
+        return groups[value]
+
+    def _fit(self, n):
+        # grow the masks to the rows of the store
+        grown = n - len(self.indexed)
+        if grown > 0:
+            self.indexed = np.append(self.indexed, np.zeros(grown, dtype=bool))
+            for groups in self.groups.values():
+                for value, mask in groups.items():
+                    groups[value] = np.append(mask, np.zeros(grown, dtype=bool))
+
+    def add(self, agents):
+        rows = store_rows(agents)
+        self._fit(self.store.size)
+        self.indexed[rows] = True
+        for flag in self.groups:
+            values = self.store.data[flag][rows]
+            for value in np.unique(values).tolist():
+                self.mask(flag, value)[rows[values == value]] = True
+
+    def remove(self, agents):
+        rows = store_rows(agents)
+        self.indexed[rows] = False
+        for groups in self.groups.values():
+            for mask in groups.values():
+                mask[rows] = False
+
+    def move(self, agent, flag, old, value):
+        row = agent._row
+        if agent.store is not self.store or row >= len(self.indexed) or not self.indexed[row]:
+            return
+        self.groups[flag][old][row] = False
+        self.mask(flag, value)[row] = True
+
+    def move_rows(self, flag, rows, old, values):
+        # move rows with old flag values to new ones, all at once
+        indexed = rows < len(self.indexed)
+        indexed[indexed] = self.indexed[rows[indexed]]
+        rows, old, values = rows[indexed], old[indexed], values[indexed]
+        for value in np.unique(old).tolist():
+            self.groups[flag][value][rows[old == value]] = False
+        for value in np.unique(values).tolist():
+            self.mask(flag, value)[rows[values == value]] = True
+
+    def group(self, flag, value):
+        # rows having a role, in the order of the store
+        mask = self.groups[flag].get(value)
+        return np.flatnonzero(mask) if mask is not None else np.empty(0, dtype=np.int64)
+
+    def count(self, **roles):
+        if len(roles) == 1:
+            (flag, value), = roles.items()
+            mask = self.groups[flag].get(value)
+            return 0 if mask is None else int(np.count_nonzero(mask))
+        return len(self.find_rows(**roles))
+
+    def find_rows(self, **roles):
+        # rows having all given roles
+        masks = [self.groups[flag].get(value) for flag, value in roles.items()]
+        if any(mask is None for mask in masks):
+            return np.empty(0, dtype=np.int64)
+        return np.flatnonzero(np.logical_and.reduce(masks))
+
+    def find(self, **roles):
+        return self.store.population(self.find_rows(**roles))
+
+    def select(self, **roles):
+        return self.find(**roles)
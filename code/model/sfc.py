@@ -0,0 +1,235 @@
+from collections.abc import MutableMapping
+
+import numpy as np
+from . import steady_state as ss
+
+
+# definition of institutional sectors and matrix rows
+accounts = ["H", "F", "B", "G", "CB"]
+stock_rows = ["Y_inv", "M", "A", "D", "B", "L", "E"]
+flow_rows = [
+    "C",
+    "W",
+    "Z",
+    "T",
+    "iota_A",
+    "iota_B",
+    "iota_L",
+    "iota_D",
+    "Pi_d",
+    "Pi",
+    "DeltaA",
+    "DeltaB",
+    "DeltaM",
+    "DeltaL",
+    "DeltaD",
+    "DeltaE",
+    "L_def",
+]
+
+# define SFC variables by agent types, sectoral variables are suffixed by sector
+agent_vars = {
+    "H": ss.h_vars,
+    "F": [],
+    "B": ss.b_vars,
+    "G": ss.g_vars,
+    "CB": ss.cb_vars,
+}
+sector_vars = {
+    "H": ["C"],
+    "F": ss.f_vars,
+    "B": [],
+    "G": [],
+    "CB": [],
+}
+
+# matrix cells of SFC variables: variable -> (row, sign)
+stock_cells = {
+    "H": {"M_H": ("M", 1), "D_H": ("D", 1), "E_H": ("E", 1)},
+    "F": {
+        "Y_inv": ("Y_inv", 1),
+        "M_F": ("M", 1),
+        "D_F": ("D", 1),
+        "L_F": ("L", -1),
+        "E_F": ("E", -1),
+    },
+    "B": {
+        "M_B": ("M", 1),
+        "A_B": ("A", -1),
+        "D_B": ("D", -1),
+        "B_B": ("B", 1),
+        "L_B": ("L", 1),
+        "E_B": ("E", -1),
+    },
+    "G": {"M_G": ("M", 1), "B_G": ("B", -1)},
+    "CB": {"M_CB": ("M", -1), "A_CB": ("A", 1), "B_CB": ("B", 1)},
+}
+flow_cells = {
+    "H": {
+        "C": ("C", -1),
+        "W_H": ("W", 1),
+        "Z_H": ("Z", 1),
+        "T_H": ("T", -1),
+        "iota_DH": ("iota_D", 1),
+        "Pi_dH": ("Pi_d", 1),
+        "DeltaM_H": ("DeltaM", -1),
+        "DeltaD_H": ("DeltaD", -1),
+        "DeltaE_H": ("DeltaE", -1),
+    },
+    "F": {
+        "Q": ("C", 1),
+        "W_F": ("W", -1),
+        "T_F": ("T", -1),
+        "iota_LF": ("iota_L", -1),
+        "iota_DF": ("iota_D", 1),
+        "Pi_dF": ("Pi_d", -1),
+        "DeltaM_F": ("DeltaM", -1),
+        "DeltaL_F": ("DeltaL", 1),
+        "DeltaD_F": ("DeltaD", -1),
+        "DeltaE_F": ("DeltaE", 1),
+        "L_def_F": ("L_def", 1),
+    },
+    "B": {
+        "T_B": ("T", -1),
+        "iota_AB": ("iota_A", -1),
+        "iota_BB": ("iota_B", 1),
+        "iota_LB": ("iota_L", 1),
+        "iota_DB": ("iota_D", -1),
+        "Pi_dB": ("Pi_d", -1),
+        "DeltaA_B": ("DeltaA", 1),
+        "DeltaB_B": ("DeltaB", -1),
+        "DeltaM_B": ("DeltaM", -1),
+        "DeltaL_B": ("DeltaL", -1),
+        "DeltaD_B": ("DeltaD", 1),
+        "DeltaE_B": ("DeltaE", 1),
+        "L_def_B": ("L_def", -1),
+    },
+    "G": {
+        "W_G": ("W", -1),
+        "Z_G": ("Z", -1),
+        "T_G": ("T", 1),
+        "iota_BG": ("iota_B", -1),
+        "Pi_G": ("Pi", 1),
+        "DeltaB_G": ("DeltaB", 1),
+        "DeltaM_G": ("DeltaM", -1),
+    },
+    "CB": {
+        "iota_ACB": ("iota_A", 1),
+        "iota_BCB": ("iota_B", 1),
+        "Pi_CB": ("Pi", -1),
+        "DeltaA_CB": ("DeltaA", -1),
+        "DeltaB_CB": ("DeltaB", -1),
+        "DeltaM_CB": ("DeltaM", 1),
+    },
+}
+
+
+def create_index(sectors):
+    # list (agent type, variable, sector) of SFC variables in storage order
+    index = []
+    for agent in accounts:
+        for v in agent_vars[agent]:
+            index.append((agent, v, None))
+        for v in sector_vars[agent]:
+            for s in sectors:
+                index.append((agent, v, s))
+    return index
+
+
+def compile_cells(index, cells, rows):
+    # compile positions, matrix cells and signs of indexed variables
+    pos, cell, sign = [], [], []
+    for i, (agent, v, _) in enumerate(index):
+        if v in cells[agent]:
+            row, k = cells[agent][v]
+            pos.append(i)
+            cell.append(rows.index(row) * len(accounts) + accounts.index(agent))
+            sign.append(k)
+    return np.array(pos, dtype=int), np.array(cell, dtype=int), np.array(sign, dtype=float)
+
+
+class SFCState(MutableMapping):
+
+    def __init__(self, params=None, sectors=ss.sectors):
+        index = create_index(sectors)
+        keys = [v if s is None else f"{v}{s}" for _, v, s in index]
+        self.__dict__["sectors"] = list(sectors)
+        self.__dict__["index"] = index
+        self.__dict__["positions"] = {k: i for i, k in enumerate(keys)}
+        self.__dict__["vector"] = np.zeros(len(index))
+        self.__dict__["params"] = {} if params is None else dict(params)
+        self.__dict__["_stocks"] = compile_cells(index, stock_cells, stock_rows)
+        self.__dict__["_flows"] = compile_cells(index, flow_cells, flow_rows)
+
+        # move SFC variables already given as parameters into the vector
+        for key in keys:
+            if key in self.params:
+                self.vector[self.positions[key]] = self.params.pop(key)
+
+    def __getitem__(self, key):
+        i = self.positions.get(key)
+        if i is None:
+            return self.params[key]
+        return self.vector[i]
+
+    def __setitem__(self, key, value):
+        i = self.positions.get(key)
+        if i is None:
+            self.params[key] = value
+        else:
+            self.vector[i] = value
+
+    def __delitem__(self, key):
+        if key in self.positions:
+            raise KeyError(f"SFC variable '{key}' can not be removed")
+        del self.params[key]
+
+    def __iter__(self):
+        yield from self.positions
+        yield from self.params
+
+    def __len__(self):
+        return len(self.positions) + len(self.params)
+
+    def __getattr__(self, name):
+        if name.startswith("_") or "positions" not in self.__dict__:
+            raise AttributeError(name)
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    def __repr__(self):
+        return f"SFCState ({len(self.positions)} variables, {len(self.params)} parameters)"
+
+    def copy(self):
+        return dict(self)
+
+    def segment(self, agent):
+        # view of the variables of an agent type
+        i = accounts.index(agent)
+        start = sum(self._size(a) for a in accounts[:i])
+        return self.vector[start : start + self._size(agent)]
+
+    def sectoral(self, agent):
+        # view of the sectoral variables of an agent type (variable x sector)
+        segment = self.segment(agent)[len(agent_vars[agent]) :]
+        return segment.reshape(len(sector_vars[agent]), len(self.sectors))
+
+    def to_matrices(self):
+        # aggregate variables into stock and flow matrices (row x account)
+        stocks = self._aggregate(self._stocks, stock_rows)
+        flows = self._aggregate(self._flows, flow_rows)
+        return stocks, flows
+
+    def _size(self, agent):
+        return len(agent_vars[agent]) + len(sector_vars[agent]) * len(self.sectors)
+
+    def _aggregate(self, cells, rows):
+        pos, cell, sign = cells
+        n = len(rows) * len(accounts)
+        matrix = np.bincount(cell, weights=sign * self.vector[pos], minlength=n)
+        return matrix.reshape(len(rows), len(accounts))
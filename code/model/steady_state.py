@@ -0,0 +1,485 @@
+import sys
+import inspect
+import hashlib
+import functools
+
+import numpy as np
+import pandas as pd
+from .cache import hash_params
+from .dual import Dual, solve, where, matrix, expand_dims, stack as stack_values
+
+
+sectors = {1: 1, 2: 0}  # sector -> degree of formality
+
+# define SFC variables by agent types
+h_vars = [
+    "M_H",
+    "D_H",
+    "E_H",
+    "C",
+    "W_H",
+    "Z_H",
+    "T_H",
+    "iota_DH",
+    "Pi_dH",
+    "DeltaM_H",
+    "DeltaD_H",
+    "DeltaE_H",
+]
+f_vars = [
+    "Y_inv",
+    "M_F",
+    "D_F",
+    "L_F",
+    "E_F",
+    "Q",
+    "W_F",
+    "T_F",
+    "iota_LF",
+    "iota_DF",
+    "Pi_dF",
+    "DeltaM_F",
+    "DeltaL_F",
+    "DeltaD_F",
+    "DeltaE_F",
+    "L_def_F",
+]
+b_vars = [
+    "M_B",
+    "A_B",
+    "D_B",
+    "B_B",
+    "L_B",
+    "E_B",
+    "T_B",
+    "iota_AB",
+    "iota_BB",
+    "iota_LB",
+    "iota_DB",
+    "Pi_dB",
+    "DeltaA_B",
+    "DeltaB_B",
+    "DeltaM_B",
+    "DeltaL_B",
+    "DeltaD_B",
+    "DeltaE_B",
+    "L_def_B",
+]
+g_vars = [
+    "M_G",
+    "B_G",
+    "W_G",
+    "Z_G",
+    "T_G",
+    "iota_BG",
+    "Pi_G",
+    "DeltaB_G",
+    "DeltaM_G",
+]
+cb_vars = [
+    "M_CB",
+    "A_CB",
+    "B_CB",
+    "iota_ACB",
+    "iota_BCB",
+    "Pi_CB",
+    "DeltaA_CB",
+    "DeltaB_CB",
+    "DeltaM_CB",
+]
+
+# parameters and upstream variables read by each block (sectoral ones as templates)
+block_inputs = {
+    "calc_block_1": [
+        "g",
+        "m",
+        "tau",
+        "rho",
+        "r_L",
+        "r_D",
+        "theta_y",
+        "theta_W",
+        "N_E{s}",
+        "N_W{s}",
+        "phi{s}",
+        "w{s}",
+    ],
+    "calc_block_2": [
+        "zeta_1",
+        "zeta_2",
+        "tau",
+        "rho",
+        "r_B",
+        "r_D",
+        "r_L",
+        "theta_E",
+        "theta_M",
+        "L_F{s}",
+        "D_F{s}",
+    ],
+    "calc_block_3": [
+        "zeta_1",
+        "zeta_2",
+        "tau",
+        "r_D",
+        "kappa_Z",
+        "w_G",
+        "N_WG",
+        "N_U",
+        "Q{s}",
+        "W_F{s}",
+        "Pi_dF{s}",
+        "E_F{s}",
+        "Pi_dB",
+        "E_B",
+        "D_H",
+    ],
+    "calc_block_4": [
+        "zeta_1",
+        "zeta_2",
+        "r_B",
+        "Z_H",
+        "T_H",
+        "T_F{s}",
+        "T_B",
+        "B_B",
+        "W_G",
+    ],
+}
+
+# stocks and prices which can not be negative in a feasible steady state
+nonnegative_vars = [
+    "M_H",
+    "D_H",
+    "E_H",
+    "M_B",
+    "D_B",
+    "B_B",
+    "L_B",
+    "E_B",
+    "B_G",
+    "M_CB",
+    "B_CB",
+    "p{s}",
+    "M_F{s}",
+    "D_F{s}",
+    "L_F{s}",
+    "E_F{s}",
+]
+
+
+def block_dependencies(sectors=sectors):
+    # expand the inputs of each block for the given sectors
+    return {
+        block: {key.format(s=s) for key in keys for s in sectors}
+        for block, keys in block_inputs.items()
+    }
+
+
+@functools.lru_cache(maxsize=None)
+def equations_version():
+    # hash of the source of the steady-state equations, so that cached
+    # states are not served once the equations change
+    sources = [inspect.getsource(sys.modules[name]) for name in (__name__, Dual.__module__)]
+    return hashlib.sha256("".join(sources).encode()).hexdigest()
+
+
+def steady_state_key(params, sectors=sectors):
+    # hash the parameters read by the steady-state blocks and the version of
+    # the equations
+    keys = set.union(*block_dependencies(sectors).values())
+    params = dict(params, sectors=sectors, equations=equations_version())
+    return hash_params(params, keys | {"sectors", "equations"})
+
+
+def solve_steady_state(params, sectors=sectors, cache=None):
+    # solve steady states of a table of parameters (one row per candidate)
+    params = pd.DataFrame(params)
+    if cache is not None:
+        return solve_cached_steady_state(params, sectors, cache)
+    p = {k: params[k].to_numpy() for k in params.columns}
+    init_params(p, len(params), sectors)
+    # singular candidates get NaN states instead of failing the whole batch
+    calc_block_1(p, sectors, mask_singular=True)
+    calc_block_2(p, sectors, mask_singular=True)
+    calc_block_3(p, sectors)
+    calc_block_4(p, sectors, mask_singular=True)
+    return pd.DataFrame(p, index=params.index)
+
+
+def solve_cached_steady_state(params, sectors, cache):
+    # reuse cached steady states and solve the missing ones in one batch
+    keys = [steady_state_key(row, sectors) for row in params.to_dict("records")]
+    states = [cache.get(key) for key in keys]
+    missing = [i for i, state in enumerate(states) if state is None]
+    if missing:
+        solved = solve_steady_state(params.iloc[missing], sectors)
+        columns = [k for k in solved.columns if k not in params.columns]
+        values = solved[columns].to_numpy(dtype=float)
+        for i, row in zip(missing, values):
+            states[i] = dict(zip(columns, row))
+            cache.put(keys[i], states[i])
+    states = pd.DataFrame(states, index=params.index)
+    return pd.concat([params, states], axis=1)
+
+
+def steady_state_jacobian(params, wrt, of=None, sectors=sectors):
+    # derivatives of steady-state variables with respect to parameters,
+    # indexed by (candidate, variable) with one column per parameter
+    params = pd.DataFrame(params)
+    wrt = list(wrt)
+    p = {}
+    for key in params.columns:
+        p[key] = params[key].to_numpy()
+        if key in wrt:
+            tangent = np.zeros((len(params), len(wrt)))
+            tangent[:, wrt.index(key)] = 1
+            p[key] = Dual(p[key], tangent)
+    init_params(p, len(params), sectors)
+    calc_block_1(p, sectors)
+    calc_block_2(p, sectors)
+    calc_block_3(p, sectors)
+    calc_block_4(p, sectors)
+
+    # stack tangents of the requested variables (zero for constants)
+    of = [k for k in p if k not in params.columns] if of is None else list(of)
+    shape = (len(params), len(wrt))
+    tangents = [np.broadcast_to(p[k].tangent if isinstance(p[k], Dual) else 0.0, shape) for k in of]
+    values = np.stack(tangents, 1).reshape(-1, len(wrt))
+    index = pd.MultiIndex.from_product([params.index, of], names=["candidate", "variable"])
+    return pd.DataFrame(values, index=index, columns=wrt)
+
+
+def screen_steady_state(params, sectors=sectors, max_cond=1e10, tol=1e-9):
+    # flag infeasible candidates of a parameter table (one column per reason)
+    params = pd.DataFrame(params)
+    n = len(params)
+    p = {k: params[k].to_numpy() for k in params.columns}
+    flags = {}
+
+    # agent types and sectors without agents, and no public workers or
+    # unemployed to share public wages and transfers among
+    for key in ["N_B", "N_WG", "N_U"] + [f"N_E{s}" for s in sectors]:
+        flags[f"zero_{key}"] = ~(p[key] > 0)
+
+    # singular or ill-conditioned systems of blocks
+    p["zeta_1"] = 1 / (1 + p["g"])
+    p["zeta_2"] = 1 - p["zeta_1"]
+    matrices = {1: firm_matrix, 2: bank_matrix, 4: public_matrix}
+    if 1 not in sectors.values():
+        del matrices[1]
+    for k, rows in matrices.items():
+        cond = np.linalg.cond(matrix(rows(p), (n,)))
+        flags[f"ill_conditioned_block_{k}"] = ~(cond <= max_cond)
+
+    # sign constraints on stocks of the solved steady states
+    with np.errstate(divide="ignore", invalid="ignore"):
+        states = solve_steady_state(params, sectors)
+    computed = [k for k in states.columns if k not in params.columns]
+    flags["non_finite"] = ~np.isfinite(states[computed].to_numpy(dtype=float)).all(1)
+    for key in dict.fromkeys(v.format(s=s) for v in nonnegative_vars for s in sectors):
+        flags[f"negative_{key}"] = states[key].to_numpy() < -tol
+
+    # summarize rejection reasons of each candidate
+    flags = pd.DataFrame(flags, index=params.index)
+    flags["feasible"] = ~flags.any(axis=1)
+    reasons = flags.drop(columns="feasible")
+    flags["reasons"] = reasons.dot(reasons.columns + ", ").str.rstrip(", ")
+    return flags
+
+
+def init_params(p, n, sectors=sectors):
+    # initialize value of SFC variables
+    for s in sectors:
+        for v in f_vars:
+            p[f"{v}{s}"] = np.zeros(n)
+    for v in h_vars + b_vars + g_vars + cb_vars:
+        p[v] = np.zeros(n)
+
+
+def stack(p, v, sectors):
+    # gather a sectoral variable along a last sector axis
+    return stack_values([p[f"{v}{s}"] for s in sectors])
+
+
+def unstack(p, v, sectors, values):
+    # scatter a sectoral variable from its last sector axis
+    for j, s in enumerate(sectors):
+        p[f"{v}{s}"] = values[..., j][()]
+
+
+def expand(value):
+    # broadcast an aggregate variable along the sector axis
+    return expand_dims(value)
+
+
+def firm_matrix(p):
+    # system of modern firms: Pi_F, T_F, Pi_dF, L_F
+    return [
+        [1, 0, 0, p["zeta_1"] * p["r_L"]],
+        [p["tau"], -1, 0, 0],
+        [p["rho"], -p["rho"], -1, 0],
+        [1, -1, -1, p["zeta_2"]],
+    ]
+
+
+def bank_matrix(p):
+    # system of banks: Pi_B, T_B, Pi_dB, E_B, B_B, M_B, D_B, D_H
+    return [
+        [0, 0, 0, 0, 0, 0, 1, -1],
+        [1, 0, 0, 0, -p["zeta_1"] * p["r_B"], 0, p["zeta_1"] * p["r_D"], 0],
+        [p["tau"], -1, 0, 0, 0, 0, 0, 0],
+        [p["rho"], -p["rho"], -1, 0, 0, 0, 0, 0],
+        [0, 0, 0, 1, -1, -1, 1, 0],
+        [1, -1, -1, 0, -p["zeta_2"], -p["zeta_2"], p["zeta_2"], 0],
+        [0, 0, 0, 1, -p["theta_E"], -p["theta_E"], 0, 0],
+        [0, 0, 0, 0, 0, 1, -p["theta_M"], 0],
+    ]
+
+
+def public_matrix(p):
+    # system of public sector: Pi_G, Pi_CB, M_CB, B_G, B_CB
+    return [
+        [1, -1, 0, 0, 0],
+        [0, 0, 1, 0, -1],
+        [0, 0, 0, 1, -1],
+        [1, 0, 0, p["zeta_2"] - p["zeta_1"] * p["r_B"], 0],
+        [0, 1, 0, 0, -p["zeta_1"] * p["r_B"]],
+    ]
+
+
+def calc_block_1(p, sectors=sectors, mask_singular=False):
+    # calculate steady state for firms
+    p["zeta_1"] = 1 / (1 + p["g"])
+    p["zeta_2"] = 1 - p["zeta_1"]
+    zeta_1 = expand(p["zeta_1"])
+    zeta_2 = expand(p["zeta_2"])
+    rho = expand(p["rho"])
+    r_L, r_D = expand(p["r_L"]), expand(p["r_D"])
+    modern = np.array([sectors[s] == 1 for s in sectors])
+
+    # for all sectors of production at once
+    N = stack(p, "N_E", sectors) + stack(p, "N_W", sectors)
+    phi = stack(p, "phi", sectors)
+    w = stack(p, "w", sectors)
+    y = phi * N
+    W_F = w * N
+    price = (1 + expand(p["m"])) * where(N > 0, W_F, w) / where(N > 0, y, 1)
+    Q = price * y
+    y_inv = expand(p["theta_y"]) * y
+    Y_inv = w * y_inv / phi
+
+    # for modern sectors
+    zeros = np.zeros(np.shape(Q))
+    D_F = where(modern, expand(p["theta_W"]) * W_F, zeros)
+    if modern.any():
+        A = [[expand(v) for v in row] for row in firm_matrix(p)]
+        B = [Q + zeta_1 * r_D * D_F - W_F, 0, 0, zeta_2 * D_F]
+        X = solve(A, B, mask_singular)
+    else:
+        X = np.zeros((4,) + np.shape(Q))
+
+    # for backward sectors
+    Pi_F = where(modern, X[0], Q - W_F)
+    T_F = where(modern, X[1], zeros)
+    Pi_dF = where(modern, X[2], rho - Pi_F)
+    L_F = where(modern, X[3], zeros)
+    M_F = where(modern, zeros, (Pi_F - Pi_dF) / zeta_2)
+    E_F = where(modern, D_F - L_F, M_F)
+
+    # finalize interest and variation computation
+    sector_values = {
+        "y": y,
+        "W_F": W_F,
+        "p": price,
+        "Q": Q,
+        "y_inv": y_inv,
+        "Y_inv": Y_inv,
+        "M_F": M_F,
+        "D_F": D_F,
+        "L_F": L_F,
+        "E_F": E_F,
+        "Pi_F": Pi_F,
+        "T_F": T_F,
+        "Pi_dF": Pi_dF,
+        "iota_LF": zeta_1 * r_L * L_F,
+        "iota_DF": zeta_1 * r_D * D_F,
+        "DeltaL_F": zeta_2 * L_F,
+        "DeltaD_F": zeta_2 * D_F,
+        "DeltaM_F": zeta_2 * M_F,
+        "DeltaE_F": zeros,
+        "L_def_F": zeros,
+    }
+    for v, values in sector_values.items():
+        unstack(p, v, sectors, values)
+
+
+def calc_block_2(p, sectors=sectors, mask_singular=False):
+    # compute steady state for bank sector
+    zeros = np.zeros(np.shape(p["r_B"]))
+    p["A_B"] = zeros
+    p["L_B"] = stack(p, "L_F", sectors).sum(-1)
+    D_F = stack(p, "D_F", sectors).sum(-1)
+    A = bank_matrix(p)
+    B = [
+        D_F,
+        p["zeta_1"] * p["r_L"] * p["L_B"],
+        0,
+        0,
+        p["L_B"],
+        p["zeta_2"] * p["L_B"],
+        p["theta_E"] * p["L_B"],
+        0,
+    ]
+    X = solve(A, B, mask_singular)
+    p["Pi_B"], p["T_B"], p["Pi_dB"], p["E_B"] = X[:4]
+    p["B_B"], p["M_B"], p["D_B"], p["D_H"] = X[4:]
+
+    # finalize interest and variation computation
+    p["iota_LB"] = p["zeta_1"] * p["r_L"] * p["L_B"]
+    p["iota_DB"] = p["zeta_1"] * p["r_D"] * p["D_B"]
+    p["iota_BB"] = p["zeta_1"] * p["r_B"] * p["B_B"]
+    p["DeltaB_B"] = p["zeta_2"] * p["B_B"]
+    p["DeltaL_B"] = p["zeta_2"] * p["L_B"]
+    p["DeltaD_B"] = p["zeta_2"] * p["D_B"]
+    p["DeltaM_B"] = p["zeta_2"] * p["M_B"]
+    p["DeltaE_B"] = zeros
+    p["L_def_B"] = zeros
+
+
+def calc_block_3(p, sectors=sectors):
+    # compute steady state for households
+    C = stack(p, "Q", sectors)
+    unstack(p, "C", sectors, C)
+    p["W_G"] = p["w_G"] * p["N_WG"]
+    p["W_H"] = stack(p, "W_F", sectors).sum(-1) + p["W_G"]
+    p["Z_H"] = p["kappa_Z"] * p["w_G"] * p["N_U"]
+    p["Pi_dH"] = stack(p, "Pi_dF", sectors).sum(-1) + p["Pi_dB"]
+    p["Y"] = p["W_H"] + p["Pi_dH"] + p["Z_H"] + p["zeta_1"] * p["r_D"] * p["D_H"]
+    p["T_H"] = p["tau"] * (p["Y"] - p["Z_H"])
+    p["Y_d"] = p["Y"] - p["T_H"]
+    p["M_H"] = ((p["Y_d"] - C.sum(-1)) / p["zeta_2"]) - p["D_H"]
+
+    # finalize equities, interest and variation computation
+    p["E_H"] = stack(p, "E_F", sectors).sum(-1) + p["E_B"]
+    p["iota_DH"] = p["zeta_1"] * p["r_D"] * p["D_H"]
+    p["DeltaD_H"] = p["zeta_2"] * p["D_H"]
+    p["DeltaM_H"] = p["zeta_2"] * p["M_H"]
+
+
+def calc_block_4(p, sectors=sectors, mask_singular=False):
+    # compute steady state for public sector
+    zeros = np.zeros(np.shape(p["Z_H"]))
+    p["Z_G"] = p["Z_H"]
+    p["A_CB"] = p["M_G"] = zeros
+    p["T_G"] = p["T_H"] + stack(p, "T_F", sectors).sum(-1) + p["T_B"]
+    B = [0, 0, p["B_B"], p["W_G"] + p["Z_G"] - p["T_G"], 0]
+    p["Pi_G"], p["Pi_CB"], p["M_CB"], p["B_G"], p["B_CB"] = solve(public_matrix(p), B, mask_singular)
+
+    # finalize interest and variation computation
+    p["iota_BG"] = p["zeta_1"] * p["r_B"] * p["B_G"]
+    p["iota_BCB"] = p["zeta_1"] * p["r_B"] * p["B_CB"]
+    p["DeltaB_G"] = p["zeta_2"] * p["B_G"]
+    p["DeltaB_CB"] = p["zeta_2"] * p["B_CB"]
+    p["DeltaM_G"] = p["zeta_2"] * p["M_G"]
+    p["DeltaM_CB"] = p["zeta_2"] * p["M_CB"]
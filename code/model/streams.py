@@ -0,0 +1,106 @@
+import zlib
+
+import numpy as np
+
+
+class RandomStream:
+    # uniforms of one sub-stream drawn in blocks and served in order, from
+    # which uniform, bernoulli and weighted choice draws are computed as numpy
+    # generators compute them. integers and choice without p invert the
+    # uniforms instead, so their values differ from those of numpy generators
+
+    def __init__(self, seed, block=4096):
+        self.generator = np.random.default_rng(seed)
+        # other distributions are drawn from a child generator, so that they
+        # do not depend on how far the uniforms were drawn ahead
+        self.child = np.random.default_rng(self.generator.bit_generator.seed_seq.spawn(1)[0])
+        self.block = block
+        self.buffer = np.empty(0)
+        self.position = 0
+
+    def __getattr__(self, name):
+        return getattr(self.child, name)
+
+    def reserve(self, n):
+        # make at least n uniforms available, e.g. before a phase
+        available = len(self.buffer) - self.position
+        if available < n:
+            fresh = self.generator.random(max(n - available, self.block))
+            self.buffer = np.concatenate([self.buffer[self.position :], fresh])
+            self.position = 0
+
+    def random(self, size=None):
+        n = 1 if size is None else int(np.prod(size))
+        self.reserve(n)
+        u = self.buffer[self.position : self.position + n]
+        self.position += n
+        return float(u[0]) if size is None else u.reshape(size).copy()
+
+    def uniform(self, low=0.0, high=1.0, size=None):
+        return low + (high - low) * self.random(size)
+
+    def adjust(self, delta, size=None):
+        # relative adjustment drawn uniformly in [0, delta)
+        return self.uniform(0, delta, size)
+
+    def bernoulli(self, p, size=None):
+        # same outcome as choice([0, 1], p=[1 - p, p])
+        return self.random(size) >= (1 - p) / ((1 - p) + p)
+
+    def integers(self, low, high=None, size=None):
+        low, high = (0, low) if high is None else (low, high)
+        values = low + np.floor(np.multiply(self.random(size), high - low)).astype(np.int64)
+        return int(values) if size is None else values
+
+    def choice(self, a, size=None, replace=True, p=None):
+        if not replace:
+            return self.child.choice(a, size, replace, p)
+        a = np.arange(a) if np.isscalar(a) else np.asarray(a)
+        if p is None:
+            return a[self.integers(0, len(a), size)]
+        cdf = np.cumsum(p, dtype=float)
+        cdf /= cdf[-1]
+        return a[cdf.searchsorted(self.random(size), side="right")]
+
+
+class RandomStreams:
+    # independent streams of agent classes, spawned from one seed by name so
+    # that the draws of a class do not depend on the activity of others
+
+    def __init__(self, entropy, block=4096):
+        self.entropy = entropy
+        self.block = block
+        self.streams = {}
+
+    def __getitem__(self, name):
+        stream = self.streams.get(name)
+        if stream is None:
+            seed = np.random.SeedSequence(self.entropy, spawn_key=(zlib.crc32(name.encode()),))
+            stream = self.streams[name] = RandomStream(seed, self.block)
+        return stream
+
+
+def stream(model, name):
+    # random stream of an agent class, or the model generator without streams
+    streams = getattr(model, "streams", None)
+    return model.nprandom if streams is None else streams[name]
+
+
+def peek(random, n):
+    # next n uniforms of a stream or generator, without consuming them
+    if isinstance(random, RandomStream):
+        random.reserve(n)
+        return random.buffer[random.position : random.position + n].copy()
+    state = random.bit_generator.state
+    u = random.random(n)
+    random.bit_generator.state = state
+    return u
+
+
+def skip(random, n):
+    # consume the next n uniforms of a stream or generator
+    if isinstance(random, RandomStream):
+        random.reserve(n)
+        random.position += n
+    else:
+        random.random(n)
@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+# fields recorded by each event
+events = {
+    "job_search": ("w", "Pr"),
+    "price_revision": ("m", "w", "phi", "p_Y"),
+    "loan_decision": ("firm", "L_d", "L_max", "Pr", "choice", "r_L"),
+}
+
+# binary layout of one event
+record = np.dtype(
+    [("event", np.int16), ("t", np.int64), ("agent", np.int64), ("values", np.float64, (6,))]
+)
+
+
+class Tracer:
+    # events of sampled agents kept in a ring buffer, or flushed to a binary
+    # file of records each time the buffer is full
+
+    def __init__(self, capacity=2**16, sample=1, path=None):
+        self.codes = {name: i for i, name in enumerate(events)}
+        self.buffer = np.zeros(capacity, dtype=record)
+        self.sample = sample
+        self.path = path
+        self.count = 0
+        self.written = 0
+
+    def emit(self, name, agent, *values):
+        # record an event of an agent, if sampled
+        if agent.id % self.sample:
+            return
+        row = self.buffer[self.count % len(self.buffer)]
+        row["event"] = self.codes[name]
+        row["t"] = agent.model.t
+        row["agent"] = agent.id
+        row["values"] = np.nan
+        row["values"][: len(values)] = values
+        self.count += 1
+        if self.path is not None and self.count - self.written == len(self.buffer):
+            self.flush()
+
+    def emit_many(self, name, t, ids, *values):
+        # record an event of many agents at once, keeping sampled ones
+        ids = np.asarray(ids)
+        keep = ids % self.sample == 0
+        rows = np.zeros(int(keep.sum()), dtype=record)
+        rows["values"] = np.nan
+        rows["event"] = self.codes[name]
+        rows["t"] = t
+        rows["agent"] = ids[keep]
+        for j, v in enumerate(values):
+            rows["values"][:, j] = np.broadcast_to(v, ids.shape)[keep]
+        self._write(rows)
+
+    def _write(self, rows):
+        capacity = len(self.buffer)
+        if self.path is not None and self.count - self.written + len(rows) > capacity:
+            self.flush()
+            if len(rows) > capacity:
+                with open(self.path, "ab") as file:
+                    rows.tofile(file)
+                self.count += len(rows)
+                self.written = self.count
+                return
+        skipped = max(len(rows) - capacity, 0)
+        self.count += skipped
+        rows = rows[skipped:]
+        self.buffer[(self.count + np.arange(len(rows))) % capacity] = rows
+        self.count += len(rows)
+
+    def flush(self):
+        # write the events not written yet to the file
+        if self.path is None:
+            return
+        with open(self.path, "ab") as file:
+            self.records(self.count - self.written).tofile(file)
+        self.written = self.count
+
+    def records(self, n=None):
+        # last n events kept in the buffer, in order
+        kept = min(self.count, len(self.buffer))
+        n = kept if n is None else min(n, kept)
+        end = self.count % len(self.buffer)
+        order = np.arange(end - n, end) % len(self.buffer)
+        return self.buffer[order]
+
+    def frame(self, name):
+        return frame(self.records(), name)
+
+
+def frame(records, name):
+    # events of one kind as a table of their fields
+    records = records[records["event"] == list(events).index(name)]
+    fields = events[name]
+    data = {"t": records["t"], "agent": records["agent"]}
+    data.update({k: records["values"][:, i] for i, k in enumerate(fields)})
+    return pd.DataFrame(data)
+
+
+def read(path, name):
+    # events of one kind written to a binary file
+    return frame(np.fromfile(path, dtype=record), name)
+
+
+def tracer(model):
+    # tracer of a model, None when tracing is disabled
+    return model.__dict__.get("tracer")
@@ -0,0 +1,45 @@
+from bisect import bisect_left, insort
+
+
+class VacancyIndex:
+    # employer slots with open positions, ordered by offered wage
+
+    def __init__(self):
+        self.keys = []
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, slot):
+        return slot in self.entries
+
+    def update(self, slot, w, N_v):
+        # (re)insert an employer at its current wage, if it has vacancies
+        self.discard(slot)
+        if N_v > 0:
+            key = (w, slot)
+            insort(self.keys, key)
+            self.entries[slot] = key
+
+    def discard(self, slot):
+        key = self.entries.pop(slot, None)
+        if key is not None:
+            del self.keys[bisect_left(self.keys, key)]
+
+    def count(self, w):
+        # number of employers offering at least w
+        return len(self.keys) - bisect_left(self.keys, (w, -1))
+
+    def best_of_sample(self, w, n, total, random):
+        # best offer at or above w among n of total employers drawn without
+        # replacement: the number of such offers in the sample is
+        # hypergeometric and the best is the highest of their wage ranks
+        K, n = self.count(w), min(n, total)
+        if K == 0 or n <= 0:
+            return None
+        c = random.hypergeometric(K, total - K, n)
+        if c == 0:
+            return None
+        rank = random.choice(K, c, replace=False).max()
+        return self.keys[len(self.keys) - K + rank][1]
@@ -0,0 +1,71 @@
+import pytest
+import numpy as np
+from model.adjacency import BipartiteCSR
+
+
+@pytest.fixture
+def jobs():
+    rows = np.array([2, 0, 2, 1, 2])
+    cols = np.array([0, 1, 2, 3, 4])
+    return BipartiteCSR.from_edges(rows, cols, 4, 5)
+
+
+def test_from_edges(jobs):
+    assert len(jobs) == 5
+    assert list(jobs.degree) == [1, 1, 3, 0]
+    assert list(jobs.neighbors(2)) == [0, 2, 4]
+    assert list(jobs.neighbors(3)) == []
+    assert jobs.has_edge(0, 1)
+    assert not jobs.has_edge(0, 0)
+
+
+def test_edges_grouped_by_row(jobs):
+    rows, cols = jobs.edges()
+    assert list(rows) == [0, 1, 2, 2, 2]
+    assert list(cols) == [1, 3, 0, 2, 4]
+
+
+def test_add_edge_grows_rows(jobs):
+    for col in range(5, 10):
+        jobs.add_edge(3, col)
+    assert list(jobs.neighbors(3)) == [5, 6, 7, 8, 9]
+    assert list(jobs.neighbors(2)) == [0, 2, 4]
+    assert len(jobs) == 10
+
+
+def test_grow_only_full_rows(jobs):
+    start = jobs.start.copy()
+    jobs.add_edges([0, 0, 1], [2, 4, 0])
+    # row 0 is full and moved to the tail, row 1 fits in its spare capacity
+    assert jobs.start[0] >= start[2] + jobs.capacity[2]
+    assert list(jobs.start[1:]) == list(start[1:])
+    assert list(jobs.capacity[:2]) == [6, 2]
+    assert list(jobs.neighbors(0)) == [1, 2, 4]
+    assert list(jobs.neighbors(1)) == [3, 0]
+    assert list(jobs.neighbors(2)) == [0, 2, 4]
+
+
+def test_remove_edges(jobs):
+    jobs.remove_edges([2, 2, 1], [0, 4, 3])
+    assert list(jobs.degree) == [1, 0, 1, 0]
+    assert list(jobs.neighbors(2)) == [2]
+    assert list(jobs.neighbors(0)) == [1]
+    jobs.add_edges([2, 2], [1, 3])
+    assert list(jobs.neighbors(2)) == [2, 1, 3]
+
+
+def test_remove_edge(jobs):
+    jobs.remove_edge(2, 0)
+    assert sorted(jobs.neighbors(2)) == [2, 4]
+    assert not jobs.has_edge(2, 0)
+    with pytest.raises(KeyError):
+        jobs.remove_edge(2, 0)
+
+
+def test_add_rows(jobs):
+    jobs.add_rows(2)
+    assert jobs.n_rows == 6
+    jobs.add_edge(5, 0)
+    assert list(jobs.neighbors(5)) == [0]
+    jobs.clear_row(5)
+    assert len(jobs.neighbors(5)) == 0
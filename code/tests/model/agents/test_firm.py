@@ -282,7 +282,7 @@ def test_apply_for_credit(firm1, D, M, L_d):
 @pytest.fixture
 def workers(model, labor_markets):
     workers = ap.AgentList(model, 5)
-    labor_markets[1].neighbors.return_value = workers
+    labor_markets[1].neighbors.return_value = ap.AgentIter(model, workers)
     return workers
 
 
@@ -0,0 +1,92 @@
+import os
+import pytest
+import numpy as np
+
+from model.cache import SteadyStateCache, hash_params, default_directory
+
+
+def test_hash_is_canonical():
+    p1 = {"a": 1, "b": 0.5, "c": {1: 1, 2: 0}}
+    p2 = {"c": {1: 1, 2: 0}, "b": np.float64(0.5), "a": np.int64(1)}
+    assert hash_params(p1) == hash_params(p2)
+    assert hash_params(p1) != hash_params(dict(p1, b=0.6))
+
+
+def test_hash_selected_keys():
+    p1 = {"a": 1, "b": 0.5, "seed": 1}
+    p2 = {"a": 1, "b": 0.5, "seed": 2}
+    assert hash_params(p1, ["a", "b", "x"]) == hash_params(p2, ["a", "b", "x"])
+    assert hash_params(p1) != hash_params(p2)
+
+
+def test_default_directory(monkeypatch, tmp_path):
+    monkeypatch.setenv("DUALECO_CACHE_DIR", str(tmp_path))
+    assert default_directory() == str(tmp_path)
+    monkeypatch.setenv("DUALECO_CACHE_DIR", "")
+    assert default_directory() is None
+    monkeypatch.delenv("DUALECO_CACHE_DIR")
+    assert default_directory() is None
+
+
+def test_get_missing_state():
+    cache = SteadyStateCache()
+    assert cache.get("key") is None
+    assert cache.misses == 1
+
+
+def test_put_and_get_in_memory():
+    cache = SteadyStateCache()
+    cache.put("key", {"x": 1, "y": np.float64(2.5)})
+    assert cache.get("key") == {"x": 1.0, "y": 2.5}
+    assert "key" in cache
+    assert cache.hits == 1
+
+
+def test_refuse_non_finite_states(tmp_path):
+    cache = SteadyStateCache(tmp_path)
+    cache.put("key", {"x": 1.0, "y": np.nan})
+    cache.put("key", {"x": np.inf})
+    assert "key" not in cache
+    assert not os.listdir(tmp_path)
+
+
+def test_evict_least_recently_used():
+    cache = SteadyStateCache(maxsize=2)
+    cache.put("a", {"x": 1})
+    cache.put("b", {"x": 2})
+    cache.get("a")
+    cache.put("c", {"x": 3})
+    assert list(cache.memory) == ["a", "c"]
+    assert cache.get("b") is None
+
+
+def test_persist_on_disk(tmp_path):
+    cache1 = SteadyStateCache(tmp_path)
+    cache1.put("key", {"x": 1.5, "y": -2.0})
+    assert os.path.exists(tmp_path / "key.npz")
+
+    cache2 = SteadyStateCache(tmp_path)
+    assert cache2.get("key") == {"x": 1.5, "y": -2.0}
+    assert "key" in cache2.memory
+
+
+def test_reload_evicted_states_from_disk(tmp_path):
+    cache = SteadyStateCache(tmp_path, maxsize=1)
+    cache.put("a", {"x": 1})
+    cache.put("b", {"x": 2})
+    assert "a" not in cache.memory
+    assert cache.get("a") == {"x": 1.0}
+
+
+def test_ignore_corrupted_files(tmp_path):
+    (tmp_path / "key.npz").write_bytes(b"corrupted")
+    cache = SteadyStateCache(tmp_path)
+    assert cache.get("key") is None
+
+
+def test_clear(tmp_path):
+    cache = SteadyStateCache(tmp_path)
+    cache.put("key", {"x": 1})
+    cache.clear()
+    assert cache.get("key") is None
+    assert not os.listdir(tmp_path)
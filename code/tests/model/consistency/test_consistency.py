@@ -0,0 +1,198 @@
+import pytest
+import numpy as np
+import agentpy as ap
+
+from model import agents as ag
+from model.consistency import ConsistencyMonitor, flow_cell, monitor
+from model.environment import BondMarket, CreditMarket, DepositMarket, Economy, GoodMarket, LaborMarket
+from model.ledger import Ledger, book
+from model.model import DualEcoModel
+from model.sfc import accounts, flow_rows
+
+
+@pytest.fixture
+def model():
+    model = ap.Model({})
+    model.nprandom = np.random.default_rng(0)
+    model.monitor = ConsistencyMonitor()
+    return model
+
+
+@pytest.fixture
+def sectors(model):
+    household, firm, bank = ag.Household(model), ag.Firm(model), ag.Bank(model)
+    government, central_bank = ag.Government(model), ag.CentralBank(model)
+    for agent in [household, firm, bank, government, central_bank]:
+        for name in ["M", "A", "B", "D", "L", "L_def", "E", "Q", "C1", "Pi", "Pi_d", "Z", "W", "T"]:
+            setattr(agent, name, 100.0)
+        for name in ["iota_A", "iota_B", "iota_D", "iota_L"]:
+            setattr(agent, name, 0.0)
+    firm.p_Y = 2.0
+    return household, firm, bank, government, central_bank
+
+
+def run_transactions(model, sectors):
+    household, firm, bank, government, central_bank = sectors
+    economy = Economy(model)
+    economy.pay_doles(1.0, government, household)
+    economy.pay_taxes(2.0, household, government)
+    economy.pay_taxes(3.0, firm, government)
+    economy.pay_dividends(4.0, firm, household)
+    economy.transfer_profits(5.0, central_bank, government)
+    economy.give_advances(6.0, central_bank, bank)
+    economy.repay_advances(2.0, 1.0, bank, central_bank)
+    economy.invest_equities(7.0, household, firm)
+    economy.reimburse_equities(firm, household)
+    goods = GoodMarket(model)
+    goods.s_Y = 1
+    goods.consume_goods(8.0, household, firm)
+    LaborMarket(model).pay_wages(9.0, firm, household)
+    deposits = DepositMarket(model)
+    deposits.make_deposits(10.0, household, bank)
+    deposits.withdraw_deposits(3.0, bank, household)
+    deposits.pay_interests(1.0, bank, firm)
+    credit = CreditMarket(model)
+    credit.give_loans(11.0, bank, firm)
+    credit.repay_loans(4.0, 2.0, firm, bank)
+    credit.make_defaults(1.0, firm, bank)
+    bonds = BondMarket(model)
+    bonds.central_bank = central_bank
+    bonds.buy_bonds(12.0, bank, government)
+    bonds.buy_bonds(5.0, central_bank, government)
+    bonds.repay_bonds(3.0, 1.0, government, bank)
+    bonds.repay_bonds(2.0, 1.0, government, central_bank)
+    bonds.transfer_bonds(4.0, bank, central_bank)
+
+
+@pytest.mark.parametrize("booked", [False, True])
+def test_consistent_transactions(model, sectors, booked):
+    if booked:
+        model.ledger = Ledger()
+    run_transactions(model, sectors)
+    checks = model.monitor
+    assert checks.count == 28
+    assert checks.violations == 0
+    assert checks.first is None
+    assert checks.rows() == pytest.approx(np.zeros(len(flow_rows)))
+    assert checks.columns() == pytest.approx(np.zeros(len(accounts)))
+    checks.check()
+
+
+def test_flows_by_transaction_type(model, sectors):
+    household, firm, bank, government, central_bank = sectors
+    Economy(model).pay_taxes(2.0, household, government)
+    Economy(model).pay_taxes(3.0, firm, government)
+    flows = model.monitor.flows[model.monitor.codes["tax"]]
+    row = flows[flow_rows.index("T")]
+    assert list(row) == [-2.0, -3.0, 0.0, 5.0, 0.0]
+    assert list(flows[flow_rows.index("DeltaM")]) == [2.0, 3.0, 0.0, -5.0, 0.0]
+
+
+def test_report_first_inconsistent_transaction(model, sectors):
+    household, firm, bank, government, central_bank = sectors
+    economy = Economy(model)
+    economy.pay_taxes(2.0, household, government)
+    economy.pay_doles(1.0, firm, household)
+    economy.pay_taxes(np.nan, household, government)
+    checks = model.monitor
+    assert checks.violations == 2
+    assert checks.first == {"transaction": 1, "type": "dole", "payer": firm.id, "payee": household.id, "amount": 1.0}
+    with pytest.raises(ValueError, match="transaction 1 \\(dole"):
+        checks.check()
+
+
+def test_observe_many(model, sectors):
+    household, firm, bank, government, central_bank = sectors
+    checks = model.monitor
+    checks.observe_many("loan", [bank] * 4, [firm] * 4, [1.0, 2.0, np.inf, np.nan])
+    assert checks.count == 4
+    assert checks.violations == 2
+    assert checks.first["transaction"] == 2
+    assert np.isnan(checks.flows[checks.codes["loan"]][flow_rows.index("DeltaL")][1])
+
+
+def test_flow_cells_of_attributes():
+    assert flow_cell("H", "C2") == ("C", -1)
+    assert flow_cell("F", "Q") == ("C", 1)
+    assert flow_cell("H", "iota_D") == ("iota_D", 1)
+    assert flow_cell("B", "L") == ("DeltaL", -1)
+    assert flow_cell("F", "Z") is None
+
+
+def test_monitor_param():
+    model = DualEcoModel({"monitor": True})
+    model.init_params()
+    assert isinstance(monitor(model), ConsistencyMonitor)
+    assert monitor(DualEcoModel({})) is None
+
+
+@pytest.mark.parametrize("booked", [False, True])
+def test_clear_good_market(model, booked):
+    if booked:
+        model.ledger = Ledger()
+    firms = ap.AgentList(model, 2, ag.Firm)
+    firms.p_Y = 1.0
+    firms.y_inv = 10.0
+    households = ap.AgentList(model, 4, ag.Household)
+    households.M = 10.0
+    households.C1_star = 8.0
+    households.chiY = 2
+    market = GoodMarket(model)
+    market.s_Y = 1
+    market.add_suppliers(firms)
+    market.clear(households)
+    if booked:
+        model.ledger.apply()
+    checks = model.monitor
+    # three purchases, the last household finding no goods left, and the
+    # deliveries of both firms
+    assert checks.count == 5
+    assert checks.violations == 0
+    assert list(households.C1) == pytest.approx([8.0, 8.0, 2.0, 0.0])
+    assert list(firms.Q) == pytest.approx([10.0, 8.0])
+    assert checks.flows[checks.codes["consumption1"]][flow_rows.index("C")][:2] == pytest.approx([-18.0, 18.0])
+
+
+@pytest.mark.parametrize("booked", [False, True])
+def test_debug_consistent_transactions(model, sectors, booked):
+    model.monitor = ConsistencyMonitor(debug=True)
+    if booked:
+        model.ledger = Ledger()
+    run_transactions(model, sectors)
+    model.monitor.check()
+    assert model.monitor.violations == 0
+
+
+class UnbalancedEconomy(Economy):
+    def pay_taxes(self, amount, payer, government):
+        if book(self.model, "tax", payer, government, amount):
+            return
+        payer.T += amount
+        payer.M -= amount
+        government.T += amount
+
+
+@pytest.mark.parametrize("debug", [False, True])
+def test_debug_catches_unbalanced_mutation(model, sectors, debug):
+    household, firm, bank, government, central_bank = sectors
+    model.monitor = ConsistencyMonitor(debug=debug)
+    economy = UnbalancedEconomy(model)
+    economy.pay_doles(1.0, government, household)
+    economy.pay_taxes(2.0, household, government)
+    economy.pay_dividends(4.0, firm, household)
+    assert model.monitor.violations == 0
+    model.monitor.settle()
+    assert model.monitor.violations == int(debug)
+    if debug:
+        assert model.monitor.first["type"] == "tax"
+        with pytest.raises(ValueError, match="transaction 1 \\(tax"):
+            model.monitor.check()
+
+
+def test_debug_monitor_param():
+    model = DualEcoModel({"monitor": "debug"})
+    model.init_params()
+    assert monitor(model).debug
+    model = DualEcoModel({"monitor": True})
+    model.init_params()
+    assert not monitor(model).debug
@@ -0,0 +1,65 @@
+import pytest
+import numpy as np
+
+from model.dual import Dual, solve, where, stack
+
+
+@pytest.fixture
+def x():
+    return Dual([1.0, 2.0], [[1.0, 0.0], [1.0, 0.0]])
+
+
+@pytest.fixture
+def y():
+    return Dual([3.0, 4.0], [[0.0, 1.0], [0.0, 1.0]])
+
+
+def test_arithmetic(x, y):
+    z = (2 * x + y) * x / y - 1
+    # dz/dx = (4x + y) / y, dz/dy = -2x^2 / y^2
+    assert z.value == pytest.approx([2 / 3, 3.0])
+    assert z.tangent[:, 0] == pytest.approx([7 / 3, 3.0])
+    assert z.tangent[:, 1] == pytest.approx([-2 / 9, -0.5])
+
+
+def test_reciprocal(x):
+    z = 1 / (1 + x)
+    assert z.tangent[:, 0] == pytest.approx([-1 / 4, -1 / 9])
+
+
+def test_with_arrays(x):
+    z = np.array([1.0, 2.0]) * x - np.array([1.0, 1.0])
+    assert isinstance(z, Dual)
+    assert z.tangent[:, 0] == pytest.approx([1.0, 2.0])
+
+
+def test_where_and_stack(x, y):
+    z = where(np.array([True, False]), x, 0)
+    assert z.tangent[:, 0] == pytest.approx([1.0, 0.0])
+    s = stack([x, y, 5.0])
+    assert s.shape == (2, 3)
+    assert s.tangent.shape == (2, 3, 2)
+    assert s.sum(-1).tangent[0] == pytest.approx([1.0, 1.0])
+
+
+def test_solve_by_implicit_differentiation(x, y):
+    # x a + b = y, a - b = 1 => a = (y + 1) / (x + 1)
+    a, b = solve([[x, 1], [1, -1]], [y, 1])
+    assert a.value == pytest.approx([2.0, 5 / 3])
+    assert a.tangent[:, 0] == pytest.approx([-1.0, -5 / 9])
+    assert a.tangent[:, 1] == pytest.approx([0.5, 1 / 3])
+    assert b.tangent == pytest.approx(a.tangent)
+
+
+def test_solve_without_tangents():
+    a, b = solve([[2, 1], [1, -1]], [4, 1])
+    assert (a, b) == pytest.approx((5 / 3, 2 / 3))
+
+
+def test_solve_singular_systems():
+    A = [[np.array([1.0, 1.0]), 1], [np.array([1.0, 2.0]), 2]]
+    with pytest.raises(np.linalg.LinAlgError):
+        solve(A, [1, 1])
+    a, b = solve(A, [1, 1], mask_singular=True)
+    assert (a[0], b[0]) == pytest.approx((1.0, 0.0))
+    assert np.isnan(a[1]) and np.isnan(b[1])
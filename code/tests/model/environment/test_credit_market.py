@@ -1,6 +1,10 @@
 import pytest
+import numpy as np
 import agentpy as ap
+from mock import MagicMock
+from model.agents import Bank
 from model.environment import CreditMarket
+from model.ledger import Ledger
 
 
 @pytest.fixture
@@ -63,3 +67,64 @@ def test_make_defaults(market):
     assert firm.L_def == 10
     assert bank.L == 0
     assert bank.L_def == 10
+
+
+@pytest.fixture
+def network(market):
+    model = market.model
+    banks = ap.AgentList(model, 2, Bank)
+    banks.L = 0.0
+    banks.D = 0.0
+    banks.gamma_L = 0.0
+    banks.beta_L = 0.5
+    banks.kappa_E = 0.5
+    for bank, E in zip(banks, [100.0, 40.0]):
+        bank.E = E
+    firms = ap.AgentList(model, 6)
+    firms.E = 10.0
+    firms.L = 0.0
+    firms.D = 0.0
+    firms.r_L = 0.0
+    for firm, L_d in zip(firms, [20.0, 40.0, 35.0, 25.0, 5.0, 15.0]):
+        firm.L_d = L_d
+    market.add_agents(banks)
+    market.add_agents(firms)
+    for i, firm in enumerate(firms):
+        market.graph.add_edge(market.positions[firm], market.positions[banks[i % 2]])
+    market.r_L = 0.1
+    return banks, firms
+
+
+def test_allocate_credit_within_capacity(market, network):
+    banks, firms = network
+    market.allocate_credit(banks)
+    # first bank refuses 35 with 30 left but still grants 5 afterwards
+    assert list(firms.L) == [20.0, 0.0, 0.0, 0.0, 5.0, 15.0]
+    assert list(firms.D) == list(firms.L)
+    assert list(banks.L) == [25.0, 15.0]
+    assert list(banks.D) == [25.0, 15.0]
+    assert firms[0].r_L == pytest.approx(0.1 + 0.5 * 20.0 / 10.0)
+    assert firms[1].r_L == 0.0
+
+
+def test_allocate_credit_in_ledger(market, network):
+    banks, firms = network
+    market.model.ledger = Ledger()
+    market.allocate_credit(banks)
+    assert list(firms.L) == [0.0] * 6
+    assert len(market.model.ledger) == 3
+    market.model.ledger.apply()
+    assert list(firms.L) == [20.0, 0.0, 0.0, 0.0, 5.0, 15.0]
+    assert list(banks.D) == [25.0, 15.0]
+
+
+def test_allocate_credit_same_as_banks(market, network):
+    banks, firms = network
+    market.model.credit_market = market
+    market.give_loans = MagicMock()
+    for bank in banks:
+        bank.grant_loans()
+    expected = [(call.args[0], call.args[2]) for call in market.give_loans.call_args_list]
+    del market.give_loans
+    market.allocate_credit(banks)
+    assert [(firm.L, firm) for firm in firms if firm.L > 0] == sorted(expected, key=lambda x: firms.index(x[1]))
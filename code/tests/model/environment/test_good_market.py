@@ -1,11 +1,15 @@
 import pytest
+import numpy as np
 import agentpy as ap
 from model.environment import GoodMarket
 
 
 @pytest.fixture
 def model():
-    return ap.Model({})
+    # agentpy only seeds its generators in run()
+    model = ap.Model({})
+    model.nprandom = np.random.default_rng(0)
+    return model
 
 
 @pytest.fixture
@@ -85,3 +89,59 @@ def test_consume_goods_of_type2(market, client, firm):
     assert abs(client.C1 - 0.0) < 1e-6
     assert abs(client.C2 - 25.0) < 1e-6
     assert abs(client.M - 25.0) < 1e-6
+
+
+@pytest.fixture
+def ladder(market, model):
+    suppliers = ap.AgentList(model, 3)
+    for supplier, p_Y in zip(suppliers, [2.0, 1.0, 4.0]):
+        supplier.p_Y = p_Y
+        supplier.y_inv = 10.0
+        supplier.Q = 0.0
+        supplier.M = 0.0
+    market.add_suppliers(suppliers)
+    market.s_Y = 1
+    return suppliers
+
+
+@pytest.fixture
+def clients(model):
+    clients = ap.AgentList(model, 3)
+    clients.C1 = 0.0
+    clients.C2 = 0.0
+    clients.chiY = 50
+    for client, (M, C1_star) in zip(clients, [(50.0, 15.0), (20.0, 30.0), (100.0, 0.0)]):
+        client.M = M
+        client.C1_star = C1_star
+    return clients
+
+
+def test_clear_by_price_order(market, ladder, clients):
+    market.clear(clients)
+    # the first client takes the cheapest goods, the second goes up the ladder
+    assert list(clients.C1) == pytest.approx([15.0, 20.0, 0.0])
+    assert list(clients.M) == pytest.approx([35.0, 0.0, 100.0])
+    assert list(ladder.Q) == pytest.approx([20.0, 10.0, 5.0])
+    assert list(ladder.M) == pytest.approx([20.0, 10.0, 5.0])
+    assert list(ladder.y_inv) == pytest.approx([0.0, 0.0, 8.75])
+
+
+def test_clear_limited_by_inventory(market, ladder, clients):
+    clients.M = 1000.0
+    clients.C1_star = 40.0
+    market.clear(clients)
+    assert sum(clients.C1) == pytest.approx(70.0)
+    assert list(clients.C1) == pytest.approx([40.0, 30.0, 0.0])
+    assert list(ladder.y_inv) == pytest.approx([0.0, 0.0, 0.0])
+    assert sum(clients.M) == pytest.approx(3000.0 - 70.0)
+
+
+def test_clear_sampled_suppliers(market, ladder, clients):
+    clients.chiY = 1
+    market.clear(clients)
+    # the first client draws the dearest supplier, the second the cheapest,
+    # whose inventory is sold out before its demand is met
+    assert list(clients.C1) == pytest.approx([15.0, 10.0, 0.0])
+    assert list(clients.M) == pytest.approx([35.0, 10.0, 100.0])
+    assert list(ladder.Q) == pytest.approx([0.0, 10.0, 15.0])
+    assert list(ladder.y_inv) == pytest.approx([10.0, 0.0, 6.25])
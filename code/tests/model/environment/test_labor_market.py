@@ -1,6 +1,7 @@
 import pytest
+import numpy as np
 import agentpy as ap
-from model.environment import LaborMarket
+from model.environment import LaborMarket, sample_distinct
 
 
 @pytest.fixture
@@ -85,6 +86,16 @@ def test_remove_worker(market, workers, n_W):
     assert worker.n_W == 5
 
 
+def test_members_are_not_graph_nodes(market, employers, workers):
+    market.add_employers(employers)
+    market.add_workers(workers)
+    market.add_jobs(workers[:2], employers[:2])
+    assert market.graph.number_of_nodes() == 0
+    assert len(market.agents) == 10
+    assert market.neighbors(employers[0]).to_list() == [workers[0]]
+    assert market.neighbors(ap.Agent(market.model)).to_list() == []
+
+
 @pytest.fixture
 def firm(model):
     return ap.Agent(model)
@@ -175,7 +186,7 @@ def test_accept_private_job(market, firm, unemployed, s_Y, n_W):
     market.add_agents([worker, employer])
 
     market.accept_job(worker, employer)
-    assert market.graph.has_edge(worker, employer)
+    assert market.has_job(worker, employer)
     assert employer.N_v == 0
     assert worker.s_WG == 0
     assert worker.s_W == 1
@@ -193,7 +204,7 @@ def test_accept_public_job(market, government, unemployed):
     market.add_agents([worker, employer])
 
     market.accept_job(worker, employer)
-    assert market.graph.has_edge(worker, employer)
+    assert market.has_job(worker, employer)
     assert employer.N_v == 0
     assert worker.s_WG == 1
     assert worker.s_W == 1
@@ -228,7 +239,7 @@ def test_accept_own_job(market, self_employed, s_Y, n_W):
     market.add_agents([worker, employer])
 
     market.accept_job(worker, employer)
-    assert market.graph.has_edge(worker, employer)
+    assert market.has_job(worker, employer)
     assert employer.N_v == 0
     assert worker.s_WG == 0
     assert worker.s_W == 0
@@ -238,6 +249,25 @@ def test_accept_own_job(market, self_employed, s_Y, n_W):
     assert worker.n_W == n_W
 
 
+@pytest.mark.parametrize("batch", [False, True])
+def test_accept_job_at_owned_firm(model, market, batch):
+    # households of the model have no property, firms know their owner
+    worker = ap.Agent(model)
+    employer = ap.Agent(model)
+    employer.owner = worker
+    employer.s_Y = 2
+    employer.N_v = 1
+    market.n_W = 0
+    if batch:
+        market.hire(ap.AgentList(model, [worker]), market.employer_slot([employer]))
+    else:
+        market.accept_job(worker, employer)
+    assert market.has_job(worker, employer)
+    assert worker.s_E == 1
+    assert worker.s_W == 0
+    assert worker.s_Y == 2
+
+
 @pytest.mark.parametrize("s_Y, n_W", [(1, 1), (1, 0), (2, 1), (2, 0)])
 def test_leave_private_job(market, firm, private_worker, s_Y, n_W):
     worker = private_worker
@@ -248,10 +278,10 @@ def test_leave_private_job(market, firm, private_worker, s_Y, n_W):
     employer.N_v = 1
     market.n_W = n_W
     market.add_agents([worker, employer])
-    market.graph.add_edge(worker, employer)
+    market.add_jobs([worker], [employer])
 
     market.leave_job(worker, employer)
-    assert not market.graph.has_edge(worker, employer)
+    assert not market.has_job(worker, employer)
     assert employer.N_v == 1
     assert worker.s_WG == 0
     assert worker.s_W == 0
@@ -268,10 +298,10 @@ def test_leave_public_job(market, government, public_worker):
     employer.N_v = 1
     market.n_W = 1
     market.add_agents([worker, employer])
-    market.graph.add_edge(worker, employer)
+    market.add_jobs([worker], [employer])
 
     market.leave_job(worker, employer)
-    assert not market.graph.has_edge(worker, employer)
+    assert not market.has_job(worker, employer)
     assert employer.N_v == 1
     assert worker.s_WG == 0
     assert worker.s_W == 0
@@ -292,10 +322,10 @@ def test_leave_own_job(market, self_employed, s_Y, n_W):
     employer.N_v = 1
     market.n_W = n_W
     market.add_agents([worker, employer])
-    market.graph.add_edge(worker, employer)
+    market.add_jobs([worker], [employer])
 
     market.leave_job(worker, employer)
-    assert not market.graph.has_edge(worker, employer)
+    assert not market.has_job(worker, employer)
     assert employer.N_v == 1
     assert worker.s_WG == 0
     assert worker.s_W == 0
@@ -304,3 +334,132 @@ def test_leave_own_job(market, self_employed, s_Y, n_W):
     assert worker.s_EB == 0
     assert worker.s_Y == 0
     assert worker.n_W == 0
+
+
+def test_add_jobs(market, employers, workers):
+    market.add_employers(employers)
+    market.add_workers(workers)
+    market.add_jobs(workers, [employers[0]] * 3 + [employers[1]] * 2)
+    assert market.employees(employers[0]) == workers[:3]
+    assert market.neighbors(employers[1]).to_list() == workers[3:]
+    assert len(market.neighbors(employers[2])) == 0
+    assert market.employer_of(workers[4]) is employers[1]
+    assert list(market.jobs.degree) == [3, 2, 0, 0, 0]
+
+
+def test_remove_linked_worker(market, employers, workers):
+    market.add_employers(employers)
+    market.add_workers(workers)
+    market.add_jobs(workers[:2], employers[:2])
+    market.remove_worker(workers[0])
+    assert market.employees(employers[0]) == []
+    market.remove_employer(employers[1])
+    assert market.employer_of(workers[1]) is None
+
+
+def test_employer_after_job_changes(market, employers, workers):
+    market.add_employers(employers)
+    market.add_workers(workers)
+    worker = workers[0]
+    employers.N_v = 1
+    worker.property = None
+    assert market.employer_of(worker) is None
+    market.accept_job(worker, employers[2])
+    assert market.employer_of(worker) is employers[2]
+    market.leave_job(worker, employers[2])
+    assert market.employer_of(worker) is None
+    market.accept_job(worker, employers[3])
+    assert market.employer_of(worker) is employers[3]
+    assert list(market.employment) == [3, -1, -1, -1, -1]
+
+
+def test_best_offer(market, employers, workers):
+    market.add_employers(employers)
+    offers = [(1.0, 1), (3.0, 1), (2.0, 0), (2.5, 2), (0.5, 1)]
+    for employer, (w, N_v) in zip(employers, offers):
+        employer.w, employer.N_v = w, N_v
+        market.post_vacancies(employer)
+    assert len(market.vacancies) == 4
+    assert market.best_offer(5, 1.0) is employers[1]
+    assert market.best_offer(5, 3.5) is None
+
+    worker = workers[0]
+    worker.property = None
+    market.accept_job(worker, employers[1])
+    assert market.best_offer(5, 1.0) is employers[3]
+    market.remove_employer(employers[3])
+    assert market.best_offer(5, 1.0) is employers[0]
+
+
+@pytest.fixture
+def vacancies(market, employers, workers):
+    market.add_employers(employers)
+    market.add_workers(workers)
+    offers = [(1.0, 1), (3.0, 2), (2.0, 0), (2.5, 2), (0.5, 1)]
+    for employer, (w, N_v) in zip(employers, offers):
+        employer.w, employer.N_v = w, N_v
+        market.post_vacancies(employer)
+    return market
+
+
+def test_match_best_offers(vacancies):
+    market = vacancies
+    random = np.random.default_rng(0)
+    w = np.array([0.0, 2.6, 3.5, 1.0])
+    chi_N = np.array([200, 200, 200, 0])
+    assert list(market.match(w, chi_N, random)) == [1, 1, -1, -1]
+
+
+def test_match_rations_vacancies(vacancies):
+    market = vacancies
+    random = np.random.default_rng(0)
+    w = np.full(5, 2.6)
+    chi_N = np.full(5, 200)
+    assert list(market.match(w, chi_N, random)) == [1, 1, -1, -1, -1]
+    w = np.full(5, 1.0)
+    assert list(market.match(w, chi_N, random)) == [1, 1, 3, 3, 0]
+    choice = market.match(np.full(100, 1.0), np.full(100, 2), random)
+    assert list(np.bincount(choice[choice >= 0], minlength=5)) == [1, 2, 0, 2, 0]
+
+
+def test_sample_distinct_employers():
+    random = np.random.default_rng(0)
+    draws = sample_distinct(random, 6, 2000, 4)
+    assert all(len(set(row)) == 4 for row in draws.tolist())
+    counts = np.bincount(draws[:, 3], minlength=6)
+    assert counts.min() > 250
+
+
+def test_match_samples_without_replacement(vacancies):
+    # searchers sampling all employers all see the best offer, as in search_job
+    market = vacancies
+    random = np.random.default_rng(0)
+    choice = market.match(np.full(50, 1.0), np.full(50, 5), random)
+    assert list(choice[:5]) == [1, 1, 3, 3, 0]
+    assert (choice[5:] == -1).all()
+
+
+def test_hire_and_release(model, vacancies, employers, workers):
+    market = vacancies
+    market.n_W = 1
+    workers.property = None
+    employers[3].s_Y = 2
+    hired = ap.AgentList(model, workers[:3])
+    market.hire(hired, [1, 3, 1])
+    assert employers[1].N_v == 0
+    assert employers[3].N_v == 1
+    assert 1 not in market.vacancies
+    assert 3 in market.vacancies
+    assert market.employees(employers[1]) == [workers[0], workers[2]]
+    assert list(hired.s_W) == [1, 1, 1]
+    assert list(hired.s_U) == [0, 0, 0]
+    assert list(hired.s_Y) == [0, 2, 0]
+    assert list(hired.s_WG) == [1, 0, 1]
+    assert list(hired.n_W) == [1, 1, 1]
+
+    released = ap.AgentList(model, workers[:2])
+    market.release(released)
+    assert market.employees(employers[1]) == [workers[2]]
+    assert market.employer_of(workers[1]) is None
+    assert list(released.s_U) == [1, 1]
+    assert list(released.n_W) == [0, 0]
@@ -0,0 +1,189 @@
+import pytest
+import numpy as np
+import agentpy as ap
+
+from model import agents as ag
+from model.environment import BondMarket, CreditMarket, DepositMarket, Economy, GoodMarket, LaborMarket
+from model.ledger import Ledger, book, ledger, postings
+from model.model import DualEcoModel
+from model.population import build_agents
+
+stocks = ["M", "A", "B", "D", "L", "L_def", "E", "y_inv", "Q", "C1", "C2"]
+flows = ["Z", "T", "W", "Pi", "Pi_d", "iota_A", "iota_B", "iota_D", "iota_L"]
+
+
+def create_agents(model, n=2):
+    agents = ap.AgentList(model, n)
+    for i, agent in enumerate(agents):
+        for k, name in enumerate(stocks + flows):
+            setattr(agent, name, 10.0 * (i + 1) + k)
+        agent.p_Y = 2.0
+    return agents
+
+
+def state(agents):
+    return np.array([[getattr(agent, name) for name in stocks + flows] for agent in agents])
+
+
+transactions = [
+    (Economy, "pay_doles", (5.0,)),
+    (Economy, "pay_taxes", (5.0,)),
+    (Economy, "pay_dividends", (5.0,)),
+    (Economy, "transfer_profits", (5.0,)),
+    (Economy, "give_advances", (5.0,)),
+    (Economy, "repay_advances", (5.0, 1.0)),
+    (Economy, "invest_equities", (5.0,)),
+    (Economy, "reimburse_equities", ()),
+    (GoodMarket, "consume_goods", (5.0,)),
+    (LaborMarket, "pay_wages", (5.0,)),
+    (DepositMarket, "make_deposits", (5.0,)),
+    (DepositMarket, "withdraw_deposits", (5.0,)),
+    (DepositMarket, "pay_interests", (5.0,)),
+    (CreditMarket, "give_loans", (5.0,)),
+    (CreditMarket, "repay_loans", (5.0, 1.0)),
+    (CreditMarket, "make_defaults", (5.0,)),
+    (BondMarket, "buy_bonds", (5.0,)),
+    (BondMarket, "repay_bonds", (5.0, 1.0)),
+    (BondMarket, "transfer_bonds", (5.0,)),
+]
+
+
+@pytest.mark.parametrize("central_bank", [False, True])
+@pytest.mark.parametrize("space, method, amounts", transactions)
+def test_same_as_direct_transactions(space, method, amounts, central_bank):
+    results = []
+    for booked in [False, True]:
+        model = ap.Model({})
+        if booked:
+            model.ledger = Ledger()
+        agents = create_agents(model)
+        market = space(model)
+        if central_bank and space is BondMarket:
+            market.central_bank = agents[0]
+        market.s_Y = 1
+        getattr(market, method)(*amounts, agents[1], agents[0])
+        getattr(market, method)(*amounts, agents[0], agents[1])
+        if booked:
+            model.ledger.apply()
+        results.append(state(agents))
+    assert results[1] == pytest.approx(results[0])
+
+
+def test_postings_are_pending_until_applied():
+    model = ap.Model({})
+    model.ledger = Ledger()
+    payer, payee = create_agents(model)
+    Economy(model).pay_taxes(5.0, payer, payee)
+    assert len(model.ledger) == 1
+    assert payer.M == 10.0
+    model.ledger.apply()
+    assert len(model.ledger) == 0
+    assert payer.M == 5.0
+    assert payee.T == 37.0
+
+
+def test_book_without_ledger():
+    model = ap.Model({})
+    assert ledger(model) is None
+    assert not book(model, "tax", None, None, 1.0)
+
+
+def test_grow_capacity():
+    model = ap.Model({})
+    transactions = Ledger(capacity=2)
+    payer, payee = create_agents(model)
+    for _ in range(5):
+        transactions.record("wage", payer, payee, 1.0)
+    transactions.record_many("wage", [0, 0, 0], [1, 1, 1], 1.0)
+    assert len(transactions) == 8
+    transactions.apply()
+    assert payer.M == 2.0
+    assert payee.W == 41.0
+
+
+def test_log_transactions():
+    model = ap.Model({})
+    transactions = Ledger(log=True)
+    payer, payee = create_agents(model)
+    transactions.record("dividend", payer, payee, 2.0)
+    transactions.apply()
+    transactions.record("loan", payee, payer, 3.0)
+    transactions.apply()
+    log = transactions.transactions()
+    assert list(log["type"]) == ["dividend", "loan"]
+    assert list(log["payer"]) == [payer.id, payee.id]
+    assert list(log["amount"]) == [2.0, 3.0]
+
+
+def test_apply_to_columns():
+    model = ap.Model({})
+    firms = build_agents(model, ag.Firm, [(3, {"M": 10.0})])
+    owner = create_agents(model, 1)[0]
+    transactions = Ledger()
+    ids = transactions.indices(firms)
+    transactions.record_many("dividend", ids, transactions.indices([owner] * 3), [1.0, 2.0, 3.0])
+    transactions.record_many("tax", ids[:1], ids[1:2], 4.0)
+    transactions.apply()
+    assert list(firms.M) == pytest.approx([5.0, 12.0, 7.0])
+    assert list(firms.Pi_d) == pytest.approx([1.0, 2.0, 3.0])
+    assert list(firms.T) == pytest.approx([4.0, 4.0, 0.0])
+    assert owner.M == pytest.approx(16.0)
+
+
+def test_clear_good_market_same_as_direct():
+    results = []
+    for booked in [False, True]:
+        model = ap.Model({})
+        if booked:
+            model.ledger = Ledger()
+        firms = create_agents(model, 3)
+        households = create_agents(model, 5)
+        households.C1_star = 12.0
+        households.chiY = 2
+        market = GoodMarket(model)
+        market.s_Y = 1
+        market.add_suppliers(firms)
+        model.nprandom = np.random.default_rng(3)
+        market.clear(households)
+        if booked:
+            model.ledger.apply()
+        results.append(np.concatenate([state(firms), state(households)]))
+    assert results[1] == pytest.approx(results[0])
+
+
+def test_all_postings_known():
+    transactions = Ledger(sectors=(1, 2, 3))
+    assert set(postings) < set(transactions.codes)
+    assert "C3" in transactions.attributes
+
+
+def test_ledger_param():
+    model = DualEcoModel({"ledger": True})
+    model.init_params()
+    assert isinstance(ledger(model), Ledger)
+    assert ledger(DualEcoModel({})) is None
+
+
+def test_clear_good_markets_in_turn_same_as_direct():
+    results = []
+    for booked in [False, True]:
+        model = ap.Model({})
+        if booked:
+            model.ledger = Ledger()
+        firms = create_agents(model, 4)
+        households = create_agents(model, 5)
+        households.M = 15.0
+        households.C1_star = 12.0
+        households.C2_star = 12.0
+        households.chiY = 2
+        model.nprandom = np.random.default_rng(3)
+        for s in [1, 2]:
+            market = GoodMarket(model)
+            market.s_Y = s
+            market.add_suppliers(firms[2 * s - 2 : 2 * s])
+            market.clear(households)
+        if booked:
+            model.ledger.apply()
+        results.append(np.concatenate([state(firms), state(households)]))
+    assert results[1] == pytest.approx(results[0])
+    assert (results[0][4:, stocks.index("M")] >= 0).all()
@@ -1,9 +1,12 @@
 import pytest
 import numpy as np
+import agentpy as ap
+from mock import MagicMock
 
 from model.model import DualEcoModel
 from model import agents as ag
 from model import environment as env
+from model.cache import SteadyStateCache
 from utils.analysis import sum_params, create_matrices_from_params
 
 
@@ -844,3 +847,224 @@ def test_share_initial_consumption(models5):
 #         model.share_initial_consumption()
 #         model.share_initial_prices()
 #         assert False
+
+
+@pytest.fixture
+def sector_models(sample):
+    sectors = {1: 1, 2: 0, 3: 1, 4: 0, 5: 0}
+    models = []
+    for params in sample:
+        params = dict(params, sectors=sectors)
+        for s in [3, 4, 5]:
+            params[f"N_E{s}"] = np.random.randint(1, 25)
+            params[f"N_W{s}"] = np.random.randint(1, 25)
+            params[f"phi{s}"] = np.random.uniform(0.5, 2.5)
+            params[f"w{s}"] = np.random.uniform(0.5, 2.5)
+        model = DualEcoModel(params)
+        model.init_params()
+        model.calc_block_1()
+        model.calc_block_2()
+        model.calc_block_3()
+        model.calc_block_4()
+        models.append(model)
+    return models
+
+
+def test_configure_sectors_from_params(sector_models):
+    for model in sector_models:
+        assert model.sectors == {1: 1, 2: 0, 3: 1, 4: 0, 5: 0}
+        assert "L_F5" in model.p
+        stocks, flows = create_matrices_from_params(model.p, digits=2)
+        for key in flows.index:
+            assert flows.loc[key, "sigma"] == 0
+
+
+def test_sectors_in_experiments(sample, monkeypatch):
+    monkeypatch.setattr(DualEcoModel, "cache", None)
+
+    class SectorModel(DualEcoModel):
+        def end(self):
+            self.report("sectors", len(self.sectors))
+            self.report("L_F3", self.p["L_F3"])
+
+    params = dict(sample[0], sectors=((1, 1), (2, 0), (3, 1)), steps=1)
+    params.update(N_E3=4, N_W3=3, phi3=1.2, w3=1.5)
+    sample = ap.Sample(dict(params, tau=ap.Values(0.1, 0.2)))
+    output = ap.Experiment(SectorModel, sample).run(display=False)
+    assert list(output.reporters["sectors"]) == [3, 3]
+    assert (output.reporters["L_F3"] != 0).all()
+
+
+def test_create_agents_by_sectors(sector_models):
+    for model in sector_models:
+        model.create_households()
+        model.create_firms()
+        p = model.p
+        households = model.households
+        firms = model.firms
+        assert sum_params(p, "N") == len(households)
+        for s, n in model.sectors.items():
+            group = firms.select(firms.s_Y == s)
+            assert p[f"N_E{s}"] == len(group)
+            assert set(group.n_W) == {n}
+            assert set(group.n_T) == {n}
+            workers = households.select(households.s_W == 1)
+            assert p[f"N_W{s}"] == len(workers.select(workers.s_Y == s))
+
+
+def test_setup_networks_by_sectors(sector_models):
+    for model in sector_models:
+        model.create_households()
+        model.create_firms()
+        model.create_banks()
+        model.create_public_sector()
+        model.create_good_markets()
+        model.create_labor_markets()
+        model.create_credit_market()
+        p = model.p
+        firms = model.firms
+        assert set(model.good_markets) == set(model.sectors)
+        for s, n in model.sectors.items():
+            market = model.labor_markets[n]
+            min_ratio = (p[f"N_E{s}"] + p[f"N_W{s}"]) // p[f"N_E{s}"]
+            for firm in firms.select(firms.s_Y == s):
+                employees = market.neighbors(firm).to_list()
+                assert len(employees) in [min_ratio, min_ratio + 1]
+                assert set(employees.s_Y) == {s}
+        formal_firms = firms.select(firms.n_T == 1)
+        assert set(formal_firms).issubset(set(model.credit_market.agents))
+
+
+def test_share_initial_values_by_sectors(sector_models):
+    for model in sector_models:
+        model.create_households()
+        model.create_firms()
+        model.create_banks()
+        model.create_public_sector()
+        model.create_good_markets()
+        model.create_labor_markets()
+        model.create_deposit_market()
+        model.create_credit_market()
+        model.create_bond_market()
+        model.create_economy()
+        model.share_initial_equities()
+        model.share_initial_credits()
+        model.share_initial_deposits()
+        model.share_initial_cash()
+        model.share_initial_production()
+        model.share_initial_wages()
+        model.share_initial_transfers()
+        model.share_initial_profits()
+        model.share_initial_taxes()
+        model.share_initial_consumption()
+        p = model.p
+        firms = model.firms
+        households = model.households
+        assert round(p["L_B"], 2) == round(sum(model.banks.L), 2)
+        for s in model.sectors:
+            group = firms.select(firms.s_Y == s)
+            assert round(p[f"L_F{s}"], 2) == round(sum(group.L), 2)
+            assert round(p[f"D_F{s}"], 2) == round(sum(group.D), 2)
+            assert round(p[f"M_F{s}"], 2) == round(sum(group.M), 2)
+            assert round(p[f"T_F{s}"], 2) == round(sum(group.T), 2)
+            assert round(p[f"C{s}"], 2) == round(sum(getattr(households, f"C{s}")), 2)
+
+
+def solved_params(model):
+    solved = DualEcoModel(dict(model.p.params))
+    solved.init_params()
+    solved.calc_block_1()
+    solved.calc_block_2()
+    solved.calc_block_3()
+    solved.calc_block_4()
+    return solved.p
+
+
+@pytest.mark.parametrize(
+    "key, blocks",
+    [
+        ("kappa_Z", [3, 4]),
+        ("r_B", [2, 3, 4]),
+        ("theta_M", [2, 3, 4]),
+        ("w1", [1, 2, 3, 4]),
+    ],
+)
+def test_update_only_invalidated_blocks(models2, monkeypatch, key, blocks):
+    for model in models2:
+        calls = []
+        for i in range(1, 5):
+            method = getattr(model, f"calc_block_{i}")
+            wrapper = lambda i=i, method=method: calls.append(i) or method()
+            monkeypatch.setattr(model, f"calc_block_{i}", wrapper)
+        model.update_params(**{key: model.p[key] * 1.1})
+        assert calls == blocks
+
+
+@pytest.mark.parametrize("key", ["kappa_Z", "r_B", "tau", "g", "N_U", "phi2"])
+def test_update_same_as_full_computation(models2, key):
+    for model in models2:
+        model.update_params(**{key: model.p[key] * 1.1})
+        p = solved_params(model)
+        for k, v in p.items():
+            assert model.p[k] == pytest.approx(v)
+
+
+def test_update_returns_changed_variables(models2):
+    for model in models2:
+        before = dict(model.p)
+        updates = model.update_params(kappa_Z=model.p["kappa_Z"] * 1.1)
+        assert "Z_H" in updates
+        assert "B_G" in updates
+        assert "kappa_Z" not in updates
+        assert "L_F1" not in updates
+        for k, v in updates.items():
+            assert before[k] != v
+            assert model.p[k] == v
+
+
+def test_update_without_changes(models2):
+    for model in models2:
+        assert model.update_params(r_B=model.p["r_B"]) == {}
+
+
+def test_update_sectors_is_forbidden(models2):
+    for model in models2:
+        with pytest.raises(ValueError):
+            model.update_params(sectors={1: 1})
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = SteadyStateCache(tmp_path)
+    monkeypatch.setattr(DualEcoModel, "cache", cache)
+    return cache
+
+
+def test_setup_steady_state(sample, cache):
+    for params in sample:
+        model = DualEcoModel(params)
+        model.setup()
+        p = solved_params(model)
+        for k, v in p.items():
+            assert model.p[k] == pytest.approx(v)
+
+
+def test_setup_reuse_cached_steady_state(sample, cache, monkeypatch):
+    for params in sample:
+        DualEcoModel(params).setup()
+    calc_block_1 = MagicMock()
+    monkeypatch.setattr(DualEcoModel, "calc_block_1", calc_block_1)
+    for params in sample:
+        model = DualEcoModel(dict(params, seed=1))
+        model.setup()
+        assert model.p["L_F1"] != 0
+    calc_block_1.assert_not_called()
+    assert cache.hits == len(sample)
+
+
+def test_setup_without_cache(sample, monkeypatch):
+    monkeypatch.setattr(DualEcoModel, "cache", None)
+    for params in sample:
+        model = DualEcoModel(params)
+        model.setup()
+        assert model.p["B_G"] == pytest.approx(solved_params(model)["B_G"])
@@ -0,0 +1,353 @@
+import pytest
+import numpy as np
+import agentpy as ap
+from mock import MagicMock
+
+from model import agents as ag
+from model import population as pop
+from model.environment import GoodMarket
+from model.model import DualEcoModel
+from model.population import ColumnStore, Population, build_agents, schema
+from model.streams import stream
+
+
+@pytest.fixture
+def model():
+    return ap.Model({})
+
+
+@pytest.fixture
+def roles():
+    return [
+        (2, {"s_EB": 1, "s_E": 1}),
+        (3, {"s_E": 1, "s_Y": 1}),
+        (0, {"s_W": 1, "s_WG": 1}),
+        (4, {"s_Y": 2, "s_W": 1}),
+        (1, {"s_U": 1}),
+    ]
+
+
+def test_schema_from_setup_defaults():
+    columns = schema(ag.Household)
+    assert columns["s_U"] == (np.int64, 0)
+    assert columns["D"] == (np.float64, 0)
+    assert columns["bank"] == (object, None)
+    assert "id" in columns
+    assert schema(ag.Firm)["n_T"][0] == np.int64
+
+
+def test_allocate_typed_columns(model):
+    store = ColumnStore(model, ag.Bank)
+    start = model._id_counter + 1
+    banks = store.allocate(3, E=2.5)
+    assert len(store) == 3
+    assert store.data["E"].dtype == np.float64
+    assert list(store.data["E"][:3]) == [2.5, 2.5, 2.5]
+    assert [bank.id for bank in banks] == [start, start + 1, start + 2]
+    assert model._id_counter == start + 2
+
+
+def test_agents_are_views_of_columns(model):
+    store = ColumnStore(model, ag.Bank)
+    bank = store.allocate(2)[1]
+    assert isinstance(bank, ag.Bank)
+    assert bank.model is model
+    assert bank.type == "Bank"
+    bank.D = 4.0
+    assert store.data["D"][1] == 4.0
+    store.data["L"][1] = 3.0
+    assert bank.L == 3.0
+    assert bank.owner is None
+
+
+def test_agents_keep_other_attributes(model):
+    store = ColumnStore(model, ag.Firm)
+    firms = store.allocate(2, upsilon_F=0.5)
+    firms[0].alpha = 1
+    assert firms[0].alpha == 1
+    assert firms[1].upsilon_F == 0.5
+    assert "upsilon_F" not in store.data
+    with pytest.raises(AttributeError):
+        firms[1].alpha
+
+
+def test_grow_without_invalidating_agents(model):
+    store = ColumnStore(model, ag.Household)
+    first = store.allocate(2, M=1.0)
+    second = store.allocate(100, M=2.0)
+    assert first[1].M == 1.0
+    assert second[-1].M == 2.0
+    first[0].M = 5.0
+    assert store.data["M"][0] == 5.0
+    assert store.agents == first + second
+
+
+def test_build_agents_by_roles(model, roles):
+    households = build_agents(model, ag.Household, roles)
+    assert isinstance(households, Population)
+    assert len(households) == 10
+    assert [h.s_E for h in households] == [1] * 5 + [0] * 5
+    assert [h.s_Y for h in households] == [0, 0, 1, 1, 1, 2, 2, 2, 2, 0]
+    assert [h.s_U for h in households] == [0] * 9 + [1]
+    assert sum(h.s_EB for h in households) == 2
+
+
+def test_record_agent_views(model, roles):
+    household = build_agents(model, ag.Household, roles)[0]
+    household.record("M")
+    assert household.log["M"] == [0]
+    assert model._logs["Household"][household.id] is household.log
+
+
+@pytest.fixture(autouse=True)
+def no_cache(monkeypatch):
+    monkeypatch.setattr(DualEcoModel, "cache", None)
+
+
+@pytest.fixture
+def params():
+    return {
+        "g": 0.39,
+        "N_E1": 7,
+        "N_E2": 16,
+        "N_W1": 5,
+        "N_W2": 1,
+        "N_WG": 3,
+        "N_U": 21,
+        "N_B": 7,
+        "phi1": 0.92,
+        "phi2": 2.06,
+        "w1": 2.18,
+        "w2": 2.26,
+        "w_G": 2.2,
+        "w_min": 2.2,
+        "tau": 0.21,
+        "rho": 0.72,
+        "delta": 0.67,
+        "upsilon_F": 0.1,
+        "m": 0.13,
+        "theta_W": 0.18,
+        "theta_E": 0.18,
+        "theta_M": 0.5,
+        "theta_y": 0.14,
+        "kappa_Z": 0.49,
+        "kappa_E": 0.48,
+        "kappa_R": 0.09,
+        "beta_L": 0.55,
+        "gamma_L": 0.5,
+        "r_D": 0.11,
+        "r_L": 0.85,
+        "r_B": 0.3,
+        "r_A": 0.76,
+    }
+
+
+def create_agents(params):
+    model = DualEcoModel(params)
+    model.init_params()
+    model.create_households()
+    model.create_firms()
+    model.create_banks()
+    return model
+
+
+def test_columnar_model_same_agents(params):
+    model1 = create_agents(params)
+    model2 = create_agents(dict(params, columnar=True))
+    assert model2.columnar
+    for key in ["households", "firms", "banks"]:
+        agents1, agents2 = getattr(model1, key), getattr(model2, key)
+        assert len(agents1) == len(agents2)
+        assert agents2[0].store is not None
+        for name in ["s_E", "s_Y", "s_W", "n_W", "n_T", "phi", "delta", "kappa_E"]:
+            if hasattr(agents1[0], name):
+                assert list(getattr(agents1, name)) == list(getattr(agents2, name))
+
+
+@pytest.fixture
+def households(model, roles):
+    return build_agents(model, ag.Household, roles)
+
+
+def test_population_attributes_as_arrays(households):
+    households.W = np.arange(10.0)
+    households.Pi_d = 1.0
+    Y = households.W + households.Pi_d
+    assert isinstance(Y, np.ndarray)
+    assert list(Y) == list(np.arange(10.0) + 1)
+    assert households[3].W == 3.0
+    assert households.store.data["Pi_d"][:10].sum() == 10.0
+
+
+def test_population_other_attributes(households):
+    households.alpha = 0.5
+    households.beta = np.arange(10)
+    assert households[2].alpha == 0.5
+    assert households[2].beta == 2
+    assert list(households.alpha) == [0.5] * 10
+
+
+def test_select_population(households):
+    owners = households.select(households.s_E == 1)
+    assert isinstance(owners, Population)
+    assert owners.store is households.store
+    assert list(owners.rows) == [0, 1, 2, 3, 4]
+    owners.M = 2.0
+    assert list(households.M) == [2.0] * 5 + [0.0] * 5
+    bank_owners = owners.select(owners.s_EB == 1)
+    assert list(bank_owners) == households[:2]
+
+
+def test_sort_population(households):
+    households.w = [3.0, 1.0, 2.0, 2.0, 0.0, 5.0, 4.0, 1.0, 0.5, 2.0]
+    expected = sorted(households, key=lambda h: h.w, reverse=True)
+    households.sort("w", reverse=True)
+    assert list(households) == expected
+    assert list(households.w) == sorted(households.w, reverse=True)
+
+
+def test_add_populations(model, households):
+    workers = households.select(households.s_W == 1)
+    unemployed = households.select(households.s_U == 1)
+    assert isinstance(workers + unemployed, Population)
+    assert list((workers + unemployed).rows) == [5, 6, 7, 8, 9]
+    banks = build_agents(model, ag.Bank, [(2, {})])
+    agents = unemployed + banks
+    assert not isinstance(agents, Population)
+    assert len(agents) == 3
+
+
+def test_follow_list_changes(households):
+    workers = households.select(households.s_W == 1)
+    workers.append(households[0])
+    workers.remove(households[5])
+    assert list(workers.rows) == [6, 7, 8, 0]
+    workers.s_W = 2
+    assert households[0].s_W == 2
+    assert households[5].s_W == 1
+
+
+def share_initial_values(model):
+    model.calc_steady_state()
+    model.create_public_sector()
+    for key in ["good_markets", "labor_markets", "deposit_market", "credit_market"]:
+        getattr(model, f"create_{key}")()
+    model.create_bond_market()
+    model.create_economy()
+    for key in ["equities", "credits", "deposits", "bonds", "cash", "production"]:
+        getattr(model, f"share_initial_{key}")()
+    for key in ["wages", "transfers", "profits", "taxes", "consumption"]:
+        getattr(model, f"share_initial_{key}")()
+
+
+def test_columnar_model_same_initial_values(params):
+    model1 = create_agents(params)
+    model2 = create_agents(dict(params, columnar=True))
+    share_initial_values(model1)
+    share_initial_values(model2)
+    for name in ["M", "D", "E", "W", "Pi_d", "T", "C1", "C2"]:
+        values1 = list(getattr(model1.households, name))
+        values2 = getattr(model2.households, name)
+        assert isinstance(values2, np.ndarray)
+        assert values2 == pytest.approx(values1)
+    for name in ["M", "D", "L", "E", "y", "Q", "T"]:
+        assert getattr(model2.firms, name) == pytest.approx(list(getattr(model1.firms, name)))
+
+
+def search_jobs(model):
+    model.calc_steady_state()
+    model.create_public_sector()
+    model.create_labor_markets()
+    households = model.households
+    households.w = 2.0
+    households.delta = 0.1
+    households.upsilon = 0.5
+    households.chi_N = 3
+    for market in model.labor_markets.values():
+        for employer in market.employers:
+            employer.w, employer.N_v = 2.2, 2
+            market.post_vacancies(employer)
+    model.nprandom = np.random.default_rng(3)
+    model.search_jobs()
+    return model
+
+
+def test_search_jobs_same_hires(params):
+    model1 = search_jobs(create_agents(params))
+    model2 = search_jobs(create_agents(dict(params, columnar=True)))
+    for name in ["w", "s_U", "s_W", "s_WG", "s_Y", "n_W"]:
+        assert getattr(model2.households, name) == pytest.approx(list(getattr(model1.households, name)))
+    for n_W in [0, 1]:
+        market1, market2 = model1.labor_markets[n_W], model2.labor_markets[n_W]
+        assert list(market1.employment) == list(market2.employment)
+
+
+def test_search_jobs_fills_vacancies(params):
+    model = search_jobs(create_agents(params))
+    households = model.households
+    hired = 0
+    for market in model.labor_markets.values():
+        employers = list(market.employers)
+        hired += sum(2 - employer.N_v for employer in employers)
+        assert all(employer.N_v >= 0 for employer in employers)
+        for employer in employers:
+            assert len(market.employees(employer)) >= 2 - employer.N_v
+    assert hired > 0
+    formal = model.labor_markets[1]
+    for household in households:
+        if household.n_W == 1:
+            assert formal.employer_of(household) is not None
+        if household.s_U == 1:
+            assert model.labor_markets[0].employer_of(household) is None
+
+
+def test_clear_good_market_with_columns(model, households):
+    firms = build_agents(model, ag.Firm, [(2, {"s_Y": 1})])
+    firms.p_Y = np.array([1.0, 2.0])
+    firms.y_inv = 10.0
+    market = GoodMarket(model)
+    market.s_Y = 1
+    market.add_suppliers(firms)
+    households.M = 10.0
+    households.C1_star = 5.0
+    households.chiY = 20
+    model.nprandom = np.random.default_rng(0)
+    market.clear(households)
+    assert isinstance(households.C1, np.ndarray)
+    assert list(households.C1) == pytest.approx([5.0] * 6 + [0.0] * 4)
+    assert list(firms.Q) == pytest.approx([10.0, 20.0])
+    assert households.M.sum() == pytest.approx(70.0)
+
+
+@pytest.fixture
+def planning(params):
+    def plan(columnar, streams=False):
+        model = create_agents(dict(params, columnar=columnar, streams=streams, seed=11))
+        model.labor_markets = {0: MagicMock(upsilon=0.4, u=0.3), 1: MagicMock(upsilon=0.2, u=0.1)}
+        firms = model.firms
+        random = np.random.default_rng(5)
+        n = len(firms)
+        values = {k: random.uniform(0.5, 2.0, n) for k in ["Q", "p_Y", "y", "y_inv", "q_e", "m", "w", "N"]}
+        # the first firms sell between their production and expectation,
+        # and draw no revision of expectation and markup
+        values["y"][:5] = values["y_inv"][:5] = 0.1
+        values["Q"][:5] = 0.9 * values["q_e"][:5] * values["p_Y"][:5]
+        for k, v in values.items():
+            pop.assign(firms, k, v)
+        pop.assign(firms, "upsilon", random.uniform(0, 1, n))
+        firms.theta_y = 0.1
+        model.nprandom = np.random.default_rng(7)
+        return model
+
+    return plan
+
+
+@pytest.mark.parametrize("columnar, streams", [(False, False), (True, False), (True, True)])
+def test_plan_production_same_as_firms(planning, columnar, streams):
+    model1, model2 = planning(False, streams), planning(columnar, streams)
+    for firm in model1.firms:
+        firm.plan_production()
+    model2.plan_production()
+    for name in ["q_e", "m", "y_star", "N_star", "w", "p_Y"]:
+        assert list(pop.values(model2.firms, name)) == list(getattr(model1.firms, name))
+    assert stream(model1, "Firm").random() == stream(model2, "Firm").random()
@@ -0,0 +1,146 @@
+import pytest
+import numpy as np
+import agentpy as ap
+
+from model.model import DualEcoModel
+from model.recording import StreamRecorder, chunk_paths, iter_chunks, read_step, read_table, run_directory
+
+
+@pytest.fixture
+def recorder(tmp_path):
+    return StreamRecorder(tmp_path, chunk=4, format="npz")
+
+
+def test_flush_full_chunks(recorder, tmp_path):
+    for t in range(1, 11):
+        recorder.record(t, {"x": float(t)})
+        recorder.record(t, {"y": 2.0 * t})
+    assert len(chunk_paths(tmp_path)) == 2
+    assert len(recorder.variables) == 2
+    recorder.close()
+    assert len(chunk_paths(tmp_path)) == 3
+    table = read_table(tmp_path)
+    assert list(table.index) == list(range(1, 11))
+    assert list(table["y"]) == [2.0 * t for t in range(1, 11)]
+
+
+def test_missing_variables_are_nan(recorder, tmp_path):
+    recorder.record(1, {"x": 1.0})
+    recorder.record(2, {"x": 2.0, "z": 5.0})
+    recorder.close()
+    table = read_table(tmp_path)
+    assert np.isnan(table.loc[1, "z"])
+    assert read_step(tmp_path, 1) == {"x": 1.0}
+    assert read_step(tmp_path, 2) == {"x": 2.0, "z": 5.0}
+    with pytest.raises(KeyError):
+        read_step(tmp_path, 3)
+
+
+def test_read_chunks_lazily(recorder, tmp_path):
+    for t in range(1, 7):
+        recorder.record(t, {"x": float(t), "y": 0.0})
+    recorder.close()
+    chunks = iter_chunks(tmp_path, columns=["x"])
+    first = next(chunks)
+    assert list(first.columns) == ["x"]
+    assert list(first.index) == [1, 2, 3, 4]
+    assert list(next(chunks)["x"]) == [5.0, 6.0]
+
+
+def test_record_panels(recorder, tmp_path):
+    for t in range(1, 4):
+        recorder.record_panel(t, "firms", [10, 11, 12], {"M": np.arange(3.0) + t})
+    recorder.record_panel(4, "firms", np.arange(6), {"M": np.zeros(6)})
+    recorder.close()
+    assert len(chunk_paths(tmp_path, "firms")) == 4
+    panel = read_table(tmp_path, "firms")
+    assert len(panel) == 15
+    assert list(panel["id"][:3]) == [10, 11, 12]
+    assert list(panel["M"][3:6]) == [2.0, 3.0, 4.0]
+
+
+def test_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        StreamRecorder(tmp_path, format="csv")
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_arrow_formats(tmp_path, format):
+    pytest.importorskip("pyarrow")
+    recorder = StreamRecorder(tmp_path, chunk=2, format=format)
+    for t in range(1, 4):
+        recorder.record(t, {"x": float(t)})
+    recorder.close()
+    assert chunk_paths(tmp_path)[0].endswith(format)
+    assert list(read_table(tmp_path, columns=["x"])["x"]) == [1.0, 2.0, 3.0]
+    assert read_step(tmp_path, 3) == {"x": 3.0}
+
+
+def test_model_streams_records(tmp_path):
+    model = DualEcoModel({"recorder": {"directory": str(tmp_path), "chunk": 2, "format": "npz"}})
+    model.init_params()
+    agents = ap.AgentList(model, 2)
+    agents.M = 3.0
+    for t in range(1, 4):
+        model.t = t
+        model.record("M_H", 5.0 * t)
+        model.record_panel("agents", agents, ["M"])
+    model.create_output()
+    assert "variables" not in model.output
+    assert list(read_table(tmp_path)["M_H"]) == [5.0, 10.0, 15.0]
+    assert list(read_table(tmp_path, "agents")["M"]) == [3.0] * 6
+
+
+def test_rerun_into_same_directory(tmp_path):
+    recorder = StreamRecorder(tmp_path, chunk=4, format="npz")
+    for t in range(1, 11):
+        recorder.record(t, {"x": float(t)})
+    recorder.close()
+    with pytest.raises(FileExistsError):
+        StreamRecorder(tmp_path, chunk=4, format="npz")
+    recorder = StreamRecorder(tmp_path, chunk=4, format="npz", overwrite=True)
+    for t in range(1, 5):
+        recorder.record(t, {"x": float(t)})
+    recorder.close()
+    assert list(read_table(tmp_path).index) == [1, 2, 3, 4]
+
+
+def test_runs_have_own_directories(tmp_path):
+    for run in [(0, 0), (0, 1), (1, 0)]:
+        recorder = StreamRecorder(tmp_path, chunk=2, format="npz", run=run)
+        for t in range(1, 4):
+            recorder.record(t, {"x": 10.0 * run[0] + run[1] + t})
+        recorder.close()
+    assert run_directory(tmp_path, (1, 0)) == str(tmp_path / "run-00001-00000")
+    table = read_table(tmp_path)
+    assert table.index.names == ["sample_id", "iteration", "t"]
+    assert table.loc[(0, 1, 2), "x"] == 3.0
+    assert table.loc[(1, 0, 3), "x"] == 13.0
+    assert read_step(tmp_path, 2, run=(0, 1)) == {"x": 3.0}
+
+
+class RecordedModel(DualEcoModel):
+    def setup(self):
+        self.init_params()
+
+    def step(self):
+        self.record("M_H", self.p.tau * self.t)
+
+
+def test_record_through_experiment(tmp_path):
+    recorder = (("directory", str(tmp_path)), ("chunk", 2), ("format", "npz"))
+    sample = ap.Sample({"recorder": recorder, "steps": 3, "tau": ap.Values(1.0, 2.0)})
+    ap.Experiment(RecordedModel, sample, iterations=2).run(display=False)
+    table = read_table(tmp_path)
+    assert len(table) == 12
+    assert list(table.loc[(1, 1), "M_H"]) == [2.0, 4.0, 6.0]
+    assert list(table.loc[(0, 0), "M_H"]) == [1.0, 2.0, 3.0]
+
+
+@pytest.mark.parametrize("recorder", ["directory", "dict", "pairs"])
+def test_recorder_param(tmp_path, recorder):
+    options = {"directory": str(tmp_path), "format": "npz"}
+    recorder = {"directory": str(tmp_path), "dict": options, "pairs": tuple(options.items())}[recorder]
+    model = DualEcoModel({"recorder": recorder})
+    model.init_params()
+    assert model.recorder.directory == str(tmp_path)
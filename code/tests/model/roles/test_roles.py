@@ -0,0 +1,122 @@
+import pytest
+import agentpy as ap
+
+from model import agents as ag
+from model.population import build_agents
+from model.roles import ColumnRoleIndex, RoleIndex, role_flags
+
+
+@pytest.fixture
+def model():
+    model = ap.Model({})
+    model.indexes = {}
+    return model
+
+
+@pytest.fixture
+def roles():
+    return [
+        (2, {"s_EB": 1, "s_E": 1}),
+        (3, {"s_E": 1, "s_Y": 1}),
+        (2, {"s_W": 1, "s_WG": 1}),
+        (4, {"s_Y": 2, "s_W": 1}),
+        (1, {"s_U": 1}),
+    ]
+
+
+@pytest.fixture(params=["objects", "columns"])
+def households(request, model, roles):
+    if request.param == "columns":
+        households = build_agents(model, ag.Household, roles)
+        model.indexes["Household"] = ColumnRoleIndex(model, households, ag.Household)
+        return households
+    households = ap.AgentList(model)
+    for n, values in roles:
+        group = ap.AgentList(model, n, ag.Household)
+        for k, v in values.items():
+            setattr(group, k, v)
+        households += group
+    model.indexes["Household"] = RoleIndex(model, households, ag.Household)
+    return households
+
+
+def test_role_flags_of_agents():
+    assert set(role_flags(ag.Household)) == {"s_U", "s_W", "s_WG", "s_E", "s_EB", "s_Y", "n_W"}
+    assert set(role_flags(ag.Firm)) == {"s_Y", "n_W", "n_T"}
+    assert role_flags(ag.Bank) == []
+
+
+def test_select_same_as_scan(model, households):
+    index = model.indexes["Household"]
+    for flag in ["s_E", "s_W", "s_U", "s_Y"]:
+        for value in [0, 1, 2]:
+            expected = households.select(getattr(households, flag) == value)
+            assert list(index.select(**{flag: value})) == list(expected)
+    owners = households.select(households.s_E == 1)
+    expected = owners.select(owners.s_Y == 1)
+    assert list(index.select(s_E=1, s_Y=1)) == list(expected)
+    assert index.count(s_E=1) == 5
+    assert index.count(s_E=1, s_EB=1) == 2
+
+
+def test_update_on_flag_changes(model, households):
+    index = model.indexes["Household"]
+    worker = households[9]
+    worker.s_W = 0
+    worker.s_U = 1
+    worker.s_Y = 0
+    assert worker not in index.find(s_W=1)
+    assert index.find(s_U=1) == [worker, households[11]]
+    assert index.count(s_Y=2) == 3
+    assert len(index) == len(households)
+
+
+def test_keep_order_of_agent_list(model, households):
+    index = model.indexes["Household"]
+    for i in [6, 0, 11, 3]:
+        households[i].s_U = 1 - households[i].s_U
+    households[11].s_U = 1
+    for value in [0, 1]:
+        expected = households.select(households.s_U == value)
+        assert list(index.select(s_U=value)) == list(expected)
+    assert index.agents == list(households)
+
+
+def test_update_on_list_assignments(model, households):
+    index = model.indexes["Household"]
+    workers = index.select(s_W=1)
+    workers.s_U = 1
+    assert index.count(s_U=1) == 7
+    assert index.count(s_U=0) == 5
+
+
+def test_select_columnar_as_population(model, roles):
+    households = build_agents(model, ag.Household, roles)
+    index = ColumnRoleIndex(model, households, ag.Household)
+    assert list(index.group("s_Y", 2)) == [7, 8, 9, 10]
+    selected = index.select(s_Y=2)
+    assert list(selected.rows) == [7, 8, 9, 10]
+    selected.M = 1.0
+    assert sum(households.M) == 4.0
+
+
+def test_add_and_remove_agents(model, households):
+    index = model.indexes["Household"]
+    index.remove(households[:2])
+    assert index.count(s_EB=1) == 0
+    index.add(households[:1])
+    assert index.find(s_EB=1) == [households[0]]
+
+
+def test_columnar_groups_in_order_after_moves(model, roles):
+    households = build_agents(model, ag.Household, roles)
+    index = model.indexes["Household"] = ColumnRoleIndex(model, households, ag.Household)
+    households[10].s_U = 1
+    households[0].s_U = 1
+    households.select(households.s_WG == 1).s_U = 1
+    assert list(index.group("s_U", 1)) == [0, 5, 6, 10, 11]
+    assert list(index.group("s_U", 0)) == [1, 2, 3, 4, 7, 8, 9]
+    others = build_agents(model, ag.Household, [(2, {"s_U": 1})])
+    others.s_U = 0
+    assert index.count(s_U=1) == 5
+    assert len(index) == 12
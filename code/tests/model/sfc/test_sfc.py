@@ -0,0 +1,148 @@
+import pytest
+import numpy as np
+
+from model.model import DualEcoModel
+from model.sfc import SFCState, create_index
+from model.steady_state import f_vars
+from utils.analysis import create_matrices_from_params
+
+
+@pytest.fixture
+def state():
+    return SFCState({"tau": 0.2, "M_H": 5.0}, sectors=[1, 2])
+
+
+def test_fixed_index_by_agent_variable_and_sector():
+    index = create_index([1, 2, 3])
+    assert ("H", "M_H", None) in index
+    assert ("H", "C", 3) in index
+    assert ("F", "L_F", 1) in index
+    assert ("F", "L_F", 3) in index
+    assert ("CB", "B_CB", None) in index
+    assert len(index) == len(set(index))
+
+
+def test_default_variables(state):
+    assert state["L_F1"] == 0
+    assert state["B_CB"] == 0
+    assert len(state.vector) == len(state.index)
+
+
+def test_move_given_variables_into_vector(state):
+    assert state["M_H"] == 5.0
+    assert state.vector[state.positions["M_H"]] == 5.0
+    assert "M_H" not in state.params
+
+
+def test_given_params_are_not_changed():
+    params = {"tau": 0.2, "M_H": 5.0}
+    state = SFCState(params, sectors=[1, 2])
+    state["tau"] = 0.3
+    assert params == {"tau": 0.2, "M_H": 5.0}
+    assert state["M_H"] == 5.0
+
+
+def test_dict_style_access(state):
+    state["D_F2"] = 3.0
+    state["zeta_1"] = 0.5
+    assert state["D_F2"] == 3.0
+    assert state["zeta_1"] == 0.5
+    assert state.vector[state.positions["D_F2"]] == 3.0
+    assert state.params["zeta_1"] == 0.5
+    assert state["tau"] == 0.2
+    assert state.get("unknown", 1) == 1
+    assert "D_F2" in state and "tau" in state
+
+
+def test_attribute_access(state):
+    state.E_B = 2.0
+    assert state.E_B == 2.0
+    assert state.tau == 0.2
+    with pytest.raises(AttributeError):
+        state.unknown
+
+
+def test_can_not_remove_variables(state):
+    with pytest.raises(KeyError):
+        del state["M_H"]
+    del state["tau"]
+    assert "tau" not in state
+
+
+def test_copy_as_dict(state):
+    copy = state.copy()
+    assert isinstance(copy, dict)
+    assert copy["M_H"] == 5.0
+    assert copy["tau"] == 0.2
+
+
+def test_zero_copy_views(state):
+    households = state.segment("H")
+    firms = state.sectoral("F")
+    assert np.shares_memory(households, state.vector)
+    assert np.shares_memory(firms, state.vector)
+    assert firms.shape == (len(f_vars), 2)
+    state["L_F2"] = 7.0
+    assert 7.0 in firms
+    households[:] = 1.0
+    assert state["M_H"] == 1.0
+
+
+@pytest.fixture
+def model():
+    params = {
+        "g": 0.1,
+        "N_E1": 3,
+        "N_E2": 4,
+        "N_W1": 10,
+        "N_W2": 7,
+        "N_WG": 5,
+        "N_U": 2,
+        "N_B": 2,
+        "phi1": 1.5,
+        "phi2": 0.8,
+        "w1": 1.2,
+        "w2": 0.7,
+        "w_G": 1.1,
+        "w_min": 0.6,
+        "tau": 0.2,
+        "rho": 0.3,
+        "m": 0.25,
+        "theta_W": 0.4,
+        "theta_E": 0.2,
+        "theta_M": 0.3,
+        "theta_y": 0.1,
+        "kappa_Z": 0.5,
+        "r_D": 0.02,
+        "r_L": 0.05,
+        "r_B": 0.03,
+    }
+    model = DualEcoModel(params)
+    model.init_params()
+    model.calc_block_1()
+    model.calc_block_2()
+    model.calc_block_3()
+    model.calc_block_4()
+    return model
+
+
+def test_model_keeps_state(model):
+    assert isinstance(model.p, SFCState)
+    assert model.p["N_E1"] == 3
+
+
+def test_model_reinitialize_state(model):
+    model.init_params()
+    assert isinstance(model.p, SFCState)
+    assert not isinstance(model.p.params, SFCState)
+    assert model.p["L_F1"] == 0
+    assert model.p["N_E1"] == 3
+
+
+def test_same_matrices_as_dict(model):
+    stocks1, flows1 = create_matrices_from_params(model.p)
+    stocks2, flows2 = create_matrices_from_params(dict(model.p))
+    assert np.allclose(stocks1.to_numpy(), stocks2.to_numpy())
+    assert np.allclose(flows1.to_numpy(), flows2.to_numpy())
+    assert list(stocks1.index) == list(stocks2.index)
+    assert list(flows1.columns) == list(flows2.columns)
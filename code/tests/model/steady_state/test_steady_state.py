@@ -0,0 +1,348 @@
+import pytest
+import numpy as np
+import pandas as pd
+
+from model.model import DualEcoModel
+from model import steady_state
+from model.steady_state import solve_steady_state, init_params, block_dependencies
+from model.steady_state import steady_state_key, steady_state_jacobian, screen_steady_state
+from model.cache import SteadyStateCache
+from utils.analysis import create_matrices_from_params
+
+
+def random_params(n, seed=0):
+    random = np.random.default_rng(seed)
+    params = {
+        "g": random.random(n),
+        "N_E1": random.integers(1, 25, n),
+        "N_E2": random.integers(1, 25, n),
+        "N_W1": random.integers(1, 25, n),
+        "N_W2": random.integers(1, 25, n),
+        "N_WG": random.integers(1, 25, n),
+        "N_U": random.integers(1, 25, n),
+        "N_B": random.integers(1, 10, n),
+        "phi1": random.uniform(0.5, 2.5, n),
+        "phi2": random.uniform(0.5, 2.5, n),
+        "w1": random.uniform(0.5, 2.5, n),
+        "w2": random.uniform(0.5, 2.5, n),
+        "w_G": random.uniform(0.5, 2.5, n),
+        "w_min": random.uniform(0.5, 2.5, n),
+    }
+    for key in [
+        "tau",
+        "rho",
+        "delta",
+        "upsilon_F",
+        "m",
+        "theta_W",
+        "theta_E",
+        "theta_M",
+        "theta_y",
+        "kappa_Z",
+        "kappa_E",
+        "kappa_R",
+        "beta_L",
+        "gamma_L",
+        "r_D",
+        "r_L",
+        "r_B",
+        "r_A",
+    ]:
+        params[key] = random.random(n)
+    return pd.DataFrame(params)
+
+
+@pytest.fixture
+def sample():
+    return random_params(20)
+
+
+def solve_with_model(params):
+    model = DualEcoModel(params)
+    model.init_params()
+    model.calc_block_1()
+    model.calc_block_2()
+    model.calc_block_3()
+    model.calc_block_4()
+    return model.p
+
+
+def test_solve_one_row_per_candidate(sample):
+    states = solve_steady_state(sample)
+    assert len(states) == len(sample)
+    assert list(states.index) == list(sample.index)
+
+
+def test_solve_every_sfc_variables(sample):
+    states = solve_steady_state(sample)
+    p = solve_with_model(sample.iloc[0].to_dict())
+    assert set(p.keys()) == set(states.columns)
+
+
+def test_solve_same_numbers_as_model(sample):
+    states = solve_steady_state(sample)
+    for i, params in sample.iterrows():
+        p = solve_with_model(params.to_dict())
+        for key, value in p.items():
+            assert states.loc[i, key] == pytest.approx(value, rel=1e-9, abs=1e-9)
+
+
+def test_solve_sectors_without_agents(sample):
+    sample["N_E2"] = 0
+    sample["N_W2"] = 0
+    states = solve_steady_state(sample)
+    for i, params in sample.iterrows():
+        p = solve_with_model(params.to_dict())
+        assert states.loc[i, "p2"] == pytest.approx(p["p2"])
+        assert states.loc[i, "Q2"] == 0
+
+
+def test_solve_from_list_of_dicts(sample):
+    records = sample.to_dict("records")
+    states = solve_steady_state(records)
+    assert states["L_F1"].to_numpy() == pytest.approx(
+        solve_steady_state(sample)["L_F1"].to_numpy()
+    )
+
+
+@pytest.fixture
+def sectors():
+    return {1: 1, 2: 0, 3: 1, 4: 0, 5: 0}
+
+
+def random_sector_params(n, sectors, seed=0):
+    random = np.random.default_rng(seed)
+    params = random_params(n, seed)
+    for s in sectors:
+        params[f"N_E{s}"] = random.integers(1, 25, n)
+        params[f"N_W{s}"] = random.integers(1, 25, n)
+        params[f"phi{s}"] = random.uniform(0.5, 2.5, n)
+        params[f"w{s}"] = random.uniform(0.5, 2.5, n)
+    return params
+
+
+def test_solve_many_sectors_consistently(sectors):
+    params = random_sector_params(10, sectors)
+    states = solve_steady_state(params, sectors)
+    for _, state in states.iterrows():
+        stocks, flows = create_matrices_from_params(state.to_dict(), digits=6, sectors=sectors)
+        for key in flows.index:
+            assert flows.loc[key, "sigma"] == 0
+        for key in stocks.index:
+            if key not in ["Y_inv", "V"]:
+                assert stocks.loc[key, "sigma"] == 0
+
+
+def test_solve_sectors_by_formality(sectors):
+    params = random_sector_params(10, sectors)
+    states = solve_steady_state(params, sectors)
+    for s, n in sectors.items():
+        assert (states[f"C{s}"] == states[f"Q{s}"]).all()
+        if n == 1:
+            assert (states[f"M_F{s}"] == 0).all()
+        else:
+            assert (states[f"L_F{s}"] == 0).all()
+            assert (states[f"T_F{s}"] == 0).all()
+    formal = [f"L_F{s}" for s, n in sectors.items() if n == 1]
+    assert states["L_B"].to_numpy() == pytest.approx(states[formal].sum(axis=1))
+
+
+def test_solve_duplicated_sectors_as_aggregate():
+    params = random_params(10)
+    for v in ["N_E", "N_W", "phi", "w"]:
+        params[f"{v}3"] = params[f"{v}1"]
+        params[f"{v}4"] = params[f"{v}2"]
+    states1 = solve_steady_state(params)
+    states2 = solve_steady_state(params, {1: 1, 2: 0, 3: 1, 4: 0})
+    for key in ["L_F1", "Pi_dF2", "p1", "y_inv2"]:
+        assert states2[key].to_numpy() == pytest.approx(states1[key].to_numpy())
+    W_H = states1["W_H"] + states1["W_F1"] + states1["W_F2"]
+    assert states2["W_H"].to_numpy() == pytest.approx(W_H.to_numpy())
+
+
+class ReadTracer(dict):
+    def __getitem__(self, key):
+        if key not in self.writes:
+            self.reads.add(key)
+        return super().__getitem__(key)
+
+    def __setitem__(self, key, value):
+        self.writes.add(key)
+        super().__setitem__(key, value)
+
+
+def test_declare_every_block_inputs(sectors):
+    params = random_sector_params(3, sectors)
+    p = ReadTracer({k: params[k].to_numpy() for k in params.columns})
+    p.writes = set()
+    init_params(p, len(params), sectors)
+    for block, inputs in block_dependencies(sectors).items():
+        p.reads, p.writes = set(), set()
+        getattr(steady_state, block)(p, sectors)
+        assert p.reads <= inputs
+
+
+def test_solve_with_cache(sample, tmp_path):
+    cache = SteadyStateCache(tmp_path)
+    states1 = solve_steady_state(sample, cache=cache)
+    states2 = solve_steady_state(sample)
+    assert cache.misses == len(sample)
+    for key in states2.columns:
+        assert states1[key].to_numpy() == pytest.approx(states2[key].to_numpy())
+
+
+def test_reuse_cached_states(sample, tmp_path):
+    solve_steady_state(sample.iloc[:5], cache=SteadyStateCache(tmp_path))
+    cache = SteadyStateCache(tmp_path)
+    states = solve_steady_state(sample, cache=cache)
+    assert cache.hits == 5
+    assert cache.misses == len(sample) - 5
+    assert list(states.index) == list(sample.index)
+    assert not states["L_F1"].isna().any()
+
+
+def test_cache_key_ignores_unrelated_params(sample):
+    params = sample.iloc[0].to_dict()
+    key = steady_state_key(params)
+    assert steady_state_key(dict(params, seed=42, delta=0.1)) == key
+    assert steady_state_key(dict(params, r_B=0.1)) != key
+    assert steady_state_key(params, {1: 1, 2: 1}) != key
+
+
+def test_cache_key_depends_on_equations(sample, monkeypatch):
+    params = sample.iloc[0].to_dict()
+    key = steady_state_key(params)
+    monkeypatch.setattr(steady_state, "equations_version", lambda: "changed")
+    assert steady_state_key(params) != key
+
+
+def finite_differences(params, key, sectors=steady_state.sectors, eps=1e-6):
+    up, down = params.copy(), params.copy()
+    up[key] = up[key] + eps
+    down[key] = down[key] - eps
+    states1 = solve_steady_state(up, sectors)
+    states2 = solve_steady_state(down, sectors)
+    return (states1 - states2) / (2 * eps)
+
+
+def test_jacobian_one_row_per_candidate_and_variable(sample):
+    jacobian = steady_state_jacobian(sample, ["tau", "r_L"], of=["L_F1", "B_G"])
+    assert list(jacobian.columns) == ["tau", "r_L"]
+    assert len(jacobian) == 2 * len(sample)
+    assert jacobian.loc[(sample.index[0], "B_G"), "tau"] != 0
+
+
+def test_jacobian_same_as_finite_differences(sample):
+    wrt = ["tau", "rho", "theta_E", "r_L", "g", "w1", "N_W2"]
+    targets = ["L_F1", "B_G", "M_H", "D_H", "M_F2", "T_G", "Pi_CB"]
+    jacobian = steady_state_jacobian(sample, wrt, of=targets)
+    for key in wrt:
+        expected = finite_differences(sample.astype(float), key)
+        for v in targets:
+            values = jacobian.xs(v, level="variable")[key].to_numpy()
+            assert values == pytest.approx(expected[v].to_numpy(), rel=1e-4, abs=1e-6)
+
+
+def test_jacobian_of_many_sectors(sectors):
+    params = random_sector_params(5, sectors).astype(float)
+    jacobian = steady_state_jacobian(params, ["r_B", "phi3"], sectors=sectors)
+    for key in ["r_B", "phi3"]:
+        expected = finite_differences(params, key, sectors)
+        for v in ["L_B", "C3", "E_H", "B_CB"]:
+            values = jacobian.xs(v, level="variable")[key].to_numpy()
+            assert values == pytest.approx(expected[v].to_numpy(), rel=1e-4, abs=1e-6)
+
+
+def test_jacobian_zero_for_unrelated_params(sample):
+    jacobian = steady_state_jacobian(sample, ["kappa_Z"])
+    assert (jacobian.xs("L_F1", level="variable")["kappa_Z"] == 0).all()
+    assert (jacobian.xs("Z_H", level="variable")["kappa_Z"] != 0).all()
+
+
+@pytest.fixture
+def feasible():
+    return {
+        "g": 0.39,
+        "N_E1": 7,
+        "N_E2": 16,
+        "N_W1": 5,
+        "N_W2": 1,
+        "N_WG": 3,
+        "N_U": 21,
+        "N_B": 7,
+        "phi1": 0.92,
+        "phi2": 2.06,
+        "w1": 2.18,
+        "w2": 2.26,
+        "w_G": 2.2,
+        "w_min": 2.2,
+        "tau": 0.21,
+        "rho": 0.72,
+        "m": 0.13,
+        "theta_W": 0.18,
+        "theta_E": 0.18,
+        "theta_M": 0.5,
+        "theta_y": 0.14,
+        "kappa_Z": 0.49,
+        "r_D": 0.11,
+        "r_L": 0.85,
+        "r_B": 0.3,
+    }
+
+
+def test_screen_one_row_per_candidate(sample):
+    screen = screen_steady_state(sample)
+    assert list(screen.index) == list(sample.index)
+    assert screen["feasible"].dtype == bool
+    states = solve_steady_state(sample)
+    assert (screen["negative_M_H"] == (states["M_H"] < 0)).all()
+
+
+def test_screen_feasible_candidate(feasible):
+    screen = screen_steady_state([feasible])
+    assert screen.loc[0, "feasible"]
+    assert screen.loc[0, "reasons"] == ""
+
+
+def test_screen_sectors_without_agents(feasible):
+    screen = screen_steady_state([feasible, dict(feasible, N_E2=0), dict(feasible, N_B=0)])
+    assert list(screen["zero_N_E2"]) == [False, True, False]
+    assert list(screen["zero_N_B"]) == [False, False, True]
+    assert list(screen["feasible"]) == [True, False, False]
+    assert "zero_N_E2" in screen.loc[1, "reasons"]
+
+
+def test_screen_without_public_workers_or_unemployed(feasible):
+    screen = screen_steady_state([feasible, dict(feasible, N_WG=0), dict(feasible, N_U=0)])
+    assert list(screen["zero_N_WG"]) == [False, True, False]
+    assert list(screen["zero_N_U"]) == [False, False, True]
+    assert list(screen["feasible"]) == [True, False, False]
+
+
+def test_screen_singular_blocks_without_failing(feasible):
+    # without growth nor interest on loans, the firm system is singular
+    singular = dict(feasible, g=0.0, r_L=0.0)
+    screen = screen_steady_state([feasible, singular])
+    assert screen.loc[1, "ill_conditioned_block_1"]
+    assert screen.loc[1, "non_finite"]
+    assert not screen.loc[1, "feasible"]
+    assert screen.loc[0, "feasible"]
+
+
+def test_screen_ill_conditioned_blocks(feasible):
+    screen = screen_steady_state([feasible, dict(feasible, g=1e-9, r_L=1e-9)], max_cond=1e8)
+    assert list(screen["ill_conditioned_block_1"]) == [False, True]
+
+
+def test_solve_masks_singular_candidates(feasible):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        states = solve_steady_state([feasible, dict(feasible, g=0.0, r_L=0.0)])
+    assert np.isfinite(states.loc[0, "L_F1"])
+    assert np.isnan(states.loc[1, "L_F1"])
+
+
+def test_setup_fails_on_singular_systems(feasible, monkeypatch):
+    monkeypatch.setattr(DualEcoModel, "cache", None)
+    model = DualEcoModel(dict(feasible, g=0.0, r_L=0.0))
+    with pytest.raises(np.linalg.LinAlgError):
+        model.setup()
@@ -0,0 +1,80 @@
+import pytest
+import numpy as np
+import agentpy as ap
+
+from model.streams import RandomStream, RandomStreams, peek, skip, stream
+
+
+@pytest.fixture
+def seed():
+    return np.random.SeedSequence(42)
+
+
+def test_blocks_do_not_change_draws(seed):
+    expected = np.random.default_rng(seed).random(100)
+    random = RandomStream(seed, block=7)
+    draws = [random.random()] + list(random.random(30)) + list(random.random((3, 23)).ravel())
+    assert draws == list(expected)
+
+
+def test_same_draws_as_generator(seed):
+    random, generator = RandomStream(seed, block=5), np.random.default_rng(seed)
+    for _ in range(20):
+        assert random.uniform(0, 0.3) == generator.uniform(0, 0.3)
+        assert random.choice([0, 1], p=[0.4, 0.6]) == generator.choice([0, 1], p=[0.4, 0.6])
+        assert list(random.uniform(1, 2, 3)) == list(generator.uniform(1, 2, 3))
+
+
+@pytest.mark.parametrize("buffered", [False, True])
+def test_peek_and_skip(seed, buffered):
+    random = RandomStream(seed, block=5) if buffered else np.random.default_rng(seed)
+    expected = np.random.default_rng(seed).random(20)
+    assert list(peek(random, 12)) == list(expected[:12])
+    skip(random, 7)
+    assert list(peek(random, 3)) == list(expected[7:10])
+    assert random.random() == expected[7]
+
+
+def test_bernoulli_and_adjustments(seed):
+    random, generator = RandomStream(seed), np.random.default_rng(seed)
+    p = np.array([0.0, 0.3, 0.7, 1.0])
+    expected = [generator.choice([0, 1], p=[1 - x, x]) for x in p]
+    assert list(random.bernoulli(p, 4)) == [bool(x) for x in expected]
+    assert random.adjust(0.5) == generator.uniform(0, 0.5)
+
+
+def test_integers_in_range(seed):
+    random = RandomStream(seed)
+    values = random.integers(3, 8, (50, 4))
+    assert values.min() >= 3
+    assert values.max() < 8
+    assert set(np.unique(values)) == {3, 4, 5, 6, 7}
+    assert 0 <= random.integers(5) < 5
+
+
+def test_streams_independent_of_other_classes():
+    streams1, streams2 = RandomStreams(7), RandomStreams(7)
+    streams2["Household"].random(1000)
+    assert streams1["Firm"].random(5) == pytest.approx(streams2["Firm"].random(5))
+    assert streams1["Firm"].random() != streams1["Bank"].random()
+
+
+def test_stream_of_model():
+    model = ap.Model({})
+    assert stream(model, "Firm") is model.nprandom
+    model.streams = RandomStreams(1)
+    assert stream(model, "Firm") is model.streams["Firm"]
+
+
+def test_other_distributions_do_not_depend_on_blocks():
+    def draws(block):
+        random = RandomStream(np.random.SeedSequence(42), block=block)
+        values = []
+        for _ in range(20):
+            values.append(random.random())
+            values.append(random.hypergeometric(5, 7, 4))
+            values.extend(random.choice(9, 3, replace=False))
+            values.append(random.integers(10))
+        return values
+
+    assert draws(8) == draws(4096)
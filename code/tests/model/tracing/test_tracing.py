@@ -0,0 +1,99 @@
+import pytest
+import numpy as np
+import agentpy as ap
+from mock import MagicMock
+
+from model.agents import Firm
+from model.model import DualEcoModel
+from model.tracing import Tracer, read, tracer
+
+
+@pytest.fixture
+def model():
+    model = ap.Model({})
+    model.t = 3
+    return model
+
+
+@pytest.fixture
+def agents(model):
+    return ap.AgentList(model, 10)
+
+
+def test_disabled_without_tracer(model):
+    assert tracer(model) is None
+    model.tracer = Tracer()
+    assert tracer(model) is model.tracer
+
+
+def test_emit_events(agents):
+    trace = Tracer()
+    trace.emit("job_search", agents[0], 1.5, 0.2)
+    trace.emit("price_revision", agents[1], 0.1, 2.0, 1.0, 2.2)
+    jobs = trace.frame("job_search")
+    assert list(jobs.columns) == ["t", "agent", "w", "Pr"]
+    assert list(jobs.iloc[0]) == [3, agents[0].id, 1.5, 0.2]
+    assert list(trace.frame("price_revision")["p_Y"]) == [2.2]
+    assert len(trace.frame("loan_decision")) == 0
+
+
+def test_ring_buffer_keeps_last_events(agents):
+    trace = Tracer(capacity=4)
+    for i, agent in enumerate(agents):
+        trace.emit("job_search", agent, float(i), 0.0)
+    assert trace.count == 10
+    assert list(trace.frame("job_search")["w"]) == [6.0, 7.0, 8.0, 9.0]
+
+
+def test_sample_agents(agents):
+    trace = Tracer(sample=3)
+    for agent in agents:
+        trace.emit("job_search", agent, 1.0, 0.5)
+    ids = [agent.id for agent in agents if agent.id % 3 == 0]
+    assert list(trace.frame("job_search")["agent"]) == ids
+
+
+def test_emit_many(agents):
+    trace = Tracer(capacity=8, sample=2)
+    ids = np.array([agent.id for agent in agents])
+    trace.emit_many("job_search", 5, ids, ids * 1.0, 0.5)
+    events = trace.frame("job_search")
+    assert list(events["agent"]) == list(ids[ids % 2 == 0])
+    assert list(events["w"]) == list(ids[ids % 2 == 0] * 1.0)
+    assert set(events["Pr"]) == {0.5}
+    assert set(events["t"]) == {5}
+
+
+def test_write_binary_file(agents, tmp_path):
+    path = tmp_path / "events.bin"
+    trace = Tracer(capacity=3, path=path)
+    for i, agent in enumerate(agents[:7]):
+        trace.emit("job_search", agent, float(i), 0.0)
+    assert list(read(path, "job_search")["w"]) == [0.0, 1.0, 2.0, 3.0, 4.0, 5.0]
+    ids = np.array([agent.id for agent in agents])
+    trace.emit_many("job_search", 4, ids, 10.0, 0.0)
+    trace.flush()
+    assert len(read(path, "job_search")) == 17
+
+
+def test_firm_traces_price_revision(model, capsys):
+    model.tracer = Tracer()
+    model.labor_markets = {1: MagicMock(upsilon=0.5, u=0.5)}
+    firm = Firm(model)
+    firm.n_W = 1
+    firm.p_Y = firm.phi = firm.w = firm.q_e = 1.0
+    firm.plan_production()
+    events = model.tracer.frame("price_revision")
+    assert list(events["agent"]) == [firm.id]
+    assert events["p_Y"][0] == firm.p_Y
+    assert capsys.readouterr().out == ""
+
+
+@pytest.mark.parametrize("trace", [True, {"capacity": 8, "sample": 2}, (("capacity", 8), ("sample", 2))])
+def test_trace_param(trace):
+    model = DualEcoModel({"trace": trace})
+    model.init_params()
+    assert isinstance(tracer(model), Tracer)
+    if trace is not True:
+        assert len(tracer(model).buffer) == 8
+        assert tracer(model).sample == 2
@@ -0,0 +1,54 @@
+import pytest
+import numpy as np
+from model.vacancies import VacancyIndex
+
+
+@pytest.fixture
+def vacancies():
+    vacancies = VacancyIndex()
+    for slot, (w, N_v) in enumerate([(1.0, 2), (3.0, 1), (2.0, 0), (2.5, 4), (0.5, 1)]):
+        vacancies.update(slot, w, N_v)
+    return vacancies
+
+
+def test_ordered_by_wage(vacancies):
+    assert len(vacancies) == 4
+    assert [slot for _, slot in vacancies.keys] == [4, 0, 3, 1]
+    assert 2 not in vacancies
+
+
+def test_count_at_or_above_wage(vacancies):
+    assert vacancies.count(0.0) == 4
+    assert vacancies.count(1.0) == 3
+    assert vacancies.count(2.6) == 1
+    assert vacancies.count(3.5) == 0
+
+
+def test_update_and_discard(vacancies):
+    vacancies.update(1, 0.1, 1)
+    assert [slot for _, slot in vacancies.keys] == [1, 4, 0, 3]
+    vacancies.update(3, 2.5, 0)
+    vacancies.discard(4)
+    vacancies.discard(4)
+    assert [slot for _, slot in vacancies.keys] == [1, 0]
+
+
+def test_best_of_whole_sample(vacancies):
+    random = np.random.default_rng(0)
+    assert vacancies.best_of_sample(1.0, 5, 5, random) == 1
+    assert vacancies.best_of_sample(3.5, 5, 5, random) is None
+    assert vacancies.best_of_sample(1.0, 0, 5, random) is None
+
+
+def test_best_of_sample_distribution(vacancies):
+    # compare with drawing employers and keeping the best eligible offer
+    offers = {0: 1.0, 1: 3.0, 3: 2.5, 4: 0.5}
+    total, n, w, runs = 5, 2, 1.0, 20000
+    random = np.random.default_rng(1)
+    found = [vacancies.best_of_sample(w, n, total, random) for _ in range(runs)]
+    expected = []
+    for _ in range(runs):
+        sample = [s for s in random.choice(total, n, replace=False) if offers.get(s, -1) >= w]
+        expected.append(max(sample, key=offers.get) if sample else None)
+    for slot in [None, 0, 1, 3]:
+        assert found.count(slot) / runs == pytest.approx(expected.count(slot) / runs, abs=0.02)
@@ -1,8 +1,13 @@
 import pytest
+import numpy as np
 import agentpy as ap
 from utils.analysis import sum_params
 from utils.analysis import create_matrices_from_params
 from utils.analysis import create_matrices_from_output
+from utils.analysis import create_tensors_from_output
+from utils.analysis import Registry, registry
+from utils.analysis import analyse_experiment, summarize_experiment
+from model.recording import StreamRecorder
 
 
 def test_sum_params_with_prefix():
@@ -13,6 +18,48 @@ def test_sum_params_with_prefix():
     assert sum_params(p, "z") == 0
 
 
+def test_registry_of_exact_keys():
+    keys = registry([1, 2]).keys
+    assert "C1" in keys and "C2" in keys and "C3" not in keys
+    assert "Q" in keys and "Q1" in keys
+    assert "M_H" in keys and "M_H1" not in keys
+    assert registry([1, 2]) is registry((1, 2))
+    assert "C3" in registry([1, 2, 3]).keys
+
+
+def test_registry_rejects_conflicting_keys():
+    registry = Registry([1])
+    registry.declare("x", (0, 1, 1.0))
+    with pytest.raises(ValueError, match="ambiguous key 'x'"):
+        registry.declare("x", (1, 1, 1.0))
+
+
+def test_create_sfc_matrices_by_sector():
+    params = {"C1": 1.0, "C2": 2.0, "C3": 4.0, "Q1": 7.0, "tau": 0.5}
+    with pytest.raises(ValueError, match="C3"):
+        create_matrices_from_params(params)
+    stocks, flows = create_matrices_from_params(params, sectors=[1, 2, 3])
+    assert flows.loc["C", "H"] == -7.0
+    assert flows.loc["C", "sigma"] == 0.0
+    with pytest.raises(ValueError, match="Cash"):
+        create_matrices_from_params({"Cash": 8.0})
+
+
+def test_ignore_entries_of_other_params():
+    params = {"M_H": 1.0, "sectors": {1: "x"}, "name": "run", "seed": None}
+    stocks, flows = create_matrices_from_params(params)
+    assert stocks.loc["M", "H"] == 1.0
+    assert stocks.loc["M", "sigma"] == 1.0
+
+
+def test_reject_totals_with_sectoral_values():
+    with pytest.raises(ValueError, match="'Q'"):
+        create_matrices_from_params({"Q": 3.0, "Q1": 1.0})
+    stocks, flows = create_matrices_from_params({"Q": 3.0, "W_F2": 1.0})
+    assert flows.loc["C", "F"] == 3.0
+    assert flows.loc["W", "F"] == -1.0
+
+
 @pytest.fixture
 def keys():
     account_keys = ["H", "F", "B", "G", "CB"]
@@ -148,3 +195,88 @@ def test_create_sfc_matrices_from_output_with_precision():
         assert flows.loc["sigma", "F"] == -round(15.1234, d)
         assert flows.loc["C", "sigma"] == -round(10.1234, d)
         assert flows.loc["W", "sigma"] == -round(15.1234, d)
+
+
+class FakeModel3(ap.Model):
+    def step(self):
+        t = self.t
+        self.record("M_H", 5 * t)
+        self.record("C1", 10 * t)
+        self.record("C2", 2 * t)
+        self.record("Q1", 10 * t)
+        self.record("Q2", 2 * t)
+        self.record("W_F1", 15)
+        self.record("L_B", 3 * t)
+
+
+def test_create_sfc_tensors_from_model_output(keys):
+    model = FakeModel3({"steps": 4})
+    output = model.run()
+    stocks, flows = create_tensors_from_output(output, model_name="FakeModel3")
+
+    account_keys, stock_keys, flow_keys = keys
+    assert stocks.shape == (4, len(stock_keys), len(account_keys))
+    assert flows.shape == (4, len(flow_keys), len(account_keys))
+    for t in range(1, 5):
+        matrices = create_matrices_from_output(output, t, model_name="FakeModel3")
+        assert stocks[t - 1] == pytest.approx(matrices[0].loc[stock_keys, account_keys].to_numpy())
+        assert flows[t - 1] == pytest.approx(matrices[1].loc[flow_keys, account_keys].to_numpy())
+
+    # consumption is consistent in all periods, wages are not received
+    assert flows[:, 0].sum(axis=1) == pytest.approx(np.zeros(4))
+    assert flows[:, 1].sum(axis=1) == pytest.approx([-15] * 4)
+
+
+class FakeModel4(ap.Model):
+    def step(self):
+        self.record("M_H", self.p.x * self.t)
+        self.record("M_G", -self.p.x * self.t)
+        self.record("C1", self.p.x)
+        self.record("Q1", self.p.x if self.t < 3 else 0.0)
+        self.record("DeltaM_H", -self.p.x)
+        self.record("DeltaM_G", 0.0)
+        self.record("DeltaM_F", self.p.x)
+
+
+@pytest.fixture
+def experiment():
+    sample = ap.Sample({"x": ap.Values(1.0, 2.0), "steps": 3})
+    return ap.Experiment(FakeModel4, sample, iterations=2, record=True).run()
+
+
+def test_analyse_experiment(experiment):
+    table = analyse_experiment(experiment, model_name="FakeModel4")
+    assert list(table.index.names) == ["sample_id", "iteration", "t"]
+    assert len(table) == 12
+    assert list(table["sigma_stocks"]) == [0.0] * 12
+    assert list(table.loc[(1, 0), "sigma_flows"]) == [0.0, 0.0, 2.0]
+    assert list(table.loc[(1, 1), "consistent"]) == [True, True, False]
+    assert list(table.loc[(1, 0), "V_H"]) == [-2.0, -4.0, -6.0]
+    assert list(table.loc[(0, 0), "V_G"]) == [1.0, 2.0, 3.0]
+
+
+def test_summarize_experiment(experiment):
+    summary = summarize_experiment(experiment, model_name="FakeModel4")
+    assert list(summary.index.names) == ["sample_id", "iteration"]
+    assert len(summary) == 4
+    assert list(summary["inconsistent"]) == [1, 1, 1, 1]
+    assert list(summary["sigma_flows"]) == [1.0, 1.0, 2.0, 2.0]
+    assert list(summary["V_H"]) == [-3.0, -3.0, -6.0, -6.0]
+    assert list(summary["x"]) == [1.0, 1.0, 2.0, 2.0]
+
+
+def test_create_sfc_matrices_from_recorded_chunks(tmp_path):
+    model = FakeModel3({"steps": 5})
+    output = model.run()
+    recorder = StreamRecorder(tmp_path, chunk=2, format="npz")
+    for t, row in output.variables.FakeModel3.iterrows():
+        recorder.record(t, row.to_dict())
+    recorder.close()
+
+    stocks, flows = create_tensors_from_output(str(tmp_path))
+    expected = create_tensors_from_output(output, model_name="FakeModel3")
+    assert stocks == pytest.approx(expected[0])
+    assert flows == pytest.approx(expected[1])
+    matrices = create_matrices_from_output(tmp_path, 3)
+    expected = create_matrices_from_output(output, 3, model_name="FakeModel3")
+    assert matrices[1].equals(expected[1])
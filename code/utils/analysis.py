@@ -1,6 +1,10 @@
+import os
 
 import pandas as pd
 import numpy as np
+from model import recording
+from model import sfc
+from model import steady_state as ss
 
 
 # definition des secteurs institutionnels
@@ -32,78 +36,18 @@ def sum_params(params, prefix):
     return sum([v for k, v in params.items() if k.startswith(prefix)])
 
 
-def create_matrices_from_params(params, digits=None):
-    stock_matrix = pd.DataFrame(0.0, index=stock_keys, columns=account_keys)
-    stock_matrix.loc['Y_inv', 'F'] = sum_params(params, 'Y_inv')
-    stock_matrix.loc['M', 'H'] = sum_params(params, 'M_H')
-    stock_matrix.loc['D', 'H'] = sum_params(params, 'D_H')
-    stock_matrix.loc['E', 'H'] = sum_params(params, 'E_H')
-    stock_matrix.loc['M', 'F'] = sum_params(params, 'M_F')
-    stock_matrix.loc['D', 'F'] = sum_params(params, 'D_F')
-    stock_matrix.loc['L', 'F'] = - sum_params(params, 'L_F')
-    stock_matrix.loc['E', 'F'] = - sum_params(params, 'E_F')
-    stock_matrix.loc['M', 'B'] = params.get('M_B', 0)
-    stock_matrix.loc['A', 'B'] = - params.get('A_B', 0)
-    stock_matrix.loc['D', 'B'] = - params.get('D_B', 0)
-    stock_matrix.loc['B', 'B'] = params.get('B_B', 0)
-    stock_matrix.loc['L', 'B'] = params.get('L_B', 0)
-    stock_matrix.loc['E', 'B'] = - sum_params(params, 'E_B')
-    stock_matrix.loc['M', 'G'] = params.get('M_G', 0)
-    stock_matrix.loc['B', 'G'] = - params.get('B_G', 0)
-    stock_matrix.loc['M', 'CB'] = - params.get('M_CB', 0)
-    stock_matrix.loc['A', 'CB'] = params.get('A_CB', 0)
-    stock_matrix.loc['B', 'CB'] = params.get('B_CB', 0)
+def create_matrices_from_params(params, digits=None, sectors=ss.sectors):
+    if hasattr(params, 'to_matrices'):
+        # read aggregates directly from array-backed SFC states
+        stocks, flows = params.to_matrices()
+        stock_matrix = pd.DataFrame(stocks, index=stock_keys, columns=account_keys)
+        flow_matrix = pd.DataFrame(flows, index=flow_keys, columns=account_keys)
+    else:
+        stock_matrix, flow_matrix = fill_matrices(params, sectors)
+
     stock_matrix.loc['V', :] = - stock_matrix.sum()
     stock_matrix.loc['sigma', :] = stock_matrix.sum()
     stock_matrix['sigma'] = stock_matrix.sum(axis=1)
-    
-    flow_matrix = pd.DataFrame(0.0, index=flow_keys, columns=account_keys)
-    flow_matrix.loc['C', 'H'] = - sum_params(params, 'C')
-    flow_matrix.loc['W', 'H'] = sum_params(params, 'W_H')
-    flow_matrix.loc['Z', 'H'] = sum_params(params, 'Z_H')
-    flow_matrix.loc['T', 'H'] = - sum_params(params, 'T_H')
-    flow_matrix.loc['iota_D', 'H'] = sum_params(params, 'iota_DH')
-    flow_matrix.loc['Pi_d', 'H'] = sum_params(params, 'Pi_dH')
-    flow_matrix.loc['DeltaM', 'H'] = - sum_params(params, 'DeltaM_H')
-    flow_matrix.loc['DeltaD', 'H'] = - sum_params(params, 'DeltaD_H')
-    flow_matrix.loc['DeltaE', 'H'] = - sum_params(params, 'DeltaE_H')
-    flow_matrix.loc['C', 'F'] = sum_params(params, 'Q')
-    flow_matrix.loc['W', 'F'] = - sum_params(params, 'W_F')
-    flow_matrix.loc['T', 'F'] = - sum_params(params, 'T_F')
-    flow_matrix.loc['iota_L', 'F'] = - sum_params(params, 'iota_LF')
-    flow_matrix.loc['iota_D', 'F'] = sum_params(params, 'iota_DF')
-    flow_matrix.loc['Pi_d', 'F'] = - sum_params(params, 'Pi_dF')
-    flow_matrix.loc['DeltaM', 'F'] = - sum_params(params, 'DeltaM_F')
-    flow_matrix.loc['DeltaL', 'F'] = sum_params(params, 'DeltaL_F')
-    flow_matrix.loc['DeltaD', 'F'] = - sum_params(params, 'DeltaD_F')
-    flow_matrix.loc['DeltaE', 'F'] = sum_params(params, 'DeltaE_F')
-    flow_matrix.loc['L_def', 'F'] = sum_params(params, 'L_def_F')
-    flow_matrix.loc['T', 'B'] = - params.get('T_B', 0)
-    flow_matrix.loc['iota_A', 'B'] = - params.get('iota_AB', 0)
-    flow_matrix.loc['iota_B', 'B'] = params.get('iota_BB', 0)
-    flow_matrix.loc['iota_L', 'B'] = params.get('iota_LB', 0)
-    flow_matrix.loc['iota_D', 'B'] = - params.get('iota_DB', 0)
-    flow_matrix.loc['Pi_d', 'B'] = - params.get('Pi_dB', 0)
-    flow_matrix.loc['DeltaA', 'B'] = params.get('DeltaA_B', 0)
-    flow_matrix.loc['DeltaB', 'B'] = - params.get('DeltaB_B', 0)
-    flow_matrix.loc['DeltaM', 'B'] = - params.get('DeltaM_B', 0)
-    flow_matrix.loc['DeltaL', 'B'] = - params.get('DeltaL_B', 0)
-    flow_matrix.loc['DeltaD', 'B'] = params.get('DeltaD_B', 0)
-    flow_matrix.loc['DeltaE', 'B'] = params.get('DeltaE_B', 0)
-    flow_matrix.loc['L_def', 'B'] = - params.get('L_def_B', 0)
-    flow_matrix.loc['W', 'G'] = - params.get('W_G', 0)
-    flow_matrix.loc['Z', 'G'] = - params.get('Z_G', 0)
-    flow_matrix.loc['T', 'G'] = params.get('T_G', 0)
-    flow_matrix.loc['iota_B', 'G'] = - params.get('iota_BG', 0)
-    flow_matrix.loc['Pi', 'G'] = params.get('Pi_G', 0)
-    flow_matrix.loc['DeltaB', 'G'] = params.get('DeltaB_G', 0)
-    flow_matrix.loc['DeltaM', 'G'] = - params.get('DeltaM_G', 0)
-    flow_matrix.loc['iota_A', 'CB'] = params.get('iota_ACB', 0)
-    flow_matrix.loc['iota_B', 'CB'] = params.get('iota_BCB', 0)
-    flow_matrix.loc['Pi', 'CB'] = - params.get('Pi_CB', 0)
-    flow_matrix.loc['DeltaA', 'CB'] = - params.get('DeltaA_CB', 0)
-    flow_matrix.loc['DeltaB', 'CB'] = - params.get('DeltaB_CB', 0)
-    flow_matrix.loc['DeltaM', 'CB'] = params.get('DeltaM_CB', 0)
     flow_matrix.loc['sigma', :] = flow_matrix.sum()
     flow_matrix['sigma'] = flow_matrix.sum(axis=1)
 
@@ -114,9 +58,159 @@ def create_matrices_from_params(params, digits=None):
     return stock_matrix, flow_matrix
 
 
-def create_matrices_from_output(output, t, model_name='DualEcoModel', digits=None):
+class Registry:
+    # exact keys aggregated by each cell of the stock and flow matrices:
+    # variables of agent types, and sectoral variables by sector or in total
+
+    def __init__(self, sectors=ss.sectors):
+        self.keys = {}
+        self.totals = {}
+        matrices = [(sfc.stock_cells, stock_keys), (sfc.flow_cells, flow_keys)]
+        for matrix, (cells, rows) in enumerate(matrices):
+            for account in account_keys:
+                for v, (row, sign) in cells[account].items():
+                    cell = rows.index(row) * len(account_keys) + account_keys.index(account)
+                    keys = [v]
+                    if v in sfc.sector_vars[account]:
+                        keys += [f'{v}{s}' for s in sectors]
+                        if v not in sfc.agent_vars[account]:
+                            self.totals[v] = keys[1:]
+                    for key in keys:
+                        self.declare(key, (matrix, cell, sign))
+        self.prefixes = tuple(self.keys)
+
+    def declare(self, key, entry):
+        if self.keys.get(key, entry) != entry:
+            raise ValueError(f"ambiguous key '{key}' declared in two matrix cells")
+        self.keys[key] = entry
+
+    def select(self, keys):
+        # keys read or rejected by compile, other entries being ignored
+        return [k for k in keys if str(k).startswith(self.prefixes)]
+
+    def compile(self, keys):
+        # positions, cells and signs of given keys in both matrices, rejecting
+        # undeclared keys extending declared ones and totals given with their
+        # sectoral values
+        keys = [str(k) for k in keys]
+        unknown = [k for k in keys if k not in self.keys and k.startswith(self.prefixes)]
+        if unknown:
+            raise ValueError(f"ambiguous keys {unknown} are not declared SFC variables")
+        given = set(keys)
+        for total, parts in self.totals.items():
+            if total in given and given.intersection(parts):
+                raise ValueError(f"ambiguous key '{total}' given with its sectoral values")
+        entries = [(i, *self.keys[k]) for i, k in enumerate(keys) if k in self.keys]
+        pos, matrix, cell, sign = np.array(entries, dtype=float).reshape(-1, 4).T
+        pos, matrix, cell = pos.astype(int), matrix.astype(int), cell.astype(int)
+        return [(pos[matrix == m], cell[matrix == m], sign[matrix == m]) for m in (0, 1)]
+
+
+# registries are compiled once for each list of sectors
+registries = {}
+
+
+def registry(sectors=ss.sectors):
+    key = tuple(sectors)
+    if key not in registries:
+        registries[key] = Registry(key)
+    return registries[key]
+
+
+def fill_matrices(params, sectors=ss.sectors):
+    keys = registry(sectors).select(params)
+    values = np.array([[params[k] for k in keys]], dtype=float)
+    stocks, flows = fill_tensors(values, keys, sectors)
+    stock_matrix = pd.DataFrame(stocks[0], index=stock_keys, columns=account_keys)
+    flow_matrix = pd.DataFrame(flows[0], index=flow_keys, columns=account_keys)
+    return stock_matrix, flow_matrix
+
+
+def fill_stock_matrix(params, sectors=ss.sectors):
+    return fill_matrices(params, sectors)[0]
+
+
+def fill_flow_matrix(params, sectors=ss.sectors):
+    return fill_matrices(params, sectors)[1]
+
+
+def create_matrices_from_output(output, t, model_name='DualEcoModel', digits=None, sectors=ss.sectors):
+    if isinstance(output, (str, os.PathLike)):
+        # read the chunk of step t from a directory of recorded chunks
+        variables = recording.read_step(output, t)
+    else:
+        variables = output.variables[model_name]
+        variables = variables.loc[t].to_dict()
+    return create_matrices_from_params(variables, digits=digits, sectors=sectors)
+
+
+def fill_tensor(values, cells, rows):
+    # matrices of all periods (period x row x account) in one pass, in the
+    # order of the rows of values
+    pos, cell, sign = cells
+    tensor = np.zeros((len(rows) * len(account_keys), len(values)))
+    np.add.at(tensor, cell, (values[:, pos] * sign).T)
+    return tensor.T.reshape(len(values), len(rows), len(account_keys))
+
+
+def fill_tensors(values, keys, sectors=ss.sectors):
+    stock_cells, flow_cells = registry(sectors).compile(keys)
+    return fill_tensor(values, stock_cells, stock_keys), fill_tensor(values, flow_cells, flow_keys)
+
+
+def create_tensors_from_variables(variables, sectors=ss.sectors):
+    # stock and flow matrices of a table of variables recorded by period
+    keys = registry(sectors).select(variables.columns)
+    return fill_tensors(variables[keys].to_numpy(dtype=float), keys, sectors)
+
+
+def create_tensors_from_output(output, model_name='DualEcoModel', sectors=ss.sectors):
+    if isinstance(output, (str, os.PathLike)):
+        # fill tensors chunk by chunk from a directory of recorded chunks
+        tensors = [create_tensors_from_variables(chunk, sectors) for chunk in recording.iter_chunks(output)]
+        if not tensors:
+            return create_tensors_from_variables(pd.DataFrame(), sectors)
+        stocks, flows = zip(*tensors)
+        return np.concatenate(stocks), np.concatenate(flows)
     variables = output.variables[model_name]
-    variables = variables.loc[t].to_dict()
-    return create_matrices_from_params(variables, digits=digits)
+    return create_tensors_from_variables(variables, sectors)
 
 
+def create_tensors_from_experiment(output, model_name='DualEcoModel', sectors=ss.sectors):
+    # stock and flow matrices of every period of every run, with the
+    # (sample_id, iteration, t) index of their periods
+    variables = output.variables[model_name]
+    stocks, flows = create_tensors_from_variables(variables, sectors)
+    return variables.index, stocks, flows
+
+
+def analyse_experiment(output, model_name='DualEcoModel', sectors=ss.sectors, tol=1e-6):
+    # sigma residuals and net worths of every period of every run: the
+    # largest row sum of financial stocks, the largest row or column sum of
+    # flows and the net worth of each account
+    index, stocks, flows = create_tensors_from_experiment(output, model_name, sectors)
+    table = pd.DataFrame(index=index)
+    table['sigma_stocks'] = np.abs(stocks[:, 1:].sum(axis=2)).max(axis=1)
+    table['sigma_flows'] = np.maximum(
+        np.abs(flows.sum(axis=2)).max(axis=1), np.abs(flows.sum(axis=1)).max(axis=1)
+    )
+    table['consistent'] = (table['sigma_stocks'] <= tol) & (table['sigma_flows'] <= tol)
+    V = -stocks.sum(axis=1)
+    for i, account in enumerate(account_keys):
+        table[f'V_{account}'] = V[:, i]
+    return table
+
+
+def summarize_experiment(output, model_name='DualEcoModel', sectors=ss.sectors, tol=1e-6):
+    # indicators of each run: largest residuals, number of inconsistent
+    # periods and last net worths, with the parameters of its sample
+    table = analyse_experiment(output, model_name, sectors, tol)
+    runs = [name for name in table.index.names if name != 't']
+    groups = table.groupby(level=runs) if runs else table.groupby(lambda _: 0)
+    summary = groups[['sigma_stocks', 'sigma_flows']].max()
+    summary['inconsistent'] = groups['consistent'].size() - groups['consistent'].sum()
+    summary = summary.join(groups[[f'V_{a}' for a in account_keys]].last())
+    sample = output.get('parameters', {}).get('sample')
+    if sample is not None and 'sample_id' in runs:
+        summary = summary.join(sample, on='sample_id')
+    return summary